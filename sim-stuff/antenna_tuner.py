@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Digital Antenna Tuner Solver
+============================
+
+Finds the relay states of the L-network tuner in
+doc/NexRig/Hardware/Digital Antenna Tuner Design.md for a complex load.
+
+The series inductor bank (0.5-64 uH, each bit shorted by a relay when not
+in use) and the shunt capacitor bank (5-1280 pF, each bit switched to
+ground) are enumerated the same way as the PA tank bank in
+build-eer-tank-tables.py: per-bit complex impedances are combined with
+subset_sums, so every L code, C code and both network orientations are
+evaluated in one array operation. Relay contacts, inductor loss and
+self-capacitance, capacitor ESR and board stray are included.
+
+A relay code packs the three fields into one integer:
+bits 0-7 inductor bank, bits 8-16 capacitor bank, bit 17 orientation.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from band_plan import BAND_PLAN
+from bank_index import subset_sums
+
+# --- Configuration Constants ---
+
+# Impedance the tuner presents a match to
+SYSTEM_OHMS = 50.0
+
+# Inductor bank, MSB to LSB (the 0.5 uH bit is a 0.56 uH Coilcraft 132-08L)
+L_BANK_UH = [64, 32, 16, 8, 4, 2, 1, 0.56]
+L_BANK_Q = [150, 150, 150, 130, 130, 130, 200, 200]
+L_BANK_C_SELF_PF = [3.0, 2.5, 2.0, 1.5, 1.2, 1.0, 0.5, 0.4]
+
+# Capacitor bank, MSB to LSB
+C_BANK_PF = [1280, 640, 320, 160, 80, 40, 20, 10, 5]
+C_BANK_ESR_OHMS = [0.02, 0.03, 0.04, 0.05, 0.06, 0.08, 0.10, 0.12, 0.15]
+
+# Panasonic TQ2-5V contact resistance and open-contact capacitance, and the
+# inductance of the trace loop a closed relay adds
+RELAY_CONTACT_OHMS = 0.075
+RELAY_OPEN_PF = 1.5
+RELAY_PATH_NH = 8.0
+
+# Board capacitance at the node the shunt bank sits on
+SHUNT_STRAY_PF = 8.0
+
+# Matches that waste more power than this are not offered; they are mostly
+# the large inductors used near self-resonance on the high bands
+MIN_EFFICIENCY = 0.8
+
+# The tuner is used over the transmitter's band plan
+TUNER_BANDS = BAND_PLAN
+
+L_BITS = len(L_BANK_UH)
+C_BITS = len(C_BANK_PF)
+
+# Shunt bank across the load (high-Z loads) or across the transmitter side (low-Z loads)
+C_AT_LOAD = 0
+C_AT_INPUT = 1
+ORIENTATION_NAMES = ["C at load", "C at input"]
+ORIENTATION_BIT = L_BITS + C_BITS
+
+# --- Relay Codes ---
+
+def pack_code(l_code, c_code, orientation):
+    """Packs bank codes and orientation into one relay code."""
+    return (np.asarray(orientation) << ORIENTATION_BIT) | (np.asarray(c_code) << L_BITS) | np.asarray(l_code)
+
+
+def unpack_code(code):
+    """Splits a relay code into (l_code, c_code, orientation)."""
+    code = np.asarray(code)
+    return code & (2 ** L_BITS - 1), (code >> L_BITS) & (2 ** C_BITS - 1), (code >> ORIENTATION_BIT) & 1
+
+
+def nominal_values(l_code, c_code):
+    """Nominal bank inductance (uH) and capacitance (pF) of the given codes."""
+    inductance = subset_sums(L_BANK_UH[::-1])[np.asarray(l_code)]
+    capacitance = subset_sums(C_BANK_PF[::-1])[np.asarray(c_code)]
+    return inductance, capacitance
+
+# --- Bank Models ---
+# Bit k of a code switches the k-th entry of the LSB-first per-bit arrays.
+# Each bit is evaluated in both relay states; with codes=None every code is
+# built at once with one row per code, otherwise codes broadcast against f_hz.
+
+def _combine(in_circuit, bypassed, codes):
+    if codes is None:
+        return bypassed.sum(axis=-1) + subset_sums(np.moveaxis(in_circuit - bypassed, -1, 0))
+    bits = (np.asarray(codes)[..., None] >> np.arange(in_circuit.shape[-1])) & 1
+    return np.where(bits == 1, in_circuit, bypassed).sum(axis=-1)
+
+
+def inductor_bits(f_hz):
+    """
+    Per-bit elements of the inductor bank: winding impedance, winding
+    self-capacitance admittance, closed relay path impedance and open
+    relay admittance, each shaped (..., L_BITS).
+    """
+    w = 2 * math.pi * np.asarray(f_hz, dtype=float)[..., None]
+    l_h = np.array(L_BANK_UH[::-1]) * 1e-6
+    z_winding = w * l_h / np.array(L_BANK_Q[::-1]) + 1j * w * l_h
+    y_self = 1j * w * np.array(L_BANK_C_SELF_PF[::-1]) * 1e-12
+    z_relay_closed = RELAY_CONTACT_OHMS + 1j * w * RELAY_PATH_NH * 1e-9
+    y_relay_open = 1j * w * RELAY_OPEN_PF * 1e-12
+    return z_winding, y_self, z_relay_closed, y_relay_open
+
+
+def capacitor_bits(f_hz):
+    """
+    Per-bit elements of the capacitor bank: capacitor impedance with ESR,
+    closed relay path impedance and open relay impedance, each shaped
+    (..., C_BITS).
+    """
+    w = 2 * math.pi * np.asarray(f_hz, dtype=float)[..., None]
+    z_cap = np.array(C_BANK_ESR_OHMS[::-1]) + 1 / (1j * w * np.array(C_BANK_PF[::-1]) * 1e-12)
+    z_relay_closed = RELAY_CONTACT_OHMS + 1j * w * RELAY_PATH_NH * 1e-9
+    z_relay_open = 1 / (1j * w * RELAY_OPEN_PF * 1e-12)
+    return z_cap, np.broadcast_to(z_relay_closed, z_cap.shape), np.broadcast_to(z_relay_open, z_cap.shape)
+
+
+def series_bank_impedance(f_hz, codes=None):
+    """Impedance of the series inductor bank. A set bit opens the relay across that inductor."""
+    z_winding, y_self, z_relay_closed, y_relay_open = inductor_bits(f_hz)
+    y_coil = 1 / z_winding + y_self
+    return _combine(1 / (y_coil + y_relay_open), 1 / (y_coil + 1 / z_relay_closed), codes)
+
+
+def shunt_bank_admittance(f_hz, codes=None):
+    """Admittance of the shunt capacitor bank and its node stray. A set bit closes that relay."""
+    z_cap, z_relay_closed, z_relay_open = capacitor_bits(f_hz)
+    omega = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    return _combine(1 / (z_cap + z_relay_closed), 1 / (z_cap + z_relay_open), codes) + 1j * omega * SHUNT_STRAY_PF * 1e-12
+
+# --- Network Solve ---
+
+def input_impedance(z_series, y_shunt, z_load, orientation):
+    """Impedance seen from the transmitter; all arguments broadcast."""
+    at_load = z_series + 1 / (y_shunt + 1 / z_load)
+    at_input = 1 / (y_shunt + 1 / (z_series + z_load))
+    return np.where(np.asarray(orientation) == C_AT_LOAD, at_load, at_input)
+
+
+def reflection_coefficient(z, z0=SYSTEM_OHMS):
+    return (z - z0) / (z + z0)
+
+
+def load_from_gamma(gamma, z0=SYSTEM_OHMS):
+    return z0 * (1 + gamma) / (1 - gamma)
+
+
+def swr_from_gamma(gamma):
+    magnitude = np.minimum(np.abs(gamma), 1 - 1e-12)
+    return (1 + magnitude) / (1 - magnitude)
+
+
+def efficiency(z_series, y_shunt, z_load, orientation):
+    """Share of the power into the tuner that reaches the load; all arguments broadcast."""
+    # C at load: the load sees the divider z_shunt / z_in of the input voltage
+    z_shunt = 1 / (y_shunt + 1 / z_load)
+    at_load = np.abs(z_shunt) ** 2 * np.real(1 / z_load) / np.real(z_series + z_shunt)
+
+    # C at input: the series branch takes 1 / (z_series + z_load) per input volt
+    z_branch = z_series + z_load
+    at_input = np.real(z_load) / np.abs(z_branch) ** 2 / (np.real(y_shunt) + np.real(1 / z_branch))
+    return np.where(np.asarray(orientation) == C_AT_LOAD, at_load, at_input)
+
+
+def tune(f_hz, z_load, z0=SYSTEM_OHMS, min_efficiency=MIN_EFFICIENCY):
+    """
+    Finds the relay code with the lowest SWR for a load at one frequency.
+    All L codes, C codes and both orientations are evaluated together;
+    combinations below min_efficiency are skipped unless nothing else is
+    left, and ties go to the lowest relay code. Returns a dict describing
+    the match.
+    """
+    z_series = series_bank_impedance(f_hz)[None, :, None]
+    y_shunt = shunt_bank_admittance(f_hz)[None, None, :]
+    orientations = np.array([C_AT_LOAD, C_AT_INPUT])[:, None, None]
+
+    # Every combination at once, indexed [orientation, l_code, c_code]
+    z_in = input_impedance(z_series, y_shunt, z_load, orientations)
+    gamma = np.abs(reflection_coefficient(z_in, z0))
+    match_efficiency = efficiency(z_series, y_shunt, z_load, orientations)
+    usable = match_efficiency >= min_efficiency
+    if usable.any():
+        gamma = np.where(usable, gamma, np.inf)
+    orientation, l_code, c_code = np.unravel_index(np.argmin(gamma), gamma.shape)
+
+    inductance, capacitance = nominal_values(l_code, c_code)
+    return {
+        "code": int(pack_code(l_code, c_code, orientation)),
+        "l_code": int(l_code),
+        "c_code": int(c_code),
+        "orientation": int(orientation),
+        "inductance_uh": float(inductance),
+        "capacitance_pf": float(capacitance),
+        "z_in": complex(z_in[orientation, l_code, c_code]),
+        "swr": float(swr_from_gamma(gamma[orientation, l_code, c_code])),
+        "efficiency": float(match_efficiency[orientation, l_code, c_code]),
+    }
+
+
+def shunt_targets(z_series, z_load, conductance, b_min, b_max, z0=SYSTEM_OHMS, min_efficiency=MIN_EFFICIENCY):
+    """
+    Shunt susceptance that minimises |gamma| for each series impedance and
+    load, in both orientations (leading axis), with the shunt conductance
+    held at conductance. gamma is a Moebius function of the shunt
+    admittance, so |gamma|^2 along the susceptance is a ratio of
+    quadratics with one minimum, found in closed form. With the shunt at
+    the load the efficiency floor bounds the susceptance to an interval
+    about the load's own, and the minimum is taken within it when that
+    interval is not empty; both are kept within b_min..b_max.
+    """
+    z_series, z_load = np.broadcast_arrays(z_series, z_load)
+    y_load, y_branch = 1 / z_load, 1 / (z_series + z_load)
+    z0 = np.full(z_series.shape, z0, dtype=complex)
+    conductance = np.broadcast_to(conductance, (2,) + z_series.shape)
+
+    # gamma = (a y + b) / (c y + d) for y = conductance + jB
+    a = np.stack((z_series - z0, -z0))
+    b = np.stack(((z_series - z0) * y_load + 1, 1 - z0 * y_branch))
+    c = np.stack((z_series + z0, z0))
+    d = np.stack(((z_series + z0) * y_load + 1, 1 + z0 * y_branch))
+    A, P, C, Q = 1j * a, a * conductance + b, 1j * c, c * conductance + d
+    alpha, beta, gamma = np.abs(A) ** 2, np.real(A * np.conj(P)), np.abs(P) ** 2
+    delta, epsilon, zeta = np.abs(C) ** 2, np.real(C * np.conj(Q)), np.abs(Q) ** 2
+
+    def ratio(b_shunt):
+        return (alpha * b_shunt ** 2 + 2 * beta * b_shunt + gamma) / (delta * b_shunt ** 2 + 2 * epsilon * b_shunt + zeta)
+
+    # Stationary points of the ratio: k2 B^2 + k1 B + k0 = 0
+    k2 = alpha * epsilon - beta * delta
+    k1 = alpha * zeta - gamma * delta
+    k0 = beta * zeta - gamma * epsilon
+    with np.errstate(divide="ignore", invalid="ignore"):
+        root = np.sqrt(np.maximum(k1 ** 2 - 4 * k2 * k0, 0))
+        q = -0.5 * (k1 + np.where(k1 < 0, -root, root))
+        stationary = [q / k2, k0 / q]
+
+    # Efficiency with the shunt at the load is
+    # G_L / (G_L + g + R_s |g + G_L + j(B + B_L)|^2)
+    r_series, g_load = np.real(z_series), np.real(y_load)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        radius2 = (g_load * (1 / min_efficiency - 1) - conductance[0]) / r_series - (conductance[0] + g_load) ** 2
+    radius = np.sqrt(np.maximum(radius2, 0))
+    low = np.stack((np.where(radius2 > 0, np.maximum(-y_load.imag - radius, b_min), b_min),
+                    np.broadcast_to(b_min, radius.shape)))
+    high = np.stack((np.where(radius2 > 0, np.minimum(-y_load.imag + radius, b_max), b_max),
+                     np.broadcast_to(b_max, radius.shape)))
+    high = np.maximum(high, low)
+
+    points = np.stack([np.clip(np.nan_to_num(p, nan=b_min), low, high) for p in stationary] + [low, high])
+    values = ratio(points)
+    return np.take_along_axis(points, np.argmin(values, axis=0)[None], axis=0)[0]
+
+
+def tune_loads(f_hz, z_loads, z0=SYSTEM_OHMS, min_efficiency=MIN_EFFICIENCY, neighbours=2, chunk=256):
+    """
+    Batched tune() for many loads at one frequency. For each L code and
+    orientation the shunt susceptance with the lowest |gamma| inside the
+    efficiency floor is found in closed form (shunt_targets), and only the
+    2 * neighbours C codes either side of it in the sorted susceptances of
+    all C codes are evaluated exactly. Returns a dict of arrays with the
+    shape of z_loads.
+    """
+    z_loads = np.asarray(z_loads, dtype=complex)
+    flat = z_loads.ravel()
+    z_series = series_bank_impedance(f_hz)
+    y_shunt = shunt_bank_admittance(f_hz)
+    order = np.argsort(y_shunt.imag, kind="stable")
+    susceptance = y_shunt.imag[order]
+    conductance = y_shunt.real[order]
+
+    l_codes = np.arange(len(z_series))[None, None, :, None]
+    orientations = np.array([C_AT_LOAD, C_AT_INPUT])[:, None, None, None]
+    offsets = np.arange(-neighbours, neighbours)
+    codes = np.empty(len(flat), dtype=np.int64)
+    swr = np.empty(len(flat))
+    match_efficiency = np.empty(len(flat))
+    z_in = np.empty(len(flat), dtype=complex)
+
+    for start in range(0, len(flat), chunk):
+        z_load = flat[start:start + chunk, None]
+
+        # Solved with the lossless shunt first, then again with the
+        # conductance of the codes near that susceptance
+        target = np.zeros((2,) + np.broadcast_shapes(z_load.shape, z_series.shape))
+        for g in (0.0, None):
+            g = np.interp(target, susceptance, conductance) if g is None else g
+            target = shunt_targets(z_series, z_load, g, susceptance[0], susceptance[-1], z0, min_efficiency)
+        nearest = np.searchsorted(susceptance, target)
+        c_codes = order[np.clip(nearest[..., None] + offsets, 0, len(order) - 1)]
+
+        # Candidates indexed [orientation, load, l_code, candidate]
+        zs, ys, zl = z_series[l_codes], y_shunt[c_codes], z_load[None, :, :, None]
+        candidate_z = input_impedance(zs, ys, zl, orientations)
+        gamma = np.abs(reflection_coefficient(candidate_z, z0))
+        candidate_efficiency = efficiency(zs, ys, zl, orientations)
+        usable = candidate_efficiency >= min_efficiency
+        usable |= ~usable.any(axis=(0, 2, 3), keepdims=True)
+        gamma = np.where(usable, gamma, np.inf)
+
+        rows = np.arange(gamma.shape[1])
+        best = np.argmin(np.moveaxis(gamma, 1, 0).reshape(gamma.shape[1], -1), axis=1)
+        orientation, l_code, candidate = np.unravel_index(best, (2,) + gamma.shape[2:])
+        c_code = c_codes[orientation, rows, l_code, candidate]
+
+        end = start + len(rows)
+        codes[start:end] = pack_code(l_code, c_code, orientation)
+        swr[start:end] = swr_from_gamma(gamma[orientation, rows, l_code, candidate])
+        match_efficiency[start:end] = candidate_efficiency[orientation, rows, l_code, candidate]
+        z_in[start:end] = candidate_z[orientation, rows, l_code, candidate]
+
+    return {
+        "code": codes.reshape(z_loads.shape),
+        "swr": swr.reshape(z_loads.shape),
+        "efficiency": match_efficiency.reshape(z_loads.shape),
+        "z_in": z_in.reshape(z_loads.shape),
+    }
+
+
+if __name__ == "__main__":
+    # The design document's corner loads, plus reactive loads at 4:1 SWR,
+    # at the centre of each band
+    bands = [(name, (f_low + f_high) / 2 * 1e6) for name, f_low, f_high in TUNER_BANDS]
+    loads = [12.5, 200.0, 25 + 37.5j, 25 - 37.5j, 100 + 75j]
+
+    print(f"{'Band':<6} {'Load (ohm)':>14} {'Config':>11} {'L (uH)':>8} {'C (pF)':>8} "
+          f"{'Code':>7} {'SWR':>6} {'Eff (%)':>8} {'Time (ms)':>10}")
+    for name, f_hz in bands:
+        for z_load in loads:
+            start = time.perf_counter()
+            match = tune(f_hz, z_load)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<6} {complex(z_load):>14.1f} {ORIENTATION_NAMES[match['orientation']]:>11} "
+                  f"{match['inductance_uh']:8.2f} {match['capacitance_pf']:8.0f} 0x{match['code']:05X} "
+                  f"{match['swr']:6.3f} {100 * match['efficiency']:8.1f} {elapsed * 1e3:10.1f}")
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Band-Pass Filter Bank Model
+===========================
+
+The seven three-pole band-pass filters described by band1.mod ... band7.mod
+(the parameter files that simulate-all-bands.py feeds to ngspice), solved
+directly in numpy.
+
+Each filter is three parallel L-C tanks to ground, the outer tanks coupled
+to the middle one by series capacitors, between FILTER_Z_OHMS source and
+load. The nodal admittance matrix is tridiagonal, so the output voltage has
+a closed form that broadcasts over frequency and over any batch of
+component values: a whole grid of perturbed filters is one array
+expression. The -3 dB edges are bracketed on a sweep and then refined with
+a few secant steps on the exact response, so centre frequency and
+bandwidth resolve changes far finer than the sweep spacing.
+"""
+
+import math
+import os
+import re
+
+import numpy as np
+
+# --- Configuration Constants ---
+
+BAND_FILTER_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (number, name, low MHz, high MHz), as in simulate-all-bands.py
+BAND_FILTER_BANDS = [
+    (1, "160m", 1.8, 2.0),
+    (2, "80m", 3.25, 4.0),
+    (3, "40m", 4.5, 7.4),
+    (4, "30m", 9.9, 10.5),
+    (5, "20m", 13.5, 18.5),
+    (6, "17m", 19.5, 25.1),
+    (7, "10m", 28.0, 32.0),
+]
+
+# Source and load resistance the filters were designed for
+FILTER_Z_OHMS = 200.0
+
+# Unloaded Q of the tank inductors (small toroids)
+TANK_INDUCTOR_Q = 150.0
+
+# Sweep around each filter's nominal passband: span in nominal bandwidths
+# either side of the centre, and number of points
+SWEEP_SPAN_BW = 2.5
+SWEEP_POINTS = 401
+
+# Secant refinements of each -3 dB edge after bracketing on the sweep
+EDGE_REFINE_STEPS = 4
+
+_SI_PREFIX = {"p": 1e-12, "n": 1e-9, "u": 1e-6}
+
+
+# --- Band Files ---
+
+def load_band_filter(number, directory=BAND_FILTER_DIR):
+    """
+    Reads band<number>.mod: returns the design target from its comment
+    header and the component values in henries and farads.
+    """
+    with open(os.path.join(directory, f"band{number}.mod")) as f:
+        text = f.read()
+    params = {
+        name: float(value) * _SI_PREFIX[prefix]
+        for name, value, prefix in re.findall(r"^\.param\s+(\w+)\s*=\s*([\d.eE+-]+)([pnu])", text, re.M)
+    }
+    target = re.search(r"Target f0:\s*([\d.]+)\s*MHz", text)
+    design_bw = re.search(r"Design BW:\s*([\d.]+)\s*MHz", text)
+    return {
+        "target_f0_hz": float(target.group(1)) * 1e6,
+        "design_bw_hz": float(design_bw.group(1)) * 1e6,
+        "l_tank_h": params["Ltank"],
+        "c_end_f": params["CtankEnd"],
+        "c_mid_f": params["CtankMid"],
+        "c_couple_f": params["Ccouple"],
+    }
+
+
+def load_band_filters(bands=BAND_FILTER_BANDS, directory=BAND_FILTER_DIR):
+    """All bands as a list of dicts: band number, name, edges and load_band_filter values."""
+    filters = []
+    for number, name, f_low, f_high in bands:
+        band = {"band": number, "name": name, "f_low_hz": f_low * 1e6, "f_high_hz": f_high * 1e6}
+        band.update(load_band_filter(number, directory))
+        filters.append(band)
+    return filters
+
+
+# --- Response ---
+
+def filter_components(band):
+    """
+    The per-part values of a band filter as a dict of arrays, the form
+    filter_s21 takes. Perturb these (any broadcastable shape) to model
+    tolerances or environment.
+    """
+    return {
+        "l1_h": band["l_tank_h"], "l2_h": band["l_tank_h"], "l3_h": band["l_tank_h"],
+        "c1_f": band["c_end_f"], "c2_f": band["c_mid_f"], "c3_f": band["c_end_f"],
+        "c12_f": band["c_couple_f"], "c23_f": band["c_couple_f"],
+    }
+
+
+def transformer_port(w, transformer):
+    """
+    A 1:N transformer with its port resistor, seen from the tank node it
+    drives: the admittance it loads the node with, the current it injects
+    per volt of source EMF, and the port voltage per volt at the node.
+
+    The transformer is a dict of coupled-inductor values: primary and
+    secondary self inductance lp_h and ls_h, coupling k, core-loss
+    resistance r_core_ohms across the primary and the port resistance
+    port_ohms. Leakage is (1 - k^2) of each winding; an autotransformer is
+    the same two-port with the tap as primary.
+    """
+    lp = np.asarray(transformer["lp_h"])
+    ls = np.asarray(transformer["ls_h"])
+    r_core = np.asarray(transformer["r_core_ohms"])
+    r_port = np.asarray(transformer["port_ohms"])
+    m = np.asarray(transformer["k"]) * np.sqrt(lp * ls)
+
+    z_primary = r_port * r_core / (r_port + r_core)
+    z_loop = z_primary + 1j * w * lp
+    z_out = 1j * w * ls + (w * m) ** 2 / z_loop
+    i_source = 1j * w * m * (r_core / (r_port + r_core)) / (z_loop * z_out)
+    v_port = 1j * w * m * z_primary / (z_loop * z_out)
+    return 1 / z_out, i_source, v_port
+
+
+def filter_s21(f_hz, components, r_ohms=FILTER_Z_OHMS, q_l=TANK_INDUCTOR_Q, transformer=None):
+    """
+    Transmission S21 of the three-tank filter. f_hz, every entry of
+    components and of transformer broadcast against each other; the
+    result has their common shape. Without a transformer the filter sits
+    directly between r_ohms terminations; with one, between two identical
+    transformers (see transformer_port) and their port resistors.
+    """
+    w = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    c = {key: np.asarray(value, dtype=float) for key, value in components.items()}
+
+    def tank(l_h, c_f):
+        return 1 / (w * l_h / q_l + 1j * w * l_h) + 1j * w * c_f
+
+    if transformer is None:
+        y_port, i_source, v_port = 1 / r_ohms, 1 / r_ohms, 1.0
+    else:
+        y_port, i_source, v_port = transformer_port(w, transformer)
+
+    y12 = 1j * w * c["c12_f"]
+    y23 = 1j * w * c["c23_f"]
+    y11 = y_port + tank(c["l1_h"], c["c1_f"]) + y12
+    y22 = tank(c["l2_h"], c["c2_f"]) + y12 + y23
+    y33 = y_port + tank(c["l3_h"], c["c3_f"]) + y23
+
+    # Norton source into node 1; V3 from the tridiagonal cofactor
+    det = y11 * (y22 * y33 - y23 ** 2) - y12 ** 2 * y33
+    v3 = i_source * y12 * y23 / det
+    return 2 * v_port * v3
+
+
+def nominal_sweep(band, points=SWEEP_POINTS, span_bw=SWEEP_SPAN_BW):
+    """Sweep frequencies centred on the design target, wide enough to hold both -3 dB edges."""
+    half = span_bw * band["design_bw_hz"]
+    f_low = max(band["target_f0_hz"] - half, 0.05 * band["target_f0_hz"])
+    return np.linspace(f_low, band["target_f0_hz"] + half, points)
+
+
+def passband(f_hz, components, r_ohms=FILTER_Z_OHMS, q_l=TANK_INDUCTOR_Q, refine=EDGE_REFINE_STEPS,
+             transformer=None):
+    """
+    Centre frequency (geometric mean of the -3 dB edges), -3 dB bandwidth
+    and peak gain of a batch of filters. The sweep f_hz is the last axis of
+    its array; its leading axes and every entry of components broadcast to
+    the batch shape, so filters of different bands can share one call. The
+    -3 dB level is taken from the peak of each response, so insertion loss
+    does not count as bandwidth change. A transformer (filter_s21) is
+    batched the same way as components.
+    """
+    f_hz = np.asarray(f_hz, dtype=float)
+    parts = list(components.values()) + (list(transformer.values()) if transformer else [])
+    batch = np.broadcast_shapes(f_hz.shape[:-1], *[np.shape(v) for v in parts])
+    f_hz = np.broadcast_to(f_hz, batch + f_hz.shape[-1:])
+    expanded = {key: np.asarray(value)[..., None] for key, value in components.items()}
+    expanded_transformer = (None if transformer is None else
+                            {key: np.asarray(value)[..., None] for key, value in transformer.items()})
+    gain_db = 20 * np.log10(np.abs(filter_s21(f_hz, expanded, r_ohms, q_l, expanded_transformer)))
+
+    # Peak from a parabola through the highest sweep point and its
+    # neighbours, so the reference level moves smoothly with the parts
+    points = f_hz.shape[-1]
+    top = np.clip(np.argmax(gain_db, axis=-1), 1, points - 2)
+    g_left, g_top, g_right = (np.take_along_axis(gain_db, (top + k)[..., None], -1)[..., 0] for k in (-1, 0, 1))
+    curvature = g_left - 2 * g_top + g_right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        peak_db = np.where(curvature < 0, g_top - (g_right - g_left) ** 2 / (8 * curvature), g_top)
+    level = peak_db - 3.0
+    above = gain_db >= level[..., None]
+    first = np.argmax(above, axis=-1)
+    last = points - 1 - np.argmax(above[..., ::-1], axis=-1)
+    if np.any(first == 0) or np.any(last == points - 1):
+        raise ValueError("a -3 dB edge lies outside the sweep; widen it")
+
+    def at(values, index):
+        return np.take_along_axis(values, index[..., None], -1)[..., 0]
+
+    def edge(outside, inside):
+        # Secant steps on gain - level, starting from the bracketing sweep points
+        f_a, f_b = at(f_hz, outside), at(f_hz, inside)
+        g_a, g_b = at(gain_db, outside) - level, at(gain_db, inside) - level
+        for _ in range(refine):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                step = np.where(g_b != g_a, g_b * (f_b - f_a) / (g_b - g_a), 0.0)
+            f_c = f_b - step
+            g_c = 20 * np.log10(np.abs(filter_s21(f_c, components, r_ohms, q_l, transformer))) - level
+            f_a, g_a, f_b, g_b = f_b, g_b, f_c, g_c
+        return f_b
+
+    f_lo = edge(first - 1, first)
+    f_hi = edge(last + 1, last)
+    return {
+        "f_center_hz": np.sqrt(f_lo * f_hi),
+        "bandwidth_hz": f_hi - f_lo,
+        "f_lo_hz": f_lo,
+        "f_hi_hz": f_hi,
+        "peak_db": peak_db,
+    }
+
+
+if __name__ == "__main__":
+    print(f"Band filters between {FILTER_Z_OHMS:g} ohm terminations, inductor Q {TANK_INDUCTOR_Q:g}\n")
+    print(f"{'Band':<6} {'Target f0':>10} {'Centre':>10} {'Design BW':>10} {'-3 dB BW':>10} {'Peak':>7}")
+    for band in load_band_filters():
+        result = passband(nominal_sweep(band), filter_components(band))
+        print(f"{band['name']:<6} {band['target_f0_hz'] / 1e6:10.3f} {result['f_center_hz'] / 1e6:10.3f} "
+              f"{band['design_bw_hz'] / 1e6:10.3f} {result['bandwidth_hz'] / 1e6:10.3f} "
+              f"{result['peak_db']:6.2f} dB")
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+Transmitter Band Plan
+=====================
+
+The bands the transmitter covers, shared by the PA tank tables
+(build-eer-tank-tables.py) and the antenna tuner (antenna_tuner.py).
+"""
+
+# Band plan definition from user image: [Name, F_low_MHz, F_high_MHz]
+BAND_PLAN = [
+    ["160m", 1.8, 2.0],
+    ["80m", 3.5, 4.0],
+    ["60m", 5.0, 5.5],
+    ["40m", 6.9, 7.5],
+    ["30m", 9.9, 10.5],
+    ["20m", 13.9, 15.1],
+    ["17m", 17.85, 18.35],
+    ["15m", 20.0, 21.5],
+    ["12m", 24.5, 25.1],
+    ["10m", 28.0, 29.7]
+]
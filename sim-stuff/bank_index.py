@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Switched Capacitor Bank Index
+=============================
+
+Precomputes every capacitance a switched bank can reach so that the code
+nearest any number of target capacitances is found with np.searchsorted
+instead of a scan over all codes.
+
+Bank values are listed MSB first, as CAP_BANK_PF is in
+build-eer-tank-tables.py: bit k of a code switches in bank[n - 1 - k].
+The sums are enumerated meet-in-the-middle, from the sums of the low and
+high halves of the bank, which keeps 12-16 bit and non-binary banks cheap.
+Banks too large to tabulate are searched half against half instead.
+"""
+
+import numpy as np
+
+# Largest bank tabulated in full; bigger banks use the half-sum search
+MAX_TABLE_BITS = 20
+
+
+def subset_sums(values):
+    """
+    Returns the sum for every code of a bank listed LSB first. Each value
+    may itself be an array (e.g. a branch admittance over frequency), in
+    which case the result has one row per code.
+    """
+    values = np.asarray(values)
+    sums = np.zeros((1,) + values.shape[1:], dtype=np.result_type(values, float))
+    for value in values:
+        sums = np.concatenate((sums, sums + value))
+    return sums
+
+
+class BankIndex:
+    """Nearest-code lookup for a switched capacitor bank."""
+
+    def __init__(self, cap_bank, max_table_bits=MAX_TABLE_BITS):
+        values = np.asarray(cap_bank, dtype=float)[::-1]
+        self.bits = len(values)
+        self.low_bits = self.bits // 2
+
+        # Half-bank sums, indexed by the half's own code
+        self.low_sums = subset_sums(values[:self.low_bits])
+        self.high_sums = subset_sums(values[self.low_bits:])
+
+        if self.bits <= max_table_bits:
+            sums = (self.high_sums[:, None] + self.low_sums[None, :]).ravel()
+            codes = np.arange(len(sums), dtype=np.int64)
+            self.sums, self.codes = unique_sorted(sums, codes)
+        else:
+            self.sums = self.codes = None
+            self.low_sorted, self.low_codes = unique_sorted(self.low_sums, np.arange(len(self.low_sums)))
+
+    def nearest(self, targets):
+        """
+        Finds the code whose sum is closest to each target.
+
+        Returns (sums, codes) with the shape of targets. Ties go to the
+        lower code, as the original brute-force scan did.
+        """
+        targets = np.asarray(targets, dtype=float)
+        if self.sums is None:
+            sums, codes = self._nearest_split(targets.ravel())
+        else:
+            sums, codes = nearest_in_table(self.sums, self.codes, targets.ravel())
+        return sums.reshape(targets.shape), codes.reshape(targets.shape)
+
+    def candidates(self, targets, count):
+        """
+        Codes of the count sums around each target, for a final choice
+        under a finer model than the bank's nominal sums. Returns an array
+        with the shape of targets plus a trailing axis of count codes.
+        """
+        targets = np.asarray(targets, dtype=float)
+        flat = targets.ravel()
+        if self.sums is None:
+            codes = np.concatenate([self._split_candidates(flat[start:start + 4096], count)
+                                    for start in range(0, len(flat), 4096)])
+        else:
+            count = min(count, len(self.sums))
+            above = np.searchsorted(self.sums, flat)
+            start = np.clip(above - count // 2, 0, len(self.sums) - count)
+            codes = self.codes[start[:, None] + np.arange(count)]
+        return codes.reshape(targets.shape + (codes.shape[-1],))
+
+    def _pairings(self, targets):
+        # For each high-half sum, the best low half is found by bisection
+        remainder = targets[:, None] - self.high_sums[None, :]
+        low_sums, low_codes = nearest_in_table(self.low_sorted, self.low_codes, remainder.ravel())
+        total = self.high_sums[None, :] + low_sums.reshape(remainder.shape)
+        high_codes = np.arange(len(self.high_sums), dtype=np.int64)
+        code = (high_codes[None, :] << self.low_bits) | low_codes.reshape(remainder.shape)
+        return total, code, np.abs(total - targets[:, None])
+
+    def _split_candidates(self, targets, count):
+        # The count best pairings of a high half with its nearest low half
+        _, code, error = self._pairings(targets)
+        count = min(count, code.shape[1])
+        best = np.argpartition(error, count - 1, axis=1)[:, :count]
+        return np.take_along_axis(code, best, axis=1)
+
+    def _nearest_split(self, targets, chunk=4096):
+        # Best pairing per target among the high-half pairings
+        sums = np.empty(len(targets))
+        codes = np.empty(len(targets), dtype=np.int64)
+        for start in range(0, len(targets), chunk):
+            total, code, error = self._pairings(targets[start:start + chunk])
+            rows = np.arange(len(total))
+            tied = error == error.min(axis=1)[:, None]
+            best = np.argmin(np.where(tied, code, np.iinfo(np.int64).max), axis=1)
+            sums[start:start + chunk] = total[rows, best]
+            codes[start:start + chunk] = code[rows, best]
+        return sums, codes
+
+
+def unique_sorted(sums, codes):
+    """Sorts by sum and keeps the lowest code for each repeated sum."""
+    order = np.lexsort((codes, sums))
+    sums, codes = sums[order], codes[order]
+    first = np.concatenate(([True], np.diff(sums) != 0))
+    return sums[first], codes[first]
+
+
+def nearest_in_table(sums, codes, targets):
+    """Nearest entry of a sorted table to each target; ties go to the lower code."""
+    above = np.clip(np.searchsorted(sums, targets), 0, len(sums) - 1)
+    below = np.clip(above - 1, 0, len(sums) - 1)
+    error_above = np.abs(sums[above] - targets)
+    error_below = np.abs(sums[below] - targets)
+    take_below = (error_below < error_above) | ((error_below == error_above) & (codes[below] < codes[above]))
+    pick = np.where(take_below, below, above)
+    return sums[pick], codes[pick]
@@ -1,6 +1,11 @@
 import math
 import csv
-from collections import defaultdict
+import time
+
+import numpy as np
+
+from band_plan import BAND_PLAN
+from bank_index import BankIndex, subset_sums
 
 # --- Configuration Constants ---
 
@@ -14,25 +19,43 @@ CAP_BANK_PF = [1800, 620, 330, 160, 82, 39, 20, 10]
 # than this at their high end will use the switched bank exclusively.
 C_FIXED_THRESHOLD_PF = 3100.0
 
-# Band plan definition from user image: [Name, F_low_MHz, F_high_MHz]
-BAND_PLAN = [
-    ["160m", 1.8, 2.0],
-    ["80m", 3.5, 4.0],
-    ["60m", 5.0, 5.5],
-    ["40m", 6.9, 7.5],
-    ["30m", 9.9, 10.5],
-    ["20m", 13.9, 15.1],
-    ["17m", 17.85, 18.35],
-    ["15m", 20.0, 21.5],
-    ["12m", 24.5, 25.1],
-    ["10m", 28.0, 29.7]
-]
-
 # *** REVISED 3-INDUCTOR PLAN ***
 INDUCTOR_ASSIGNMENTS_NH = [500, 500, 500, 180, 180, 180, 68, 68, 68, 68]
 
-# Number of intermediate tuning steps to calculate within each band
-TUNING_STEPS_PER_BAND = 5
+# --- Parasitic Model ---
+# The tank is series: PA -> L -> (C_fixed || bank || PCB stray) -> R_L.
+# Each bank bit is its capacitor with ESR in series with a switch. A closed
+# switch is R_on shunted by its on-state capacitance; an open one is its
+# off-state capacitance, so open bits still add a little C. Per-bit lists
+# are MSB to LSB like CAP_BANK_PF.
+CAP_BANK_ESR_OHMS = [0.02, 0.03, 0.04, 0.05, 0.07, 0.09, 0.12, 0.15]
+SWITCH_R_ON_OHMS = [0.05, 0.1, 0.2, 0.2, 0.4, 0.4, 0.8, 0.8]
+SWITCH_C_ON_PF = [120, 60, 30, 30, 15, 15, 8, 8]
+SWITCH_C_OFF_PF = [40, 20, 10, 10, 5, 5, 2.5, 2.5]
+
+# ESR of the dedicated C_fixed and stray capacitance across the bank
+# (pads, traces and switch drains to ground)
+C_FIXED_ESR_OHMS = 0.01
+PCB_STRAY_PF = 12.0
+
+# Unloaded Q and self-capacitance of each tank inductor, keyed by nH
+INDUCTOR_Q = {500: 120, 180: 150, 68: 180}
+INDUCTOR_C_SELF_PF = {500: 2.0, 180: 1.2, 68: 0.8}
+
+# Frequency grid on which the best code is solved within each band
+TUNING_RESOLUTION_KHZ = 1.0
+
+# Codes nearest the needed capacitance that the full parasitic model
+# chooses between at each grid frequency
+TUNING_CANDIDATES = 4
+
+# Firmware table layout: one entry per run of identical codes, sorted by
+# start frequency. An entry with band NO_BAND marks the gap after a band.
+NO_BAND = 0xFF
+TABLE_MAGIC = b'TANK'
+TABLE_VERSION = 1
+TABLE_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('entry_size', '<u2'), ('count', '<u4')])
+TABLE_ENTRY = np.dtype([('start_hz', '<u4'), ('code', '<u2'), ('band', 'u1'), ('reserved', 'u1')])
 
 # --- Helper Functions ---
 
@@ -45,122 +68,372 @@ def calculate_c_pf(f_mhz, l_nh):
 
 def calculate_f_mhz(c_pf, l_nh):
     """Calculates resonant frequency in MHz for a given capacitance and inductance."""
-    c_f = c_pf * 1e-12
+    c_f = np.asarray(c_pf, dtype=float) * 1e-12
     l_h = l_nh * 1e-9
-    if l_h * c_f <= 0:
-        return 0
-    f_hz = 1 / (2 * math.pi * math.sqrt(l_h * c_f))
+    product = l_h * c_f
+    f_hz = np.divide(1, 2 * math.pi * np.sqrt(np.maximum(product, 0)),
+                     out=np.zeros_like(product), where=product > 0)
     return f_hz / 1e6
 
+_bank_indexes = {}
+
 def find_best_cap_combo(target_c, cap_bank):
     """
     Finds the combination of capacitors from the bank that produces the
-    capacitance closest to the target capacitance.
-    """
-    best_sum = 0
-    best_combo_index = 0
-    min_error = float('inf')
-
-    for i in range(256):
-        current_sum = 0
-        for j in range(8):
-            if (i >> j) & 1:
-                current_sum += cap_bank[7 - j]
-        
-        error = abs(current_sum - target_c)
-
-        if error < min_error:
-            min_error = error
-            best_sum = current_sum
-            best_combo_index = i
-            
-    return best_sum, best_combo_index
+    capacitance closest to the target capacitance. Accepts a scalar or an
+    array of targets; the bank's sums are indexed once and reused.
+    """
+    key = tuple(cap_bank)
+    if key not in _bank_indexes:
+        _bank_indexes[key] = BankIndex(cap_bank)
+    sums, codes = _bank_indexes[key].nearest(target_c)
+    if np.ndim(target_c) == 0:
+        return float(sums), int(codes)
+    return sums, codes
+
+def bit_admittances(f_hz):
+    """
+    On- and off-state admittance of each bank bit (capacitor, ESR and
+    switch), LSB first along a trailing axis added to f_hz.
+    """
+    w = 2 * math.pi * np.asarray(f_hz, dtype=float)[..., None]
+
+    # Bit k of a code switches the k-th entry of these LSB-first arrays
+    c = np.array(CAP_BANK_PF[::-1]) * 1e-12
+    z_cap = np.array(CAP_BANK_ESR_OHMS[::-1]) + 1 / (1j * w * c)
+    z_on = z_cap + 1 / (1 / np.array(SWITCH_R_ON_OHMS[::-1]) + 1j * w * np.array(SWITCH_C_ON_PF[::-1]) * 1e-12)
+    z_off = z_cap + 1 / (1j * w * np.array(SWITCH_C_OFF_PF[::-1]) * 1e-12)
+    return 1 / z_on, 1 / z_off
+
+def bank_admittance(f_hz, codes=None):
+    """
+    Complex admittance of the switched bank plus PCB stray. With codes=None
+    every code is evaluated at once and the result has one row per code;
+    otherwise codes broadcast against f_hz.
+    """
+    omega = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    y_on, y_off = bit_admittances(f_hz)
+
+    if codes is None:
+        # A closed bit swaps its off-state admittance for its on-state one
+        y = y_off.sum(axis=-1) + subset_sums(np.moveaxis(y_on - y_off, -1, 0))
+    else:
+        bits = (np.asarray(codes)[..., None] >> np.arange(len(CAP_BANK_PF))) & 1
+        y = np.where(bits == 1, y_on, y_off).sum(axis=-1)
+    return y + 1j * omega * PCB_STRAY_PF * 1e-12
+
+
+def inductor_impedance(f_hz, l_nh):
+    """Tank inductor with its loss resistance and self-capacitance."""
+    omega = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    l_h = l_nh * 1e-9
+    z_series = omega * l_h / INDUCTOR_Q[l_nh] + 1j * omega * l_h
+    return 1 / (1 / z_series + 1j * omega * INDUCTOR_C_SELF_PF[l_nh] * 1e-12)
+
+
+def tank_impedance(f_hz, l_nh, c_fixed_pf, codes=None):
+    """Impedance the PA drives into the series tank and load, for bank codes as in bank_admittance."""
+    omega = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    z_l = inductor_impedance(f_hz, l_nh)
+
+    y = bank_admittance(f_hz, codes)
+    if c_fixed_pf > 0:
+        y = y + 1 / (C_FIXED_ESR_OHMS + 1 / (1j * omega * c_fixed_pf * 1e-12))
+    return R_L_OHMS + z_l + 1 / y
+
+
+def dedicated_c_fixed_pf(f_high, l_nh):
+    """
+    C_fixed for a band, or 0 if the bank covers it alone. The fixed part
+    makes up what the inductor needs at F_high beyond the bank's all-open
+    capacitance, so the band top stays reachable.
+    """
+    if calculate_c_pf(f_high, l_nh) <= C_FIXED_THRESHOLD_PF:
+        return 0
+    f_hz = f_high * 1e6
+    omega = 2 * math.pi * f_hz
+    x_l = inductor_impedance(f_hz, l_nh).imag
+    open_bank_pf = bank_admittance(f_hz, codes=0).imag / omega * 1e12
+    return 1e12 / (omega * x_l) - open_bank_pf
+
+
+def code_response(l_nh, c_fixed_pf, codes, f_min_hz, f_max_hz, iterations=40, step=1e-4):
+    """
+    Tuned centre, loaded Q and efficiency for each code. The centre is the
+    zero of the tank reactance, found by bisection on all codes at once
+    (NaN if it lies outside f_min_hz..f_max_hz). Q is (w/2R) dX/dw at the
+    centre and efficiency the share of the real part that is R_L.
+    """
+    codes = np.asarray(codes)
+    low = np.full(codes.shape, float(f_min_hz))
+    high = np.full(codes.shape, float(f_max_hz))
+    valid = ((tank_impedance(low, l_nh, c_fixed_pf, codes).imag < 0) &
+             (tank_impedance(high, l_nh, c_fixed_pf, codes).imag > 0))
+    for _ in range(iterations):
+        middle = np.sqrt(low * high)
+        above = tank_impedance(middle, l_nh, c_fixed_pf, codes).imag > 0
+        high = np.where(above, middle, high)
+        low = np.where(above, low, middle)
+    center_hz = np.sqrt(low * high)
+
+    z = tank_impedance(center_hz, l_nh, c_fixed_pf, codes)
+    slope = (tank_impedance(center_hz * (1 + step), l_nh, c_fixed_pf, codes).imag -
+             tank_impedance(center_hz * (1 - step), l_nh, c_fixed_pf, codes).imag) / (2 * step)
+    return {
+        "center_hz": np.where(valid, center_hz, np.nan),
+        "q": np.where(valid, slope / (2 * z.real), np.nan),
+        "efficiency": np.where(valid, R_L_OHMS / z.real, np.nan),
+    }
 
 # --- Main Script Logic ---
 
-def generate_tuning_table():
-    """Generates the full tuning table data using the optimized C_fixed strategy."""
-    
-    tuning_points_by_band = defaultdict(list)
-    
-    for i, band in enumerate(BAND_PLAN):
-        name, f_low, f_high = band
-        l_nh = INDUCTOR_ASSIGNMENTS_NH[i]
-        f_center_mhz = (f_low + f_high) / 2
-        q_factor = (2 * math.pi * f_center_mhz * 1e6 * (l_nh * 1e-9)) / R_L_OHMS
-
-        c_total_at_f_high = calculate_c_pf(f_high, l_nh)
-        
-        dedicated_c_fixed = 0
-        if c_total_at_f_high > C_FIXED_THRESHOLD_PF:
-            dedicated_c_fixed = c_total_at_f_high
-
-        for step in range(TUNING_STEPS_PER_BAND):
-            if TUNING_STEPS_PER_BAND <= 1:
-                target_f = f_low
-            else:
-                target_f = f_high - (step * (f_high - f_low) / (TUNING_STEPS_PER_BAND - 1))
-
-            ideal_total_c = calculate_c_pf(target_f, l_nh)
-            
-            # Target for the switched bank is the part of total C not covered by dedicated C_fixed
-            target_c_for_bank = ideal_total_c - dedicated_c_fixed
-            
-            tuned_c_from_bank, combo_index = find_best_cap_combo(target_c_for_bank, CAP_BANK_PF)
-            
-            tuned_total_c = dedicated_c_fixed + tuned_c_from_bank
-            tuned_f = calculate_f_mhz(tuned_total_c, l_nh)
-
-            tuning_points_by_band[name].append({
-                "Tuned_F_center": tuned_f,
-                "Tuning_Code": combo_index,
-                "Tuned_C_from_Bank": tuned_c_from_bank,
-                "L_nH": l_nh,
-                "Q": q_factor,
-                "Dedicated_C_fixed": dedicated_c_fixed,
-                "F_low": f_low,
-                "F_high": f_high,
-            })
-
-    # Now, process the points to calculate the switchover frequencies
+def band_grid_hz(f_low, f_high, resolution_khz=TUNING_RESOLUTION_KHZ):
+    """Integer-Hz grid from F_low to F_high inclusive."""
+    step_hz = int(round(resolution_khz * 1e3))
+    low_hz, high_hz = int(round(f_low * 1e6)), int(round(f_high * 1e6))
+    grid_hz = np.arange(low_hz, high_hz + 1, step_hz)
+    if grid_hz[-1] != high_hz:
+        grid_hz = np.append(grid_hz, high_hz)
+    return grid_hz
+
+
+def effective_bank_index(f_hz):
+    """
+    BankIndex over the capacitance each bank bit adds when closed, as the
+    parasitic model sees it at f_hz, and the capacitance of the all-open
+    bank with PCB stray that those steps add to (both pF). Codes from the
+    index are bank codes; the model is additive over bits, so the index's
+    sums are each code's effective capacitance at f_hz.
+    """
+    omega = 2 * math.pi * f_hz
+    y_on, y_off = bit_admittances(f_hz)
+    steps_pf = (y_on - y_off).imag / omega * 1e12
+    open_pf = y_off.sum().imag / omega * 1e12 + PCB_STRAY_PF
+    return BankIndex(steps_pf[::-1]), open_pf
+
+
+def solve_band(band_index, resolution_khz=TUNING_RESOLUTION_KHZ):
+    """
+    Solves the best bank code on a grid across one band and merges runs of
+    identical codes. At each grid frequency the bank index proposes the
+    TUNING_CANDIDATES codes whose effective capacitance (at the band
+    centre) is nearest what the inductor needs, and the code among them
+    with the least tank reactance wins. Switch points fall halfway between
+    the last grid frequency of one run and the first of the next.
+    """
+    name, f_low, f_high = BAND_PLAN[band_index]
+    l_nh = INDUCTOR_ASSIGNMENTS_NH[band_index]
+    dedicated_c_fixed = dedicated_c_fixed_pf(f_high, l_nh)
+
+    grid_hz = band_grid_hz(f_low, f_high, resolution_khz)
+    low_hz, high_hz = grid_hz[0], grid_hz[-1]
+
+    # Capacitance that cancels the inductor's reactance at each frequency,
+    # less the parts that are always there
+    index, open_pf = effective_bank_index(math.sqrt(f_low * f_high) * 1e6)
+    omega = 2 * math.pi * grid_hz
+    needed_pf = 1e12 / (omega * inductor_impedance(grid_hz, l_nh).imag)
+    candidates = index.candidates(needed_pf - dedicated_c_fixed - open_pf, TUNING_CANDIDATES)
+
+    # Ties go to the lower code, as the full scan over codes did
+    reactance = np.abs(tank_impedance(grid_hz[:, None], l_nh, dedicated_c_fixed, candidates).imag)
+    tied = reactance == reactance.min(axis=1)[:, None]
+    codes = np.where(tied, candidates, np.iinfo(np.int64).max).min(axis=1)
+    bits = (codes[:, None] >> np.arange(len(CAP_BANK_PF))) & 1
+    bank_c = bits @ np.array(CAP_BANK_PF[::-1], dtype=float)
+
+    first = np.concatenate(([0], np.flatnonzero(np.diff(codes)) + 1))
+    starts_hz = np.concatenate(([low_hz], (grid_hz[first[1:] - 1] + grid_hz[first[1:]]) // 2))
+    ends_hz = np.concatenate((starts_hz[1:], [high_hz]))
+    response = code_response(l_nh, dedicated_c_fixed, codes[first], f_low * 0.5e6, f_high * 2e6)
+
+    return {
+        "name": name,
+        "l_nh": l_nh,
+        "q": (2 * math.pi * (f_low + f_high) / 2 * 1e6 * (l_nh * 1e-9)) / R_L_OHMS,
+        "dedicated_c_fixed": dedicated_c_fixed,
+        "f_low": f_low,
+        "f_high": f_high,
+        "starts_hz": starts_hz,
+        "ends_hz": ends_hz,
+        "codes": codes[first],
+        "bank_c": bank_c[first],
+        "tuned_f": response["center_hz"] / 1e6,
+        "loaded_q": response["q"],
+        "efficiency": response["efficiency"],
+        "grid_points": len(grid_hz),
+        "resolution_khz": resolution_khz,
+    }
+
+
+def generate_tuning_table(resolution_khz=TUNING_RESOLUTION_KHZ):
+    """
+    Generates the tuning table at the given resolution using the optimized
+    C_fixed strategy. Returns the CSV rows and the solved bands.
+    """
+    bands = [solve_band(i, resolution_khz) for i in range(len(BAND_PLAN))]
+
     final_csv_data = []
     header = [
-        "Band Name", "L (nH)", "Resulting Q", "Dedicated_C_fixed (pF)", 
+        "Band Name", "L (nH)", "Resulting Q", "Dedicated_C_fixed (pF)",
         "Tuning_Code (Hex)", "Tuned_C_from_Bank (pF)", "Tuned_F_center (MHz)",
-        "Switch_Freq_High (MHz)", "Switch_Freq_Low (MHz)"
+        "Switch_Freq_High (Hz)", "Switch_Freq_Low (Hz)",
+        "Loaded_Q", "Efficiency (%)"
     ]
     final_csv_data.append(header)
-    
-    for band_name, points in tuning_points_by_band.items():
-        points.sort(key=lambda p: p["Tuned_F_center"], reverse=True)
-        
-        for i, point in enumerate(points):
-            if i == 0:
-                switch_high = point["F_high"]
-            else:
-                midpoint = (point["Tuned_F_center"] + points[i-1]["Tuned_F_center"]) / 2
-                switch_high = midpoint
-
-            if i == len(points) - 1:
-                switch_low = point["F_low"]
-            else:
-                midpoint = (point["Tuned_F_center"] + points[i+1]["Tuned_F_center"]) / 2
-                switch_low = midpoint
-
-            row = [
-                band_name,
-                point["L_nH"],
-                f"{point['Q']:.1f}",
-                f"{point['Dedicated_C_fixed']:.1f}",
-                f"{point['Tuning_Code']:02X}",
-                point["Tuned_C_from_Bank"],
-                f"{point['Tuned_F_center']:.3f}",
-                f"{switch_high:.3f}",
-                f"{switch_low:.3f}"
-            ]
-            final_csv_data.append(row)
-            
-    return final_csv_data
+
+    for band in bands:
+        # Highest frequency first, as the firmware sweeps down from F_high
+        for k in reversed(range(len(band["codes"]))):
+            final_csv_data.append([
+                band["name"],
+                band["l_nh"],
+                f"{band['q']:.1f}",
+                f"{band['dedicated_c_fixed']:.1f}",
+                f"{band['codes'][k]:02X}",
+                f"{band['bank_c'][k]:g}",
+                f"{band['tuned_f'][k]:.3f}",
+                f"{band['ends_hz'][k]:d}",
+                f"{band['starts_hz'][k]:d}",
+                f"{band['loaded_q'][k]:.1f}",
+                f"{100 * band['efficiency'][k]:.1f}"
+            ])
+
+    return final_csv_data, bands
+
+
+def ideal_table_error_khz(band_index, resolution_khz=TUNING_RESOLUTION_KHZ):
+    """
+    Worst distance between a grid frequency and the real tuned centre of
+    the code an ideal 1/(2 pi sqrt(LC)) solve would pick there, in kHz.
+    This is the drift the parasitic-aware solve removes.
+    """
+    _, f_low, f_high = BAND_PLAN[band_index]
+    l_nh = INDUCTOR_ASSIGNMENTS_NH[band_index]
+    grid_hz = band_grid_hz(f_low, f_high, resolution_khz)
+
+    c_total_at_f_high = calculate_c_pf(f_high, l_nh)
+    c_fixed = c_total_at_f_high if c_total_at_f_high > C_FIXED_THRESHOLD_PF else 0
+    _, codes = find_best_cap_combo(calculate_c_pf(grid_hz / 1e6, l_nh) - c_fixed, CAP_BANK_PF)
+    center_hz = code_response(l_nh, c_fixed, codes, f_low * 0.5e6, f_high * 2e6)["center_hz"]
+    return np.nanmax(np.abs(center_hz - grid_hz)) / 1e3
+
+
+def table_error_khz(band):
+    """Worst distance between a frequency and the tuned centre of its table entry, in kHz."""
+    center_hz = band["tuned_f"] * 1e6
+    return np.nanmax(np.maximum(np.abs(center_hz - band["starts_hz"]), np.abs(center_hz - band["ends_hz"]))) / 1e3
+
+
+def code_response_table(bands):
+    """CSV rows of tuned centre, loaded Q and efficiency for every code that resonates near each band."""
+    rows = [["Band Name", "Tuning_Code (Hex)", "Tuned_F_center (MHz)", "Loaded_Q", "Efficiency (%)"]]
+    all_codes = np.arange(2 ** len(CAP_BANK_PF))
+    for band in bands:
+        response = code_response(band["l_nh"], band["dedicated_c_fixed"], all_codes,
+                                 band["f_low"] * 0.5e6, band["f_high"] * 2e6)
+        for code in np.flatnonzero(np.isfinite(response["center_hz"])):
+            rows.append([
+                band["name"],
+                f"{code:02X}",
+                f"{response['center_hz'][code] / 1e6:.4f}",
+                f"{response['q'][code]:.1f}",
+                f"{100 * response['efficiency'][code]:.1f}"
+            ])
+    return rows
+
+
+def build_firmware_table(bands):
+    """Packs the solved bands into TABLE_ENTRY records sorted by frequency."""
+    entries = []
+    for band_index, band in enumerate(bands):
+        run = np.zeros(len(band["codes"]) + 1, dtype=TABLE_ENTRY)
+        run["start_hz"][:-1] = band["starts_hz"]
+        run["code"][:-1] = band["codes"]
+        run["band"][:-1] = band_index
+        run["start_hz"][-1] = band["ends_hz"][-1] + 1
+        run["band"][-1] = NO_BAND
+        entries.append(run)
+    table = np.concatenate(entries)
+    table = table[np.argsort(table["start_hz"], kind="stable")]
+    if np.any(np.diff(table["start_hz"].astype(np.int64)) <= 0):
+        raise ValueError("Bands in BAND_PLAN overlap")
+    return table
+
+
+def write_binary_table(table, filename="pa_tank_tuning.bin"):
+    """Writes the table as a header followed by the packed little-endian entries."""
+    header = np.array([(TABLE_MAGIC, TABLE_VERSION, TABLE_ENTRY.itemsize, len(table))], dtype=TABLE_HEADER)
+    with open(filename, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(table.tobytes())
+    print(f"Successfully generated '{filename}' ({len(table)} entries, {TABLE_HEADER.itemsize + table.nbytes} bytes)")
+
+
+def write_c_header(table, resolution_khz, filename="PaTankTuning.h"):
+    """
+    Writes the table as a constexpr array the firmware can search directly.
+    resolution_khz is the grid the table was solved on, for the file comment.
+    """
+    band_names = ", ".join(f"{i} = {band[0]}" for i, band in enumerate(BAND_PLAN))
+    rows = ",\n".join(f"    {{{e['start_hz']:9d}, 0x{e['code']:02X}, {e['band']:3d}, 0}}" for e in table)
+    with open(filename, 'w') as f:
+        f.write(f"""/**
+ * @file {filename}
+ * @brief PA tank capacitor bank codes by frequency
+ *
+ * Generated by sim-stuff/build-eer-tank-tables.py at {resolution_khz:g} kHz
+ * resolution. Each entry applies from startHz up to the next entry's
+ * startHz; band {NO_BAND} means no tank setting (outside every band).
+ * Bands: {band_names}.
+ */
+
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <cstdint>
+
+namespace NexRig::HW {{
+
+struct TankTuningEntry {{
+  uint32_t startHz;
+  uint16_t code;
+  uint8_t band;
+  uint8_t reserved;
+}};
+
+inline constexpr uint8_t TankTuningNoBand = {NO_BAND};
+
+inline constexpr std::array<TankTuningEntry, {len(table)}> PaTankTuning{{{{
+{rows}
+}}}};
+
+/**
+ * @brief Finds the tank setting for a frequency by binary search
+ * @return The entry, or nullptr outside every band
+ */
+inline const TankTuningEntry* findTankTuning(uint32_t hz) {{
+  auto it = std::upper_bound(PaTankTuning.begin(), PaTankTuning.end(), hz,
+                             [](uint32_t f, const TankTuningEntry& e) {{ return f < e.startHz; }});
+  if (it == PaTankTuning.begin() || (--it)->band == TankTuningNoBand) {{
+    return nullptr;
+  }}
+  return &*it;
+}}
+
+}} // namespace NexRig::HW
+""")
+    print(f"Successfully generated '{filename}'")
+
+
+def lookup_code(table, frequency_hz):
+    """The firmware's search, for checking the packed table: code or None."""
+    index = np.searchsorted(table["start_hz"], frequency_hz, side="right") - 1
+    if index < 0 or table["band"][index] == NO_BAND:
+        return None
+    return int(table["code"][index])
+
 
 def write_csv_file(data, filename="pa_tank_tuning_optimized.csv"):
     """Writes the provided data to a CSV file."""
@@ -171,6 +444,25 @@ def write_csv_file(data, filename="pa_tank_tuning_optimized.csv"):
 
 
 if __name__ == "__main__":
-    table_data = generate_tuning_table()
+    start = time.perf_counter()
+    table_data, bands = generate_tuning_table()
+    elapsed = time.perf_counter() - start
     write_csv_file(table_data)
+    write_csv_file(code_response_table(bands), "pa_tank_code_response.csv")
+
+    firmware_table = build_firmware_table(bands)
+    write_binary_table(firmware_table)
+    resolution_khz = bands[0]["resolution_khz"]
+    write_c_header(firmware_table, resolution_khz)
+    grid_points = sum(band["grid_points"] for band in bands)
+    print(f"{grid_points} grid points at {resolution_khz:g} kHz merged into {len(firmware_table)} entries "
+          f"in {elapsed * 1e3:.0f} ms")
+
+    print(f"\n{'Band':<6} {'C_fixed (pF)':>12} {'Loaded Q':>11} {'Eff min (%)':>12} "
+          f"{'Error (kHz)':>12} {'Ideal (kHz)':>12}")
+    for band_index, band in enumerate(bands):
+        print(f"{band['name']:<6} {band['dedicated_c_fixed']:12.1f} "
+              f"{np.nanmin(band['loaded_q']):5.1f}-{np.nanmax(band['loaded_q']):<5.1f} "
+              f"{100 * np.nanmin(band['efficiency']):12.1f} {table_error_khz(band):12.1f} "
+              f"{ideal_table_error_khz(band_index, resolution_khz):12.1f}")
 
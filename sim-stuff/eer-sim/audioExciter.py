@@ -0,0 +1,198 @@
+import sys
+import os
+import tempfile
+import time
+import numpy as np
+from scipy import signal
+from scipy.io import wavfile
+from simParams import *
+from spectrum import WelchAccumulator, iterBlocks
+
+
+# --- Streamed WAV Input ---
+# wavfile's mmap keeps only the block being processed in memory, so a
+# file of any length streams at constant memory. Samples are scaled to
+# +/-1 and the first channel is used.
+def wavBlocks(path, blockSize=audioBlockSize):
+    rate, data = wavfile.read(path, mmap=True)
+    scale = float(2 ** (8 * data.dtype.itemsize - 1)) if data.dtype.kind == 'i' else 1.0
+    offset = 128.0 if data.dtype == np.uint8 else 0.0
+
+    def blocks():
+        for block in iterBlocks(data, blockSize):
+            block = block if block.ndim == 1 else block[:, 0]
+            yield (block.astype(float) - offset) / scale
+    return rate, blocks()
+
+
+# --- Hilbert SSB ---
+# I is the audio delayed to the transformer's centre tap and Q its Hilbert
+# transform, so I + jQ is the analytic signal: upper sideband, or lower
+# with Q negated. The FIRs keep their state between blocks; the I delay is
+# a FIFO of the last (N - 1) / 2 samples carried the same way.
+class HilbertSsb:
+    def __init__(self, sampleRate, upperSideband=True, numTaps=ssbFilterTaps,
+                 lowEdge=ssbLowEdge, highEdge=ssbHighEdge):
+        # Transition bands just outside the voice band keep the ripple low
+        edge = 0.8 * min(lowEdge, sampleRate / 2 - highEdge)
+        self.taps = -signal.remez(numTaps, [edge, sampleRate / 2 - edge], [1], type='hilbert', fs=sampleRate)
+        self.delaySamples = (numTaps - 1) // 2
+        self.bandpass = signal.firwin(numTaps, [lowEdge, highEdge], pass_zero=False, fs=sampleRate)
+        self.sign = 1 if upperSideband else -1
+        self.reset()
+
+    def reset(self):
+        self.bandState = np.zeros(len(self.bandpass) - 1)
+        self.iState = np.zeros(self.delaySamples)
+        self.qState = np.zeros(len(self.taps) - 1)
+
+    def process(self, audio):
+        audio, self.bandState = signal.lfilter(self.bandpass, 1.0, audio, zi=self.bandState)
+        delayed = np.concatenate((self.iState, audio))
+        i, self.iState = delayed[:len(audio)], delayed[len(audio):]
+        q, self.qState = signal.lfilter(self.taps, 1.0, audio, zi=self.qState)
+        return i + 1j * self.sign * q
+
+
+# --- Weaver SSB ---
+# The audio is mixed down by the centre of the passband, lowpassed to half
+# its width, and mixed back up by the same frequency, which leaves the
+# analytic SSB signal without needing a wideband 90 degree network. Both
+# oscillators keep their phase between blocks.
+class WeaverSsb:
+    def __init__(self, sampleRate, upperSideband=True, numTaps=ssbFilterTaps,
+                 lowEdge=ssbLowEdge, highEdge=ssbHighEdge):
+        self.sampleRate = sampleRate
+        self.centre = (lowEdge + highEdge) / 2
+        self.lowpass = signal.firwin(numTaps, (highEdge - lowEdge) / 2, fs=sampleRate)
+        self.sign = 1 if upperSideband else -1
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros(len(self.lowpass) - 1, dtype=complex)
+        self.sampleIndex = 0
+
+    def process(self, audio):
+        n = self.sampleIndex + np.arange(len(audio))
+        self.sampleIndex += len(audio)
+        oscillator = np.exp(2j * np.pi * self.centre / self.sampleRate * n)
+        baseband, self.state = signal.lfilter(self.lowpass, 1.0, audio * np.conj(oscillator), zi=self.state)
+        analytic = 2 * baseband * oscillator
+        return analytic if self.sign > 0 else np.conj(analytic)
+
+
+# --- EER Statistics ---
+# Streaming peak-to-average ratio, envelope CCDF, envelope spectrum and
+# instantaneous frequency of the phase path, all from fixed-size
+# accumulators.
+class EerStatistics:
+    def __init__(self, sampleRate, ccdfBins=4096, ccdfRange=4.0, fftSize=envelopeFftSize):
+        self.sampleRate = sampleRate
+        self.peak = 0.0
+        self.powerSum = 0.0
+        self.count = 0
+        self.ccdfEdges = np.linspace(0, ccdfRange, ccdfBins + 1)
+        self.ccdfCounts = np.zeros(ccdfBins + 1)
+        self.envelope = WelchAccumulator(sampleRate, fftSize, 'hann')
+        self.frequencyEdges = np.linspace(-sampleRate / 2, sampleRate / 2, 2049)
+        self.frequencyCounts = np.zeros(2048)
+        self.lastSample = 0j
+
+    def update(self, analytic):
+        amplitude = np.abs(analytic)
+        power = amplitude ** 2
+        self.peak = max(self.peak, float(np.max(power, initial=0)))
+        self.powerSum += float(np.sum(power))
+        self.count += len(analytic)
+
+        # Envelope histogram against the running RMS is impossible to keep
+        # exact, so levels are binned in absolute units and normalized later
+        index = np.minimum(np.searchsorted(self.ccdfEdges, amplitude, side='right') - 1, len(self.ccdfEdges) - 1)
+        self.ccdfCounts += np.bincount(index, minlength=len(self.ccdfCounts))
+        self.envelope.update(amplitude)
+
+        # Instantaneous frequency, weighted by power so silence does not count
+        previous = np.concatenate(([self.lastSample], analytic[:-1]))
+        frequency = np.angle(analytic * np.conj(previous)) * self.sampleRate / (2 * np.pi)
+        counts, _ = np.histogram(frequency, self.frequencyEdges, weights=power)
+        self.frequencyCounts += counts
+        if len(analytic):
+            self.lastSample = analytic[-1]
+
+    def papr(self):
+        return 10 * np.log10(self.peak / (self.powerSum / self.count))
+
+    def ccdf(self, probabilities=(1e-2, 1e-3, 1e-4)):
+        # Envelope power above its mean exceeded with each probability, in dB
+        exceed = 1 - np.cumsum(self.ccdfCounts) / self.count
+        rms = np.sqrt(self.powerSum / self.count)
+        levels = []
+        for p in probabilities:
+            k = np.searchsorted(-exceed, -p)
+            levels.append(20 * np.log10(max(self.ccdfEdges[min(k + 1, len(self.ccdfEdges) - 1)], 1e-12) / rms))
+        return np.array(levels)
+
+    def envelopeBandwidth(self, fraction=0.99):
+        # Frequency below which the given fraction of the envelope's AC power lies
+        freqs, psd = self.envelope.frequencies(), self.envelope.psd().copy()
+        psd[0] = 0
+        cumulative = np.cumsum(psd) / np.sum(psd)
+        return freqs[np.searchsorted(cumulative, fraction)]
+
+    def frequencySpread(self, fraction=0.99):
+        # Power-weighted span of instantaneous frequency holding the fraction
+        cumulative = np.cumsum(self.frequencyCounts) / np.sum(self.frequencyCounts)
+        tail = (1 - fraction) / 2
+        centres = (self.frequencyEdges[:-1] + self.frequencyEdges[1:]) / 2
+        return centres[np.searchsorted(cumulative, tail)], centres[np.searchsorted(cumulative, 1 - tail)]
+
+
+def eerStream(path, method='hilbert', upperSideband=True, blockSize=audioBlockSize):
+    # Yields (amplitude, phase) blocks for the EER decomposition
+    rate, blocks = wavBlocks(path, blockSize)
+    exciter = (HilbertSsb if method == 'hilbert' else WeaverSsb)(rate, upperSideband)
+    for block in blocks:
+        analytic = exciter.process(block)
+        yield np.abs(analytic), np.angle(analytic)
+
+
+def syntheticSpeech(path, seconds=60.0, rate=int(stm32SampleRate), seed=0):
+    # Stand-in for a recording: pitch pulses through a few formant
+    # resonators with a syllabic envelope and pauses
+    rng = np.random.default_rng(seed)
+    n = int(seconds * rate)
+    t = np.arange(n) / rate
+    pitch = 120 * (1 + 0.1 * np.sin(2 * np.pi * 0.7 * t))
+    pulses = np.diff(np.floor(np.cumsum(pitch) / rate), prepend=0)
+    voice = pulses + 0.05 * rng.standard_normal(n)
+    for formant, width in [(700, 130), (1200, 70), (2600, 160)]:
+        b, a = signal.iirpeak(formant, formant / width, fs=rate)
+        voice = voice + signal.lfilter(b, a, voice)
+    syllables = np.clip(np.sin(2 * np.pi * 4 * t) + 0.3 * rng.standard_normal(n // rate + 1).repeat(rate)[:n], 0, None)
+    voice *= syllables
+    wavfile.write(path, rate, (0.7 * voice / np.max(np.abs(voice)) * 32767).astype(np.int16))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = os.path.join(tempfile.gettempdir(), 'syntheticSpeech.wav')
+        syntheticSpeech(path)
+        print(f"No WAV given; streaming 60 s of synthetic speech from {path}")
+
+    print(f"\n{'Method':<8} {'PAPR (dB)':>10} {'CCDF 1e-2':>10} {'1e-3':>7} {'1e-4':>7} "
+          f"{'Env BW 99% (Hz)':>16} {'Inst freq 99% (Hz)':>20} {'x real time':>12}")
+    for method in ['hilbert', 'weaver']:
+        rate, blocks = wavBlocks(path)
+        exciter = (HilbertSsb if method == 'hilbert' else WeaverSsb)(rate)
+        statistics = EerStatistics(rate)
+        start = time.perf_counter()
+        for block in blocks:
+            statistics.update(exciter.process(block))
+        elapsed = time.perf_counter() - start
+        low, high = statistics.frequencySpread()
+        ccdf = statistics.ccdf()
+        print(f"{method:<8} {statistics.papr():10.2f} {ccdf[0]:10.2f} {ccdf[1]:7.2f} {ccdf[2]:7.2f} "
+              f"{statistics.envelopeBandwidth():16.0f} {f'{low:.0f} .. {high:.0f}':>20} "
+              f"{statistics.count / rate / elapsed:12.0f}")
@@ -0,0 +1,178 @@
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from multiprocessing import Pool
+from simParams import *
+from spectrum import WelchAccumulator, bandPower, iterBlocks
+
+
+# --- Band Edges and Masks ---
+# US amateur allocations in Hz. Each band's out-of-band mask is given as
+# (distance from the nearest channel edge, limit) breakpoints and is
+# interpolated in dB; beyond the last breakpoint the spurious limit
+# applies, as in 47 CFR 97.307(d). Every band shares the default mask
+# until one needs its own entry in OUT_OF_BAND_MASKS.
+BANDS = {
+    '160m': (1.8e6, 2.0e6), '80m': (3.5e6, 4.0e6), '60m': (5.3305e6, 5.4065e6),
+    '40m': (7.0e6, 7.3e6), '30m': (10.1e6, 10.15e6), '20m': (14.0e6, 14.35e6),
+    '17m': (18.068e6, 18.168e6), '15m': (21.0e6, 21.45e6), '12m': (24.89e6, 24.99e6),
+    '10m': (28.0e6, 29.7e6),
+}
+
+OUT_OF_BAND_MASK = [(0.0, -26.0), (channelBandwidth, -36.0), (2.5 * channelBandwidth, spuriousLimit)]
+OUT_OF_BAND_MASKS = {name: OUT_OF_BAND_MASK for name in BANDS}
+
+
+def bandFor(frequency):
+    for name, (low, high) in BANDS.items():
+        if low <= frequency <= high:
+            return name
+    raise ValueError(f'{frequency / 1e6:.4f} MHz is outside every band')
+
+
+def maskLimit(freqs, channelLow, channelHigh, mask=OUT_OF_BAND_MASK, spurious=spuriousLimit):
+    distance = np.maximum(np.maximum(channelLow - freqs, freqs - channelHigh), 0)
+    offsets, limits = zip(*mask)
+    limit = np.interp(distance, offsets, limits, right=spurious)
+    return np.where((freqs >= channelLow) & (freqs <= channelHigh), np.inf, limit)
+
+
+def referencePower(freqs, psd, bandwidth=complianceReferenceBandwidth):
+    # Power in a reference bandwidth centred on each bin
+    binWidth = freqs[1] - freqs[0]
+    width = max(1, int(round(bandwidth / binWidth)))
+    return np.convolve(psd, np.ones(width), 'same') * binWidth
+
+
+def occupiedBandwidth(freqs, psd, fLow, fHigh, fraction=0.99):
+    # Edges below and above which (1 - fraction) / 2 of the power lies
+    lo, hi = np.searchsorted(freqs, [fLow, fHigh])
+    cumulative = np.cumsum(psd[lo:hi])
+    cumulative /= cumulative[-1]
+    tail = (1 - fraction) / 2
+    return freqs[lo + np.searchsorted(cumulative, tail)], freqs[lo + np.searchsorted(cumulative, 1 - tail)]
+
+
+# --- Parallel Streaming PSD ---
+# The capture is split into contiguous runs of Welch segments, one per
+# worker. Each run is extended by the segment overlap so every worker sees
+# exactly the segments a single pass would, and each worker maps the file
+# itself, so nothing larger than a block is ever copied between processes.
+def openCapture(path):
+    return np.load(path, mmap_mode='r')
+
+
+def accumulateRun(path, start, stop, sampleRate, fftSize, blockSize):
+    data = openCapture(path)
+    accumulator = WelchAccumulator(sampleRate, fftSize, complexInput=np.iscomplexobj(data))
+    for block in iterBlocks(data[start:stop], blockSize):
+        accumulator.update(block)
+    return accumulator
+
+
+def streamPsd(path, sampleRate, fftSize=spectrumFftSize, workers=None, blockSize=spectrumBlockSize):
+    data = openCapture(path)
+    accumulator = WelchAccumulator(sampleRate, fftSize, complexInput=np.iscomplexobj(data))
+    segments = (len(data) - fftSize) // accumulator.hop + 1
+    if segments <= 0:
+        raise ValueError(f'Need at least {fftSize} samples, got {len(data)}')
+
+    workers = min(workers or os.cpu_count(), segments)
+    bounds = np.linspace(0, segments, workers + 1).astype(int)
+    runs = [(path, a * accumulator.hop, (b - 1) * accumulator.hop + fftSize, sampleRate, fftSize, blockSize)
+            for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    if workers == 1:
+        results = [accumulateRun(*run) for run in runs]
+    else:
+        with Pool(workers) as pool:
+            results = pool.starmap(accumulateRun, runs)
+    for result in results:
+        accumulator.merge(result)
+    accumulator.sampleCount = len(data)
+    return accumulator
+
+
+# --- Compliance Check ---
+# The channel is [carrier, carrier + channel] for upper sideband and the
+# mirror for lower. Mask margins are checked on both the averaged PSD and
+# the max-hold, each against the mean channel power from the average,
+# using the band's mask unless one is passed in.
+def checkCompliance(accumulator, carrier, band=None, centre=0.0, channel=channelBandwidth,
+                    upperSideband=True, mask=None, spurious=spuriousLimit,
+                    obwLimit=occupiedBandwidthLimit, referenceBandwidth=complianceReferenceBandwidth):
+    freqs = accumulator.frequencies() + centre
+    average = accumulator.psd()
+    band = bandFor(carrier) if band is None else band
+    mask = OUT_OF_BAND_MASKS[band] if mask is None else mask
+    bandLow, bandHigh = BANDS[band]
+    channelLow, channelHigh = (carrier, carrier + channel) if upperSideband else (carrier - channel, carrier)
+
+    channelPower = bandPower(freqs, average, channelLow, channelHigh)
+    obwLow, obwHigh = occupiedBandwidth(freqs, average, channelLow - 10 * channel, channelHigh + 10 * channel)
+    limit = maskLimit(freqs, channelLow, channelHigh, mask, spurious)
+
+    result = {
+        'band': band,
+        'channelPower': channelPower,
+        'obwLow': obwLow,
+        'obwHigh': obwHigh,
+        'obwMarginHz': obwLimit - (obwHigh - obwLow),
+        'bandEdgeMarginHz': min(obwLow - bandLow, bandHigh - obwHigh),
+    }
+    for name, psd in (('average', average), ('maxHold', accumulator.maxHold())):
+        level = 10 * np.log10(np.maximum(referencePower(freqs, psd, referenceBandwidth), 1e-300) / channelPower)
+        margin = limit - level
+        worst = int(np.argmin(margin))
+        result[name + 'MarginDb'] = margin[worst]
+        result[name + 'WorstFrequency'] = freqs[worst]
+    result['pass'] = (result['obwMarginHz'] >= 0 and result['bandEdgeMarginHz'] >= 0
+                      and result['averageMarginDb'] >= 0 and result['maxHoldMarginDb'] >= 0)
+    return result
+
+
+def printCompliance(result):
+    print(f"Band {result['band']}: {'PASS' if result['pass'] else 'FAIL'}")
+    print(f"  Occupied bandwidth:  {(result['obwHigh'] - result['obwLow']) / 1e3:.3f} kHz "
+          f"({result['obwLow'] / 1e6:.6f} .. {result['obwHigh'] / 1e6:.6f} MHz), margin {result['obwMarginHz']:.0f} Hz")
+    print(f"  Band edge margin:    {result['bandEdgeMarginHz'] / 1e3:.1f} kHz")
+    for name, label in (('average', 'Average'), ('maxHold', 'Max-hold')):
+        print(f"  {label + ' mask margin:':<22}{result[name + 'MarginDb']:.2f} dB at "
+              f"{result[name + 'WorstFrequency'] / 1e6:.6f} MHz")
+
+
+def writeTwoToneCapture(path, seconds, rate=sampleRate, blockSize=spectrumBlockSize):
+    # The reconstructed EER output of plotResults.py, written block by block
+    # into a memory-mapped .npy so the capture never has to fit in memory
+    count = int(seconds * rate)
+    capture = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(count,))
+    delay = int(buckDelay * rate)
+    for start in range(0, count, blockSize):
+        t = np.arange(start, min(start + blockSize, count)) / rate
+        audio = np.exp(1j * 2 * np.pi * tone1Frequency * t) + np.exp(1j * 2 * np.pi * tone2Frequency * t)
+        tDelayed = np.maximum(t - delay / rate, 0)
+        delayed = np.abs(np.exp(1j * 2 * np.pi * tone1Frequency * tDelayed) + np.exp(1j * 2 * np.pi * tone2Frequency * tDelayed))
+        capture[start:start + len(t)] = delayed * np.cos(np.angle(audio) + 2 * np.pi * carrierFrequency * t)
+    capture.flush()
+
+
+if __name__ == '__main__':
+    # compliance.py [capture.npy sampleRate carrier [band [centre]]]; complex
+    # captures are baseband around 'centre'
+    if len(sys.argv) > 3:
+        path, rate, carrier = sys.argv[1], float(sys.argv[2]), float(sys.argv[3])
+        band = sys.argv[4] if len(sys.argv) > 4 else None
+        centre = float(sys.argv[5]) if len(sys.argv) > 5 else 0.0
+    else:
+        path, rate, carrier, band, centre = os.path.join(tempfile.gettempdir(), 'eerCapture.npy'), sampleRate, carrierFrequency, None, 0.0
+        print(f"No capture given; writing 0.5 s of the two-tone EER output to {path}")
+        writeTwoToneCapture(path, 0.5)
+
+    for workers in (1, None):
+        start = time.perf_counter()
+        accumulator = streamPsd(path, rate, workers=workers)
+        elapsed = time.perf_counter() - start
+        print(f"{accumulator.segmentCount} segments with {workers or os.cpu_count()} worker(s) in {elapsed:.2f} s")
+    print()
+    printCompliance(checkCompliance(accumulator, carrier, band, centre))
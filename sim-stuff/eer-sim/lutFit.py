@@ -0,0 +1,227 @@
+import sys
+import numpy as np
+from simParams import *
+from spectrum import iterBlocks
+
+
+# --- Binned AM-AM / AM-PM Statistics ---
+# PA input/output pairs are complex baseband samples. Each pair is binned by
+# its normalized input amplitude; per-bin sums are accumulated with
+# np.bincount so any number of blocks can be folded in. Phase is averaged
+# as a unit vector so bins straddling +/-pi are handled correctly.
+class AmPmBinner:
+    def __init__(self, bins=lutFitBins, fullScale=1.0):
+        self.bins = bins
+        self.fullScale = fullScale
+        self.count = np.zeros(bins)
+        self.inputSum = np.zeros(bins)
+        self.outputSum = np.zeros(bins)
+        self.outputSquareSum = np.zeros(bins)
+        self.rotationSum = np.zeros(bins, dtype=complex)
+
+    def update(self, inputBlock, outputBlock):
+        inputBlock = np.asarray(inputBlock)
+        outputBlock = np.asarray(outputBlock)
+        amplitude = np.abs(inputBlock) / self.fullScale
+        index = np.minimum((amplitude * self.bins).astype(int), self.bins - 1)
+
+        # Unit vector of the output phase relative to the input phase
+        rotation = outputBlock * np.conj(inputBlock)
+        rotation = np.divide(rotation, np.abs(rotation), out=np.zeros_like(rotation), where=rotation != 0)
+
+        outputAmplitude = np.abs(outputBlock)
+        self.count += np.bincount(index, minlength=self.bins)
+        self.inputSum += np.bincount(index, amplitude, self.bins)
+        self.outputSum += np.bincount(index, outputAmplitude, self.bins)
+        self.outputSquareSum += np.bincount(index, outputAmplitude ** 2, self.bins)
+        self.rotationSum += np.bincount(index, rotation.real, self.bins) + 1j * np.bincount(index, rotation.imag, self.bins)
+
+    def means(self, minCount=1):
+        populated = self.count >= minCount
+        n = self.count[populated]
+        return {
+            'input': self.inputSum[populated] / n,
+            'gain': self.outputSum[populated] / n,
+            'gainSpread': np.sqrt(np.maximum(self.outputSquareSum[populated] / n - (self.outputSum[populated] / n) ** 2, 0)),
+            'phase': np.unwrap(np.angle(self.rotationSum[populated])),
+            'count': n,
+        }
+
+
+# --- Least-Squares Curve Fits ---
+
+def fitPolynomial(x, y, order, weights):
+    # Weighted least squares on a Vandermonde basis, solved in one lstsq call
+    basis = np.vander(x, order + 1, increasing=True)
+    w = np.sqrt(weights)
+    coefficients, *_ = np.linalg.lstsq(basis * w[:, None], y * w, rcond=None)
+    return coefficients
+
+
+def evaluatePolynomial(coefficients, x):
+    return np.polynomial.polynomial.polyval(x, coefficients)
+
+
+def fitAmPm(binner, order=lutFitOrder, minCount=4):
+    data = binner.means(minCount)
+    if len(data['input']) <= order:
+        raise ValueError(f"Only {len(data['input'])} populated bins for an order-{order} fit")
+
+    # AM-AM has no output at zero input, so it is fitted without a constant term
+    basis = np.vander(data['input'], order + 1, increasing=True)[:, 1:]
+    w = np.sqrt(data['count'])
+    gainTail, *_ = np.linalg.lstsq(basis * w[:, None], data['gain'] * w, rcond=None)
+    gainCoefficients = np.concatenate(([0.0], gainTail))
+    phaseCoefficients = fitPolynomial(data['input'], data['phase'], order, data['count'])
+    return data, gainCoefficients, phaseCoefficients
+
+
+# --- LUT Generation ---
+
+def buildAmAmLut(gainCoefficients, size=amAmLutSize, bits=dacBits, denseCount=8192):
+    # Invert the fitted AM-AM curve over its monotonic range so that LUT
+    # entry i drives the PA to i/(size-1) of the fitted full-scale output
+    x = np.linspace(0, 1, denseCount)
+    y = evaluatePolynomial(gainCoefficients, x)
+    rising = np.concatenate(([True], np.diff(y) > 0))
+    limit = np.argmin(rising) if not rising.all() else denseCount
+    x, y = x[:limit], y[:limit]
+
+    desired = np.linspace(0, 1, size) * y[-1]
+    drive = np.interp(desired, y, x)
+    maxCode = 2 ** bits - 1
+    codes = np.round(drive * maxCode).astype(np.uint16)
+    return codes, desired
+
+
+def buildAmPmLut(phaseCoefficients, carrier=carrierFrequency, size=amPmLutSize,
+                 taps=vdlTaps, psPerTap=vdlPsPerTap):
+    # A phase lead of phi at the carrier is cancelled by delaying the NCO
+    # edge by phi / (2 pi fc). The smallest correction becomes the static
+    # trim so that every LUT entry is a non-negative tap count.
+    amplitude = np.linspace(0, 1, size)
+    phase = evaluatePolynomial(phaseCoefficients, amplitude)
+    delayPs = phase / (2 * np.pi * carrier) * 1e12
+    staticTrimPs = delayPs.min()
+    ideal = (delayPs - staticTrimPs) / psPerTap
+    codes = np.round(ideal)
+    clipped = int(np.count_nonzero(codes > taps - 1))
+    codes = np.clip(codes, 0, taps - 1).astype(np.uint8)
+    return codes, delayPs, staticTrimPs, clipped
+
+
+# --- Error Report ---
+
+def errorReport(data, gainCoefficients, phaseCoefficients, amAmCodes, amAmDesired,
+                amPmCodes, amPmDelayPs, staticTrimPs, clipped, bits=dacBits,
+                carrier=carrierFrequency, psPerTap=vdlPsPerTap):
+    gainFit = evaluatePolynomial(gainCoefficients, data['input'])
+    gainErrorDb = 20 * np.log10(np.maximum(gainFit, 1e-12) / np.maximum(data['gain'], 1e-12))
+    phaseErrorDeg = np.degrees(evaluatePolynomial(phaseCoefficients, data['input']) - data['phase'])
+
+    # Output the fitted PA would produce from the quantized LUT codes
+    achieved = evaluatePolynomial(gainCoefficients, amAmCodes / (2 ** bits - 1))
+    fullScale = amAmDesired[-1]
+    amAmErrorPct = 100 * (achieved - amAmDesired) / fullScale
+
+    achievedDelayPs = staticTrimPs + amPmCodes.astype(float) * psPerTap
+    amPmErrorPs = achievedDelayPs - amPmDelayPs
+    amPmErrorDeg = 360 * carrier * amPmErrorPs * 1e-12
+
+    return {
+        'populatedBins': len(data['input']),
+        'gainFitRmsDb': np.sqrt(np.mean(gainErrorDb[data['input'] > 0.05] ** 2)),
+        'gainFitMaxDb': np.max(np.abs(gainErrorDb[data['input'] > 0.05])),
+        'phaseFitRmsDeg': np.sqrt(np.mean(phaseErrorDeg ** 2)),
+        'phaseFitMaxDeg': np.max(np.abs(phaseErrorDeg)),
+        'amAmQuantMaxPct': np.max(np.abs(amAmErrorPct)),
+        'amPmQuantMaxPs': np.max(np.abs(amPmErrorPs)),
+        'amPmQuantMaxDeg': np.max(np.abs(amPmErrorDeg)),
+        'amPmSpanTaps': int(amPmCodes.max()),
+        'amPmClipped': clipped,
+        'staticTrimPs': staticTrimPs,
+    }
+
+
+def printReport(report):
+    print(f"Populated bins:            {report['populatedBins']}")
+    print(f"AM-AM fit error:           {report['gainFitRmsDb']:.3f} dB rms, {report['gainFitMaxDb']:.3f} dB max")
+    print(f"AM-PM fit error:           {report['phaseFitRmsDeg']:.3f} deg rms, {report['phaseFitMaxDeg']:.3f} deg max")
+    print(f"AM-AM LUT quantization:    {report['amAmQuantMaxPct']:.4f} % of full scale max")
+    print(f"AM-PM LUT quantization:    {report['amPmQuantMaxPs']:.1f} ps max ({report['amPmQuantMaxDeg']:.3f} deg at carrier)")
+    print(f"AM-PM LUT span:            {report['amPmSpanTaps']} taps, {report['amPmClipped']} entries clipped")
+    print(f"Static VDL trim:           {report['staticTrimPs']:.1f} ps")
+
+
+# --- Output Files ---
+# The STM32 table is a C++ header in the firmware's style; the FPGA table is
+# one hex word per line for $readmemh into the SPRAM that holds it.
+
+def writeAmAmHeader(codes, filename='AmAmLut.h', bits=dacBits):
+    rows = [', '.join(f'{c:4d}' for c in codes[i:i + 16]) for i in range(0, len(codes), 16)]
+    body = ',\n    '.join(rows)
+    with open(filename, 'w') as f:
+        f.write(f"""/**
+ * @file {filename}
+ * @brief AM-AM predistortion table for the envelope DAC
+ *
+ * Generated by sim-stuff/eer-sim/lutFit.py. Index is the amplitude
+ * scaled to {len(codes)} steps; value is the {bits}-bit DAC code.
+ */
+
+#pragma once
+
+#include <array>
+#include <cstdint>
+
+namespace NexRig::DSP {{
+
+inline constexpr std::array<uint16_t, {len(codes)}> AmAmLut{{{{
+    {body}
+}}}};
+
+}} // namespace NexRig::DSP
+""")
+    print(f"AM-AM LUT written to {filename}")
+
+
+def writeAmPmHex(codes, filename='amPmLut.hex'):
+    with open(filename, 'w') as f:
+        f.write('\n'.join(f'{c:02x}' for c in codes) + '\n')
+    print(f"AM-PM LUT written to {filename}")
+
+
+def loadCapture(path):
+    # .npz with complex baseband 'input' and 'output' arrays of equal length
+    capture = np.load(path, mmap_mode='r')
+    return capture['input'], capture['output']
+
+
+def salehPa(x, alphaA=2.1587, betaA=1.1517, alphaP=4.0033, betaP=9.1040):
+    # Classic Saleh TWT model, used when no capture is given
+    r = np.abs(x)
+    gain = alphaA * r / (1 + betaA * r ** 2)
+    phase = alphaP * r ** 2 / (1 + betaP * r ** 2)
+    return gain * np.exp(1j * (np.angle(x) + phase))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        paInput, paOutput = loadCapture(sys.argv[1])
+    else:
+        rng = np.random.default_rng(1)
+        paInput = rng.uniform(0, 1, 2_000_000) * np.exp(2j * np.pi * rng.uniform(0, 1, 2_000_000))
+        paOutput = salehPa(paInput) * (1 + 0.01 * rng.standard_normal(len(paInput)))
+
+    binner = AmPmBinner(fullScale=np.max(np.abs(paInput)))
+    for x, y in zip(iterBlocks(paInput), iterBlocks(paOutput)):
+        binner.update(x, y)
+
+    data, gainCoefficients, phaseCoefficients = fitAmPm(binner)
+    amAmCodes, amAmDesired = buildAmAmLut(gainCoefficients)
+    amPmCodes, amPmDelayPs, staticTrimPs, clipped = buildAmPmLut(phaseCoefficients)
+
+    printReport(errorReport(data, gainCoefficients, phaseCoefficients, amAmCodes, amAmDesired,
+                            amPmCodes, amPmDelayPs, staticTrimPs, clipped))
+    writeAmAmHeader(amAmCodes)
+    writeAmPmHex(amPmCodes)
@@ -0,0 +1,103 @@
+import numpy as np
+from simParams import *
+from spectrum import WelchAccumulator, twoToneMetrics
+
+PHASE_BITS = 32
+OFFSET_BITS = 16
+
+
+# --- Bit-Exact Model of fpga/rtl/nco.sv ---
+# Per rising clock edge, with enable high:
+#   phaseNext      = phaseAccumulator + freqControl
+#   phaseModulated = phaseNext + {phaseOffset, 16'h0}
+#   phaseAccumulator <= phaseNext
+#   rfOut <= phaseModulated[31], rfOutN <= ~phaseModulated[31]
+# and with enable low the accumulator holds and both outputs go low.
+# A whole block of clocks is evaluated at once: the accumulator is a uint32
+# cumulative sum, which wraps modulo 2^32 exactly as the 32-bit register does.
+class Nco:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.phaseAccumulator = np.uint32(0)
+        self.rfOut = np.uint8(0)
+        self.rfOutN = np.uint8(1)
+
+    def process(self, freqControl, phaseOffset, enable=True):
+        # Element k of each result is the register value after the k-th
+        # rising edge of the block
+        phaseOffset = np.atleast_1d(np.asarray(phaseOffset, dtype=np.uint16))
+        count = len(phaseOffset)
+        if count == 0:
+            empty = np.zeros(0, dtype=np.uint8)
+            return empty, empty.copy(), np.zeros(0, dtype=np.uint32)
+        freqControl = np.broadcast_to(np.asarray(freqControl, dtype=np.uint32), (count,))
+        enable = np.broadcast_to(np.asarray(enable, dtype=bool), (count,))
+
+        increments = np.where(enable, freqControl, np.uint32(0)).astype(np.uint32)
+        advanced = np.cumsum(increments, dtype=np.uint32)
+        accumulator = self.phaseAccumulator + np.concatenate(([np.uint32(0)], advanced[:-1])).astype(np.uint32)
+
+        phaseNext = accumulator + freqControl
+        phaseModulated = phaseNext + (phaseOffset.astype(np.uint32) << np.uint32(16))
+        msb = (phaseModulated >> np.uint32(31)).astype(np.uint8)
+
+        rfOut = np.where(enable, msb, 0).astype(np.uint8)
+        rfOutN = np.where(enable, msb ^ 1, 0).astype(np.uint8)
+
+        self.phaseAccumulator = np.uint32((int(self.phaseAccumulator) + int(advanced[-1])) % 2 ** PHASE_BITS)
+        self.rfOut, self.rfOutN = rfOut[-1], rfOutN[-1]
+        return rfOut, rfOutN, phaseModulated
+
+
+def frequencyControlWord(frequency, clockRate=ncoClockRate):
+    return np.uint32(int(round(frequency / clockRate * 2 ** PHASE_BITS)) % 2 ** PHASE_BITS)
+
+
+def phaseOffsetWord(phase):
+    # Radians to the 16-bit offset added to the accumulator's upper half
+    words = np.round(np.asarray(phase) / (2 * np.pi) * 2 ** OFFSET_BITS).astype(np.int64)
+    return (words & (2 ** OFFSET_BITS - 1)).astype(np.uint16)
+
+
+def gateDrive(rfOut, rfOutN):
+    # Same polarity as np.sign(np.sin(phase)): MSB clear is the positive half
+    return rfOutN.astype(float) - rfOut.astype(float)
+
+
+def phaseRadians(phaseModulated):
+    return phaseModulated.astype(float) * (2 * np.pi / 2 ** PHASE_BITS)
+
+
+if __name__ == '__main__':
+    # Spurs from accumulator and offset quantization over a whole capture,
+    # processed block by block. Each signal is compared against the same
+    # construction from the ideal floating-point phase.
+    blockSize = 2 ** 20
+    carrierWord = frequencyControlWord(carrierFrequency)
+    quantizedCarrier = float(carrierWord) / 2 ** PHASE_BITS * ncoClockRate
+    print(f"Carrier {carrierFrequency / 1e6:.6f} MHz -> FCW 0x{int(carrierWord):08X} "
+          f"({quantizedCarrier / 1e6:.9f} MHz, error {quantizedCarrier - carrierFrequency:+.4f} Hz)")
+
+    nco = Nco()
+    spectra = {name: WelchAccumulator(ncoClockRate) for name in ['Ideal EER', 'NCO EER', 'NCO phase sine']}
+    totalSamples = int(simulationDuration * ncoClockRate)
+    for start in range(0, totalSamples, blockSize):
+        t = np.arange(start, min(start + blockSize, totalSamples)) / ncoClockRate
+        complexAudio = np.exp(1j * 2 * np.pi * tone1Frequency * t) + np.exp(1j * 2 * np.pi * tone2Frequency * t)
+        amplitude = np.abs(complexAudio)
+        modulation = np.angle(complexAudio)
+
+        # The NCO registers its output one clock after the phase it samples
+        idealPhase = modulation + 2 * np.pi * carrierFrequency * (t + 1 / ncoClockRate)
+        rfOut, rfOutN, phaseModulated = nco.process(carrierWord, phaseOffsetWord(modulation))
+        spectra['Ideal EER'].update(amplitude * np.sign(np.sin(idealPhase)))
+        spectra['NCO EER'].update(amplitude * gateDrive(rfOut, rfOutN))
+        spectra['NCO phase sine'].update(amplitude * np.sin(phaseRadians(phaseModulated)))
+
+    print(f"\n{'Signal':<16} {'IMD3 (dBc)':>11} {'IMD5 (dBc)':>11} {'Max spur (dBc)':>15} {'at (MHz)':>12}")
+    for name, accumulator in spectra.items():
+        metrics = twoToneMetrics(accumulator, carrierFrequency, tone1Frequency, tone2Frequency)
+        print(f"{name:<16} {metrics['imd3Dbc']:11.2f} {metrics['imd5Dbc']:11.2f} "
+              f"{metrics['maxSpurDbc']:15.2f} {metrics['maxSpurFrequency'] / 1e6:12.6f}")
@@ -0,0 +1,158 @@
+import sys
+import time
+import numpy as np
+from scipy import linalg, signal
+from simParams import *
+from spectrum import WelchAccumulator, iterBlocks, twoToneMetrics
+
+
+# --- Netlist Parsing ---
+# Only the R, L, C and V cards of netlist.cir matter here; everything else
+# (the .INCLUDE, the .control block) is ngspice housekeeping.
+SPICE_SUFFIXES = {'T': 1e12, 'G': 1e9, 'MEG': 1e6, 'K': 1e3, 'M': 1e-3,
+                  'U': 1e-6, 'N': 1e-9, 'P': 1e-12, 'F': 1e-15}
+
+
+def spiceValue(text):
+    text = text.upper()
+    number = text.rstrip('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+    suffix = text[len(number):]
+    for name in sorted(SPICE_SUFFIXES, key=len, reverse=True):
+        if suffix.startswith(name):
+            return float(number) * SPICE_SUFFIXES[name]
+    return float(number)
+
+
+def parseNetlist(path=paNetlist):
+    elements = []
+    inControl = False
+    with open(path) as f:
+        for line in f:
+            words = line.split()
+            if not words or words[0].startswith('*'):
+                continue
+            card = words[0].upper()
+            if card == '.CONTROL':
+                inControl = True
+            elif card == '.ENDC':
+                inControl = False
+            elif not inControl and card[0] in 'RLC':
+                elements.append((card, words[1], words[2], spiceValue(words[3])))
+            elif not inControl and card[0] == 'V':
+                elements.append((card, words[1], words[2], 0.0))
+    return elements
+
+
+# --- Continuous-Time State Space ---
+# Modified nodal analysis with node voltages and inductor currents as the
+# state: E dx/dt = -G x + B u. The bridge is an ideal switch, so its output
+# is the supply voltage times the gate polarity, seen through the source
+# resistor. In netlist.cir the SIN source sits directly across R1, so R1 is
+# taken as that source resistance.
+def buildStateSpace(elements, source='V1', sourceResistor='R1', outputNode='BPFout'):
+    byName = {e[0]: e for e in elements}
+    driven = byName[source.upper()][1]
+    nodes = sorted({n for e in elements for n in e[1:3] if n != '0'})
+    index = {n: i for i, n in enumerate(nodes)}
+    inductors = [e for e in elements if e[0][0] == 'L']
+    size = len(nodes) + len(inductors)
+
+    E = np.zeros((size, size))
+    G = np.zeros((size, size))
+    B = np.zeros((size, 1))
+
+    def stamp(matrix, a, b, value):
+        for p, q, sign in ((a, a, 1), (b, b, 1), (a, b, -1), (b, a, -1)):
+            if p != '0' and q != '0':
+                matrix[index[p], index[q]] += sign * value
+
+    for name, a, b, value in elements:
+        if name == sourceResistor.upper():
+            # Series source resistance between the bridge and the driven node
+            G[index[driven], index[driven]] += 1 / value
+            B[index[driven], 0] += 1 / value
+        elif name[0] == 'R':
+            stamp(G, a, b, 1 / value)
+        elif name[0] == 'C':
+            stamp(E, a, b, value)
+
+    for k, (name, a, b, value) in enumerate(inductors):
+        row = len(nodes) + k
+        E[row, row] = value
+        for node, sign in ((a, 1), (b, -1)):
+            if node != '0':
+                G[index[node], row] += sign
+                G[row, index[node]] -= sign
+
+    A = -np.linalg.solve(E, G)
+    Bc = np.linalg.solve(E, B)
+    C = np.zeros((1, size))
+    C[0, index[outputNode]] = 1
+    return A, Bc, C, np.zeros((1, 1))
+
+
+# --- Discretized Bridge and Tank ---
+# The matrices are discretized once with a first-order hold, which is exact
+# for the piecewise-linear PWL sources ngspice is fed. The discrete system is
+# then diagonalized, so each block is just one first-order complex lfilter
+# per mode, with the mode states carried between blocks.
+class BridgeTankModel:
+    def __init__(self, sampleRate=sampleRate, netlist=paNetlist, supplyScale=paSupplyScale,
+                 source='V1', sourceResistor='R1', outputNode='BPFout'):
+        self.supplyScale = supplyScale
+        A, B, C, D = buildStateSpace(parseNetlist(netlist), source, sourceResistor, outputNode)
+        Ad, Bd, Cd, Dd, _ = signal.cont2discrete((A, B, C, D), 1 / sampleRate, method='foh')
+
+        poles, vectors = linalg.eig(Ad)
+        if np.any(np.abs(poles) >= 1):
+            raise ValueError('Discretized tank is not stable')
+        self.poles = poles
+        self.inputGain = np.linalg.solve(vectors, Bd[:, 0])
+        self.outputGain = (Cd @ vectors)[0]
+        self.feedthrough = Dd[0, 0]
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros(len(self.poles), dtype=complex)
+
+    def process(self, gateDrive, amplitude):
+        # Returns the voltage at the output node for each input sample
+        drive = self.supplyScale * np.asarray(amplitude, dtype=float) * np.asarray(gateDrive, dtype=float)
+        output = self.feedthrough * drive
+        if len(drive) == 0:
+            return output
+        modes = np.zeros(len(drive), dtype=complex)
+        for k, pole in enumerate(self.poles):
+            # z[n+1] = pole z[n] + g u[n]: lfilter yields z[1..N] and the
+            # output needs z[0..N-1]
+            advanced, _ = signal.lfilter([self.inputGain[k]], [1, -pole], drive, zi=[pole * self.state[k]])
+            modes += self.outputGain[k] * np.concatenate(([self.state[k]], advanced[:-1]))
+            self.state[k] = advanced[-1]
+        return output + modes.real
+
+
+if __name__ == '__main__':
+    # Drop-in for the ngspice transient run: reads the two PWL files that
+    # twoToneSSB.py writes and saves the tank output in the same format
+    amplitudeFile, gateFile = (sys.argv[1:3] if len(sys.argv) > 2 else ('amplitude.txt', 'gateDrive.txt'))
+    amplitudeData = np.loadtxt(amplitudeFile)
+    t, amplitude = amplitudeData[:, 0], amplitudeData[:, 1]
+    gateDrive = np.loadtxt(gateFile)[:, 1]
+    rate = 1 / (t[1] - t[0])
+
+    start = time.perf_counter()
+    model = BridgeTankModel(rate)
+    output = np.concatenate([model.process(g, a) for g, a in zip(iterBlocks(gateDrive), iterBlocks(amplitude))])
+    elapsed = time.perf_counter() - start
+    print(f"{len(output)} samples ({len(output) / rate * 1e3:.1f} ms) in {elapsed * 1e3:.1f} ms")
+
+    spectrum = WelchAccumulator(rate)
+    for block in iterBlocks(output):
+        spectrum.update(block)
+    metrics = twoToneMetrics(spectrum, carrierFrequency, tone1Frequency, tone2Frequency)
+    print(f"IMD3: {metrics['imd3Dbc']:.2f} dBc")
+    print(f"IMD5: {metrics['imd5Dbc']:.2f} dBc")
+    print(f"Max spurious power level: {metrics['maxSpurDbc']:.2f} dB at {metrics['maxSpurFrequency'] / 1e6:.6f} MHz")
+
+    np.savetxt('paOutput.txt', np.vstack((t, output)).T, fmt='%e', delimiter=' ')
+    print('Tank output has been saved to paOutput.txt')
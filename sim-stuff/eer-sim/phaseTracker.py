@@ -0,0 +1,110 @@
+import numpy as np
+from scipy import signal
+from simParams import *
+from spectrum import WelchAccumulator, iterBlocks, twoToneMetrics
+
+
+def piGains(bandwidth, updateRate, damping=phaseTrackerDamping):
+    # Second-order loop with natural frequency 'bandwidth' in the usual
+    # small-wT approximation of the continuous-time PI design
+    wnT = 2 * np.pi * bandwidth / updateRate
+    return 2 * damping * wnT, wnT ** 2
+
+
+# --- PI Phase Tracking Loop ---
+# A type-2 digital PLL: the phase detector compares the drifting input with
+# the loop's estimate, a PI filter drives an integrating NCO, and the NCO's
+# phase is registered one update later. The phase error then follows
+#   E(z) / Theta(z) = (1 - z^-1)^2 / (1 + (Kp + Ki - 2) z^-1 + (1 - Kp) z^-2)
+# which lfilter runs as a state-space recursion, with its state carried from
+# block to block. The loop updates at updateRate and its estimate is held
+# between updates.
+class PhaseTracker:
+    def __init__(self, sampleRate=sampleRate, bandwidth=phaseTrackerBandwidth,
+                 damping=phaseTrackerDamping, updateRate=phaseTrackerUpdateRate,
+                 detectorNoise=0.0, seed=None):
+        self.decimation = max(1, int(round(sampleRate / updateRate)))
+        self.updateRate = sampleRate / self.decimation
+        self.kp, self.ki = piGains(bandwidth, self.updateRate, damping)
+        self.b = np.array([1.0, -2.0, 1.0])
+        self.a = np.array([1.0, self.kp + self.ki - 2, 1 - self.kp])
+        if np.any(np.abs(np.roots(self.a)) >= 1):
+            raise ValueError(f'Loop unstable: {bandwidth} Hz is too wide for {self.updateRate} Hz updates')
+
+        self.detectorNoise = detectorNoise
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros(2)
+        self.estimate = 0.0
+        self.sampleIndex = 0
+
+    def process(self, inputPhase):
+        # Returns the loop's phase estimate at every input sample
+        inputPhase = np.asarray(inputPhase, dtype=float)
+        first = (-self.sampleIndex) % self.decimation
+        self.sampleIndex += len(inputPhase)
+
+        detected = inputPhase[first::self.decimation]
+        if self.detectorNoise:
+            detected = detected + self.detectorNoise * self.rng.standard_normal(len(detected))
+        error, self.state = signal.lfilter(self.b, self.a, detected, zi=self.state)
+        updates = np.concatenate(([self.estimate], detected - error))
+        if len(detected):
+            self.estimate = updates[-1]
+
+        # Zero-order hold: sample j uses the latest update at or before it
+        held = (np.arange(len(inputPhase)) - first) // self.decimation + 1
+        return updates[held]
+
+    def errorResponse(self, frequencies):
+        # Magnitude of the phase error transfer at the given offsets, i.e.
+        # how much of the drift at each frequency is left uncorrected
+        _, response = signal.freqz(self.b, self.a, worN=np.asarray(frequencies, dtype=float), fs=self.updateRate)
+        return np.abs(response)
+
+
+def trackDrift(drift, tracker=None, blockSize=spectrumBlockSize):
+    tracker = PhaseTracker() if tracker is None else tracker
+    return np.concatenate([tracker.process(block) for block in iterBlocks(drift, blockSize)])
+
+
+def driftModel(t, totalDrift=totalPhaseDrift, wanderAmplitude=0.2, wanderFrequency=120.0,
+               randomWalk=0.5, seed=0):
+    # Linear thermal ramp, a slow periodic wander (e.g. supply ripple
+    # reaching the PA's AM-PM) and a random walk, all in radians
+    rng = np.random.default_rng(seed)
+    ramp = totalDrift * t / t[-1]
+    wander = wanderAmplitude * np.sin(2 * np.pi * wanderFrequency * t)
+    walk = np.cumsum(rng.standard_normal(len(t))) * randomWalk / np.sqrt(len(t))
+    return ramp + wander + walk
+
+
+if __name__ == '__main__':
+    # Residual phase error and the spectral regrowth it causes, over a sweep
+    # of loop bandwidths. The amplitude path is ideal so the loop is the only
+    # impairment.
+    t = np.arange(0, simulationDuration, 1 / sampleRate)
+    complexAudio = np.exp(1j * 2 * np.pi * tone1Frequency * t) + np.exp(1j * 2 * np.pi * tone2Frequency * t)
+    idealAmplitude = np.abs(complexAudio)
+    idealPhase = np.angle(complexAudio) + 2 * np.pi * carrierFrequency * t
+    drift = driftModel(t)
+    settled = t >= simulationDuration / 2
+
+    print(f"Drift: {totalPhaseDrift:.2f} rad ramp + 120 Hz wander + random walk, "
+          f"detector noise {phaseDetectorNoise} rad rms, updates at {phaseTrackerUpdateRate / 1e6:g} MHz")
+    print(f"\n{'BW (Hz)':>9} {'Kp':>10} {'Ki':>10} {'Rms err (rad)':>14} {'Peak err (rad)':>15} "
+          f"{'|E| @120Hz':>11} {'IMD3 (dBc)':>11} {'ACPR (dB)':>10}")
+    for bandwidth in [100, 300, 1e3, 3e3, 10e3, 30e3]:
+        tracker = PhaseTracker(bandwidth=bandwidth, detectorNoise=phaseDetectorNoise, seed=1)
+        residual = drift - trackDrift(drift, tracker)
+
+        spectrum = WelchAccumulator(sampleRate)
+        for a, p in zip(iterBlocks(idealAmplitude), iterBlocks(idealPhase + residual)):
+            spectrum.update(a * np.cos(p))
+        metrics = twoToneMetrics(spectrum, carrierFrequency, tone1Frequency, tone2Frequency)
+
+        print(f"{bandwidth:9.0f} {tracker.kp:10.3e} {tracker.ki:10.3e} "
+              f"{np.sqrt(np.mean(residual[settled] ** 2)):14.4f} {np.max(np.abs(residual[settled])):15.4f} "
+              f"{tracker.errorResponse([120.0])[0]:11.4f} {metrics['imd3Dbc']:11.2f} {metrics['acprDb']:10.2f}")
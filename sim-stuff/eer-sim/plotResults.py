@@ -1,8 +1,9 @@
 import numpy as np
-from scipy import fftpack
 import matplotlib.ticker as mtick
 import matplotlib.pyplot as plt
 from simParams import *
+from spectrum import welchPsd, twoToneMetrics
+from compliance import checkCompliance, printCompliance
 
 # Time vector
 t = np.arange(0, simulationDuration, 1 / sampleRate)
@@ -26,26 +27,27 @@ reconstructedSignal = delayedAmplitude * np.cos(idealPhase - phaseError)
 
 
 # --- Frequency Domain Analysis ---
-n_reconstructed = len(reconstructedSignal)
-yf_reconstructed = fftpack.fft(reconstructedSignal)
-x_reconstructed = fftpack.fftfreq(n_reconstructed, 1 / sampleRate)
+# Welch-averaged one-sided PSDs from the spectrum module (rfft, windowed)
+idealSpectrum = welchPsd(idealSignal, sampleRate)
+reconstructedSpectrum = welchPsd(reconstructedSignal, sampleRate)
+freqs = reconstructedSpectrum.frequencies()
 
-# FFT of the ideal signal
-n_ideal = len(idealSignal)
-yf_ideal = fftpack.fft(idealSignal)
-x_ideal = fftpack.fftfreq(n_ideal, 1 / sampleRate)
-
-
-# We only care about the positive frequencies
-half_n_ideal = n_ideal // 2
-half_n_reconstructed = n_reconstructed // 2
-ideal_fft_db = 20 * np.log10(np.abs(yf_ideal[:half_n_ideal]))
-reconstructed_fft_db = 20 * np.log10(np.abs(yf_reconstructed[:half_n_reconstructed]))
+# Express both spectra as tone-equivalent power so a sinusoid reads its own level
+ideal_psd_db = 10 * np.log10(np.maximum(idealSpectrum.psd() * idealSpectrum.enbw, 1e-30))
+reconstructed_psd_db = 10 * np.log10(np.maximum(reconstructedSpectrum.psd() * reconstructedSpectrum.enbw, 1e-30))
 
 # Normalize the frequency spectra to have a peak at 0 dB
-maxPower = np.max(reconstructed_fft_db)
-ideal_fft_normalized = ideal_fft_db - maxPower
-reconstructed_fft_normalized = reconstructed_fft_db - maxPower
+maxPower = np.max(reconstructed_psd_db)
+ideal_fft_normalized = ideal_psd_db - maxPower
+reconstructed_fft_normalized = reconstructed_psd_db - maxPower
+
+metrics = twoToneMetrics(reconstructedSpectrum, carrierFrequency, tone1Frequency, tone2Frequency)
+print(f"IMD3: {metrics['imd3Dbc']:.2f} dBc")
+print(f"IMD5: {metrics['imd5Dbc']:.2f} dBc")
+print(f"ACPR: {metrics['acprDb']:.2f} dB")
+max_spurious_power = metrics['maxSpurDbc']
+print(f"Max spurious power level: {max_spurious_power:.2f} dB at {metrics['maxSpurFrequency'] / 1e6:.6f} MHz")
+printCompliance(checkCompliance(reconstructedSpectrum, carrierFrequency))
 
 
 # --- Visualization ---
@@ -76,8 +78,8 @@ try:
 
     # Plot Frequency-domain signals
     plt.figure(figsize=(18, 12))
-    plt.plot(x_ideal[:half_n_ideal], ideal_fft_normalized, label='Ideal Signal')
-    plt.plot(x_reconstructed[:half_n_reconstructed], reconstructed_fft_normalized, label='Reconstructed with Delays')
+    plt.plot(freqs, ideal_fft_normalized, label='Ideal Signal')
+    plt.plot(freqs, reconstructed_fft_normalized, label='Reconstructed with Delays')
     plt.title('Frequency Spectrum Comparison')
     plt.xlabel('Frequency (MHz)')
     plt.ylabel('Power (dB)')
@@ -86,21 +88,6 @@ try:
     frequencyRange = 0.01 * carrierFrequency
     plt.xlim(carrierFrequency - frequencyRange, carrierFrequency + frequencyRange)
     
-    # Find the level of the highest spurious frequency
-    bin_size = sampleRate / n_reconstructed
-    tone1_bin = int((carrierFrequency + tone1Frequency) / bin_size)
-    tone2_bin = int((carrierFrequency + tone2Frequency) / bin_size)
-    
-    spurious_check_db = np.copy(reconstructed_fft_normalized)
-    
-    window_size_bins = 10
-    spurious_check_db[tone1_bin - window_size_bins : tone1_bin + window_size_bins] = -np.inf
-    spurious_check_db[tone2_bin - window_size_bins : tone2_bin + window_size_bins] = -np.inf
-    
-    max_spurious_power = np.max(spurious_check_db)
-    
-    print(f"Max spurious power level: {max_spurious_power:.2f} dB")
-    
     plt.axhline(y=max_spurious_power, color='r', linestyle='--', label='Max Spurious Level')
     
     plt.ylim(-60, 5)
@@ -9,3 +9,94 @@ tone2Frequency = 1900
 simulationDuration = 0.01
 buckDelay = 100e-6
 totalPhaseDrift = 2 * np.pi
+
+# --- Spectral Analysis Parameters ---
+
+spectrumFftSize = 2**18
+spectrumWindow = 'blackmanharris'
+spectrumOverlap = 0.5
+spectrumBlockSize = 2**20
+channelBandwidth = 3e3
+
+# --- Time Alignment Parameters ---
+
+stm32SampleRate = 48e3
+alignmentMaxDelay = 500e-6
+alignmentDecimation = 16
+alignmentBandwidth = 300e3
+# Fabric clock of the FPGA delay stage between the STM32's whole samples
+# and the VDL (the 240 MHz PLL clock in fpga/rtl/top.sv)
+fpgaDelayClock = 240e6
+
+# --- DPD LUT Parameters ---
+
+dacBits = 12
+amAmLutSize = 256
+amPmLutSize = 256
+vdlTaps = 256
+vdlPsPerTap = 50
+lutFitBins = 512
+lutFitOrder = 7
+
+# --- NCO Parameters ---
+# The NCO is clocked at the simulation sample rate. ncoModel.py's spur
+# study runs at any clock (240e6 for the PLL clock intended in
+# fpga/rtl/top.sv), but twoToneSSB.py feeds one NCO clock per simulation
+# sample and requires ncoClockRate == sampleRate
+
+ncoClockRate = sampleRate
+
+# --- Phase Tracking Loop Parameters ---
+
+phaseTrackerBandwidth = 2e3
+phaseTrackerDamping = 0.707
+phaseTrackerUpdateRate = 1e6
+phaseDetectorNoise = 0.01
+
+# --- Behavioral PA Parameters ---
+
+paNetlist = 'netlist.cir'
+paSupplyScale = 1.0
+
+# --- Supply Modulator Parameters ---
+# Averaged model of the Veer buck/boost (hw/eer-buckboost.kicad_sch)
+
+modulatorInputVoltage = 20.0
+modulatorMaxVoltage = 60.0
+modulatorLoad = 72.0
+modulatorInductance = 6.8e-6
+modulatorCapacitance = 10e-6
+modulatorCurrentLimit = 8.0
+modulatorSwitchingFrequency = 500e3
+modulatorBandwidth = 5e3
+envelopePeak = 2.0
+
+# --- STM32 DSP Chain Parameters ---
+
+hilbertTaps = 255
+cordicIterations = 20
+stm32DelaySamples = 20
+
+# --- Audio Exciter Parameters ---
+
+ssbLowEdge = 300.0
+ssbHighEdge = 3000.0
+ssbFilterTaps = 255
+audioBlockSize = 2**15
+envelopeFftSize = 8192
+
+# --- VDL Calibration Parameters ---
+
+vdlCalClock = 100e6
+vdlReferenceTemperature = 25.0
+vdlProcessSigma = 0.08
+vdlMismatchSigma = 0.05
+vdlTempco = 0.002
+vdlTempcoSigma = 0.1
+
+# --- Compliance Parameters ---
+# Limits in dBc relative to the mean power in the channel
+
+spuriousLimit = -43.0
+occupiedBandwidthLimit = 3e3
+complianceReferenceBandwidth = 500.0
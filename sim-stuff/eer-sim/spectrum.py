@@ -0,0 +1,203 @@
+import numpy as np
+from scipy import signal
+from simParams import *
+
+
+# --- Streaming Welch PSD ---
+# Accumulates a Welch power spectral density over an arbitrary number of
+# blocks. Segments that straddle a block boundary are completed from the
+# retained tail, so the result is independent of how the capture is split
+# and memory use is bounded by the block size. Real input gives the
+# one-sided PSD; complex baseband gives the two-sided PSD, ordered from
+# -fs/2 to +fs/2.
+class WelchAccumulator:
+    def __init__(self, sampleRate, fftSize=spectrumFftSize, window=spectrumWindow,
+                 overlap=spectrumOverlap, segmentsPerBatch=8, complexInput=False):
+        self.sampleRate = sampleRate
+        self.fftSize = fftSize
+        self.hop = max(1, int(round(fftSize * (1 - overlap))))
+        self.window = signal.get_window(window, fftSize)
+        self.segmentsPerBatch = segmentsPerBatch
+        self.complexInput = complexInput
+
+        # Density scaling (V^2/Hz), matching scipy.signal.welch(scaling='density')
+        self.scale = 1 / (sampleRate * np.sum(self.window ** 2))
+
+        # Equivalent noise bandwidth: a sinusoid's power is its peak density times this
+        self.enbw = sampleRate * np.sum(self.window ** 2) / np.sum(self.window) ** 2
+        self.mainlobeHalfWidth = windowMainlobeHalfWidth(self.window) * sampleRate / fftSize
+
+        bins = fftSize if complexInput else fftSize // 2 + 1
+        self.tail = np.zeros(0, dtype=complex if complexInput else float)
+        self.psdSum = np.zeros(bins)
+        self.psdMax = np.zeros(bins)
+        self.segmentCount = 0
+        self.sampleCount = 0
+
+    def update(self, block):
+        data = np.concatenate((self.tail, np.asarray(block, dtype=self.tail.dtype)))
+        self.sampleCount += len(block)
+        if len(data) < self.fftSize:
+            self.tail = data
+            return
+
+        count = (len(data) - self.fftSize) // self.hop + 1
+        segments = np.lib.stride_tricks.sliding_window_view(data, self.fftSize)[::self.hop][:count]
+
+        # Transform a few segments at a time to keep the working set small
+        for start in range(0, count, self.segmentsPerBatch):
+            batch = segments[start:start + self.segmentsPerBatch]
+            if self.complexInput:
+                spectra = np.abs(np.fft.fftshift(np.fft.fft(batch * self.window, axis=1), axes=1)) ** 2 * self.scale
+            else:
+                spectra = np.abs(np.fft.rfft(batch * self.window, axis=1)) ** 2 * self.scale
+                if self.fftSize % 2 == 0:
+                    spectra[:, 1:-1] *= 2
+                else:
+                    spectra[:, 1:] *= 2
+            self.psdSum += spectra.sum(axis=0)
+            np.maximum(self.psdMax, spectra.max(axis=0), out=self.psdMax)
+
+        self.segmentCount += count
+        self.tail = data[count * self.hop:].copy()
+
+    def merge(self, other):
+        # Fold in an accumulator that ran over a different part of the capture
+        self.psdSum += other.psdSum
+        np.maximum(self.psdMax, other.psdMax, out=self.psdMax)
+        self.segmentCount += other.segmentCount
+        self.sampleCount += other.sampleCount
+
+    def frequencies(self):
+        if self.complexInput:
+            return np.fft.fftshift(np.fft.fftfreq(self.fftSize, 1 / self.sampleRate))
+        return np.fft.rfftfreq(self.fftSize, 1 / self.sampleRate)
+
+    def psd(self):
+        if self.segmentCount == 0:
+            raise ValueError(f'Need at least {self.fftSize} samples, got {self.sampleCount}')
+        return self.psdSum / self.segmentCount
+
+    def maxHold(self):
+        if self.segmentCount == 0:
+            raise ValueError(f'Need at least {self.fftSize} samples, got {self.sampleCount}')
+        return self.psdMax.copy()
+
+
+def windowMainlobeHalfWidth(window, padFactor=16):
+    # First null of the window's transform, in bins of the unpadded FFT
+    response = np.abs(np.fft.rfft(window, len(window) * padFactor))
+    rising = np.flatnonzero(np.diff(response) > 0)
+    return (rising[0] if len(rising) else len(response)) / padFactor
+
+
+def iterBlocks(data, blockSize=spectrumBlockSize):
+    # Works on ordinary arrays and np.memmap / np.load(mmap_mode='r') alike
+    for start in range(0, len(data), blockSize):
+        yield data[start:start + blockSize]
+
+
+def welchPsd(data, sampleRate, fftSize=spectrumFftSize, window=spectrumWindow,
+             overlap=spectrumOverlap, blockSize=spectrumBlockSize):
+    accumulator = WelchAccumulator(sampleRate, fftSize, window, overlap)
+    for block in iterBlocks(data, blockSize):
+        accumulator.update(block)
+    return accumulator
+
+
+# --- Peak and Tone Detection ---
+
+def interpolatePeak(freqs, psd, index):
+    # Parabolic fit through the log power of the peak bin and its neighbours
+    # recovers the tone frequency and level between bins.
+    index = int(np.clip(index, 1, len(psd) - 2))
+    left, centre, right = 10 * np.log10(np.maximum(psd[index - 1:index + 2], 1e-300))
+    denominator = left - 2 * centre + right
+    offset = 0.5 * (left - right) / denominator if denominator != 0 else 0.0
+    offset = float(np.clip(offset, -0.5, 0.5))
+    peakDb = centre - 0.25 * (left - right) * offset
+    binWidth = freqs[1] - freqs[0]
+    return freqs[index] + offset * binWidth, 10 ** (peakDb / 10)
+
+
+def findTone(freqs, psd, frequency, searchHz):
+    lo, hi = np.searchsorted(freqs, [frequency - searchHz, frequency + searchHz])
+    hi = max(hi, lo + 1)
+    index = lo + int(np.argmax(psd[lo:hi]))
+    return interpolatePeak(freqs, psd, index)
+
+
+def tonePower(freqs, psd, frequency, enbw, searchHz):
+    peakFrequency, peakDensity = findTone(freqs, psd, frequency, searchHz)
+    return peakFrequency, peakDensity * enbw
+
+
+def detectTones(freqs, psd, enbw, fLow, fHigh, thresholdDb=-200.0, minSpacingHz=0.0):
+    # Returns interpolated (frequency, power) for every local maximum in range
+    lo, hi = np.searchsorted(freqs, [fLow, fHigh])
+    binWidth = freqs[1] - freqs[0]
+    spacing = max(1, int(round(minSpacingHz / binWidth)))
+    peaks, _ = signal.find_peaks(10 * np.log10(np.maximum(psd[lo:hi] * enbw, 1e-300)),
+                                 height=thresholdDb, distance=spacing)
+    result = [interpolatePeak(freqs, psd, lo + p) for p in peaks]
+    return np.array([(f, d * enbw) for f, d in result]).reshape(-1, 2)
+
+
+def bandPower(freqs, psd, fLow, fHigh):
+    lo, hi = np.searchsorted(freqs, [fLow, fHigh])
+    return np.sum(psd[lo:hi]) * (freqs[1] - freqs[0])
+
+
+# --- Two-Tone Metrics ---
+# IMD products are reported in dBc relative to the stronger of the two
+# tones; ACPR is the worse of the lower and upper adjacent channels relative
+# to the power in the occupied channel [carrier, carrier + channelBandwidth].
+def twoToneMetrics(accumulator, carrier, tone1, tone2, psd=None, span=None,
+                   channel=channelBandwidth):
+    freqs = accumulator.frequencies()
+    psd = accumulator.psd() if psd is None else psd
+    enbw = accumulator.enbw
+    guard = accumulator.mainlobeHalfWidth
+    search = min(guard, abs(tone2 - tone1) / 4)
+
+    f1, f2 = carrier + tone1, carrier + tone2
+    _, p1 = tonePower(freqs, psd, f1, enbw, search)
+    _, p2 = tonePower(freqs, psd, f2, enbw, search)
+    reference = max(p1, p2)
+
+    def productDbc(fa, fb):
+        _, power = tonePower(freqs, psd, fa, enbw, search)
+        lower = 10 * np.log10(power / reference)
+        _, power = tonePower(freqs, psd, fb, enbw, search)
+        upper = 10 * np.log10(power / reference)
+        return max(lower, upper)
+
+    imd3 = productDbc(2 * f1 - f2, 2 * f2 - f1)
+    imd5 = productDbc(3 * f1 - 2 * f2, 3 * f2 - 2 * f1)
+
+    mainPower = bandPower(freqs, psd, carrier, carrier + channel)
+    lowerAdjacent = bandPower(freqs, psd, carrier - channel, carrier)
+    upperAdjacent = bandPower(freqs, psd, carrier + channel, carrier + 2 * channel)
+    acpr = 10 * np.log10(max(lowerAdjacent, upperAdjacent) / mainPower)
+
+    # Highest peak anywhere in the span that is not one of the two tones
+    span = 0.01 * carrier if span is None else span
+    tones = detectTones(freqs, psd, enbw, carrier - span, carrier + span)
+    keep = (np.abs(tones[:, 0] - f1) > guard) & (np.abs(tones[:, 0] - f2) > guard)
+    spurs = tones[keep]
+    if len(spurs):
+        worst = np.argmax(spurs[:, 1])
+        maxSpurFrequency = spurs[worst, 0]
+        maxSpurDbc = 10 * np.log10(spurs[worst, 1] / reference)
+    else:
+        maxSpurFrequency, maxSpurDbc = np.nan, -np.inf
+
+    return {
+        'tone1Power': p1,
+        'tone2Power': p2,
+        'imd3Dbc': imd3,
+        'imd5Dbc': imd5,
+        'acprDb': acpr,
+        'maxSpurDbc': maxSpurDbc,
+        'maxSpurFrequency': maxSpurFrequency,
+    }
@@ -0,0 +1,195 @@
+import re
+import sys
+import time
+import numpy as np
+from scipy import signal
+from simParams import *
+from i2sWords import packFields
+from lutFit import AmPmBinner, buildAmAmLut, evaluatePolynomial, fitAmPm, salehPa
+from spectrum import iterBlocks
+
+
+# --- Q15 Helpers ---
+
+def toQ15(x):
+    return np.clip(np.round(np.asarray(x, dtype=float) * 32768), -32768, 32767).astype(np.int16)
+
+
+def roundShift(acc, shift):
+    # Round-half-up arithmetic shift, as the firmware's (acc + (1 << (s-1))) >> s
+    return (acc + (np.int64(1) << np.int64(shift - 1))) >> np.int64(shift)
+
+
+def saturate16(x):
+    return np.clip(x, -32768, 32767).astype(np.int16)
+
+
+def hilbertQ15(numTaps=hilbertTaps, edge=300.0):
+    # Type III equiripple Hilbert transformer quantized to Q15; the odd-indexed
+    # taps are exactly zero so the firmware can skip them. remez's taps lag
+    # by 90 degrees, so they are negated to give the analytic signal's Q.
+    taps = signal.remez(numTaps, [edge, stm32SampleRate / 2 - edge], [1], type='hilbert', fs=stm32SampleRate)
+    return toQ15(-taps)
+
+
+def loadAmAmHeader(path='AmAmLut.h'):
+    # The table body of a header written by lutFit.writeAmAmHeader
+    with open(path) as f:
+        body = f.read().split('{{', 1)[1].split('}}', 1)[0]
+    return np.array([int(v) for v in re.findall(r'\d+', body)], dtype=np.uint16)
+
+
+# --- Vectorized Integer CORDIC ---
+# Vectoring mode on int64 lanes: every sample of a block is rotated at once
+# and only the iterations are looped. Angles are 32-bit binary angles, so
+# the 16-bit phase word is the top half of the accumulated angle.
+CORDIC_ANGLES = np.array([round(np.arctan(2.0 ** -i) / (2 * np.pi) * 2 ** 32) for i in range(32)], dtype=np.int64)
+
+
+CORDIC_GUARD_BITS = 15
+
+
+def cordicVector(i, q, iterations=cordicIterations, guardBits=CORDIC_GUARD_BITS):
+    x = i.astype(np.int64) << np.int64(guardBits)
+    y = q.astype(np.int64) << np.int64(guardBits)
+    z = np.zeros(len(x), dtype=np.int64)
+
+    # Rotate the left half-plane by 180 degrees first
+    left = x < 0
+    x = np.where(left, -x, x)
+    y = np.where(left, -y, y)
+    z[left] = 2 ** 31
+
+    for k in range(iterations):
+        up = y < 0
+        dx, dy = y >> np.int64(k), x >> np.int64(k)
+        x = np.where(up, x - dx, x + dx)
+        y = np.where(up, y + dy, y - dy)
+        z = np.where(up, z - CORDIC_ANGLES[k], z + CORDIC_ANGLES[k])
+
+    # Magnitude keeps the guard bits; the caller rounds it to its word size
+    gain = np.prod(np.sqrt(1 + 2.0 ** (-2 * np.arange(iterations))))
+    inverseGain = np.int64(round(2 ** 31 / gain))
+    return roundShift(x * inverseGain, 31), z & np.int64(0xFFFFFFFF)
+
+
+# --- STM32 48 kS/s Chain ---
+# Q15 audio -> Hilbert FIR (64-bit accumulator, like arm_fir_q15) -> I/Q ->
+# CORDIC amplitude and phase -> AM-AM LUT -> N-sample circular buffer ->
+# DAC code, with the undelayed amplitude and phase packed into the I2S word
+# for the FPGA in the i2sWords.py layout.
+class Stm32Dsp:
+    def __init__(self, amAmLut=None, delaySamples=stm32DelaySamples, interpolate=False,
+                 numTaps=hilbertTaps, iterations=cordicIterations, upperSideband=True):
+        self.taps = hilbertQ15(numTaps).astype(np.int64)
+        self.centre = (numTaps - 1) // 2
+        self.sign = 1 if upperSideband else -1
+        self.iterations = iterations
+        self.lut = (np.round(np.linspace(0, 2 ** dacBits - 1, amAmLutSize)).astype(np.uint16)
+                    if amAmLut is None else np.asarray(amAmLut, dtype=np.uint16))
+        self.interpolate = interpolate
+        self.delaySamples = delaySamples
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(len(self.taps) - 1, dtype=np.int64)
+        self.delayLine = np.zeros(self.delaySamples, dtype=np.uint16)
+
+    def iq(self, audio):
+        x = np.concatenate((self.history, audio.astype(np.int64)))
+        self.history = x[len(x) - len(self.taps) + 1:]
+        q = saturate16(roundShift(np.convolve(x, self.taps, 'valid'), 15))
+        # I is the input delayed to the FIR's centre tap
+        i = x[len(self.taps) - 1 - self.centre:len(x) - self.centre].astype(np.int16)
+        return i, saturate16(self.sign * q.astype(np.int32))
+
+    def lookup(self, amplitude):
+        # Entry k of a lutFit table is for amplitude k / (size - 1) of full
+        # scale, so the address is scaled by (size - 1) with 16 fraction bits
+        position = amplitude.astype(np.int64) * (len(self.lut) - 1)
+        if not self.interpolate:
+            return self.lut[roundShift(position, 16)]
+        index = position >> np.int64(16)
+        fraction = position & 0xFFFF
+        lower = self.lut[index].astype(np.int64)
+        upper = self.lut[np.minimum(index + 1, len(self.lut) - 1)].astype(np.int64)
+        return (lower + roundShift((upper - lower) * fraction, 16)).astype(np.uint16)
+
+    def process(self, audio):
+        # Q15 audio block in; returns DAC codes, I2S words and the amplitude
+        # and phase words, all one per 48 kS/s sample
+        i, q = self.iq(np.asarray(audio, dtype=np.int16))
+        magnitude, angle = cordicVector(i, q, self.iterations)
+        amplitude = np.minimum(roundShift(magnitude, CORDIC_GUARD_BITS - 1), 65535).astype(np.uint16)
+        phase = (roundShift(angle, 16) & 0xFFFF).astype(np.uint16)
+
+        codes = self.lookup(amplitude)
+        delayed = np.concatenate((self.delayLine, codes))
+        self.delayLine = delayed[len(codes):]
+        dacCodes = delayed[:len(codes)]
+
+        return {
+            'dacCodes': dacCodes,
+            'i2sWords': packFields(amplitude, phase),
+            'amplitude': amplitude,
+            'phase': phase,
+        }
+
+
+def lutStudy(audio, gainCoefficients, sizes, interpolate, blockSize=2 ** 16):
+    # AM-AM error of the fitted PA driven through each LUT: the target for
+    # amplitude word a is a / 65536 of the fitted full-scale output
+    _, desired = buildAmAmLut(gainCoefficients, 2)
+    fullScale = desired[-1]
+    results = []
+    for size in sizes:
+        dsp = Stm32Dsp(buildAmAmLut(gainCoefficients, size)[0], delaySamples=0, interpolate=interpolate)
+        signalPower = errorPower = maxError = 0.0
+        for block in iterBlocks(audio, blockSize):
+            out = dsp.process(block)
+            target = out['amplitude'] / 65536 * fullScale
+            achieved = evaluatePolynomial(gainCoefficients, out['dacCodes'] / (2 ** dacBits - 1))
+            signalPower += np.sum(target ** 2)
+            errorPower += np.sum((achieved - target) ** 2)
+            maxError = max(maxError, np.max(np.abs(achieved - target)) / fullScale)
+        results.append((size, 10 * np.log10(signalPower / errorPower), 100 * maxError))
+    return results
+
+
+if __name__ == '__main__':
+    # Audio is a 48 kHz WAV given on the command line, or a minute of the
+    # simulation's two-tone signal
+    if len(sys.argv) > 1:
+        from scipy.io import wavfile
+        rate, audio = wavfile.read(sys.argv[1], mmap=True)
+        if rate != stm32SampleRate:
+            raise ValueError(f'{sys.argv[1]} is {rate} Hz; the chain runs at {stm32SampleRate:g} Hz')
+        audio = audio if audio.ndim == 1 else audio[:, 0]
+        if audio.dtype != np.int16:
+            audio = toQ15(audio / np.max(np.abs(audio)))
+    else:
+        t = np.arange(int(60 * stm32SampleRate)) / stm32SampleRate
+        audio = toQ15(0.45 * (np.sin(2 * np.pi * tone1Frequency * t) + np.sin(2 * np.pi * tone2Frequency * t)))
+
+    dsp = Stm32Dsp()
+    start = time.perf_counter()
+    for block in iterBlocks(audio, 2 ** 16):
+        out = dsp.process(block)
+    elapsed = time.perf_counter() - start
+    duration = len(audio) / stm32SampleRate
+    print(f"{duration:.1f} s of audio in {elapsed:.2f} s ({duration / elapsed:.0f}x real time)")
+    print(f"Last I2S word 0x{int(out['i2sWords'][-1]):08X}, DAC code {int(out['dacCodes'][-1])}")
+
+    # AM-AM LUT size against the Saleh PA used by lutFit.py
+    rng = np.random.default_rng(1)
+    paInput = rng.uniform(0, 1, 200_000) * np.exp(2j * np.pi * rng.uniform(0, 1, 200_000))
+    binner = AmPmBinner()
+    binner.update(paInput, salehPa(paInput))
+    _, gainCoefficients, _ = fitAmPm(binner)
+
+    print(f"\n{'LUT size':>9} {'SNR (dB)':>10} {'Max err (%)':>12} {'Interp SNR (dB)':>16} {'Interp max (%)':>15}")
+    study = audio[:int(10 * stm32SampleRate)]
+    sizes = [32, 64, 128, 256, 1024]
+    for direct, interpolated in zip(lutStudy(study, gainCoefficients, sizes, False),
+                                    lutStudy(study, gainCoefficients, sizes, True)):
+        print(f"{direct[0]:9d} {direct[1]:10.2f} {direct[2]:12.3f} {interpolated[1]:16.2f} {interpolated[2]:15.3f}")
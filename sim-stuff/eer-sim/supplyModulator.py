@@ -0,0 +1,201 @@
+import time
+import numpy as np
+from scipy import signal
+from simParams import *
+from spectrum import WelchAccumulator, detectTones, twoToneMetrics
+
+
+# --- Averaged Closed-Loop Modulator ---
+# The power stage is averaged to its output LC and load, driven by the
+# switch-node voltage. The control loop is represented by state feedback
+# placing the closed-loop poles on a Butterworth circle at the requested
+# bandwidth, with the reference scaled for unity DC gain. The buck-mode
+# plant is used throughout; the boost region's right half-plane zero only
+# lowers the bandwidth a real loop can reach.
+def closedLoopModel(bandwidth, inductance=modulatorInductance, capacitance=modulatorCapacitance,
+                    load=modulatorLoad):
+    A = np.array([[0.0, -1 / inductance], [1 / capacitance, -1 / (load * capacitance)]])
+    B = np.array([[1 / inductance], [0.0]])
+    C = np.array([[0.0, 1.0]])
+    wb = 2 * np.pi * bandwidth
+    pole = wb * np.exp(0.75j * np.pi)
+    poles = np.array([pole, np.conj(pole)])
+    K = signal.place_poles(A, B, poles).gain_matrix
+    closedA = A - B @ K
+    dcGain = (C @ np.linalg.solve(-closedA, B))[0, 0]
+    return closedA, B / dcGain, C, np.zeros((1, 1))
+
+
+def groupDelay(bandwidth, **kwargs):
+    # Low-frequency group delay, the part a time alignment calibration removes
+    A, B, C, D = closedLoopModel(bandwidth, **kwargs)
+    b, a = signal.ss2tf(A, B, C, D)
+    return a[-2] / a[-1] - b[0, -2] / b[0, -1]
+
+
+def firstIndex(test, start, stop, window=256):
+    # First index in start..stop-1 where test(a, b) is True over the slice
+    # a:b, searched in doubling windows so a short run costs a short scan
+    while start < stop:
+        end = min(stop, start + window)
+        hits = np.flatnonzero(test(start, end))
+        if len(hits):
+            return start + hits[0]
+        start, window = end, 2 * window
+    return stop
+
+
+def slewLimit(x, step, previous):
+    # Exact per-sample rate limit, evaluated a run at a time. Where x moves
+    # by no more than step per sample it passes through; from a sample out
+    # of reach the output is a ramp of step per sample, filled in one array
+    # operation, until x comes back within step of it.
+    y = x.copy()
+    jumps = np.flatnonzero(np.abs(np.diff(x)) > step) + 1
+    n = 0
+    while n < len(x):
+        if abs(x[n] - previous) <= step:
+            # Passes through up to the next jump in x itself
+            following = np.searchsorted(jumps, n + 1)
+            if following == len(jumps):
+                break
+            n = jumps[following]
+            previous = x[n - 1]
+            continue
+
+        # Ramp from previous towards x[n]; held(a, b) is the output before
+        # each sample a..b-1, and the ramp ends at the first sample within
+        # step of it (which passes through, or starts a ramp back)
+        direction = np.sign(x[n] - previous)
+        held = lambda a, b: previous + direction * step * np.arange(a - n, b - n)
+        end = firstIndex(lambda a, b: direction * (x[a:b] - held(a, b)) <= step, n, len(x))
+        y[n:end] = held(n + 1, end + 1)
+        previous = previous + direction * step * (end - n)
+        n = end
+    return y
+
+
+def rippleAmplitude(volts, inputVoltage=modulatorInputVoltage, inductance=modulatorInductance,
+                    capacitance=modulatorCapacitance, load=modulatorLoad,
+                    switchingFrequency=modulatorSwitchingFrequency):
+    # Peak-to-peak output ripple at the averaged operating point: inductor
+    # ripple into the capacitor when bucking, pulsed capacitor current when
+    # boosting
+    volts = np.clip(volts, 0, None)
+    buck = np.minimum(volts, inputVoltage)
+    inductorRipple = (inputVoltage - buck) * buck / (inputVoltage * inductance * switchingFrequency)
+    buckRipple = inductorRipple / (8 * capacitance * switchingFrequency)
+    duty = np.clip(1 - inputVoltage / np.maximum(volts, 1e-12), 0, 1)
+    boostRipple = volts / load * duty / (capacitance * switchingFrequency)
+    return np.where(volts > inputVoltage, boostRipple, buckRipple)
+
+
+class SupplyModulator:
+    def __init__(self, sampleRate=sampleRate, bandwidth=modulatorBandwidth, slewRate=None,
+                 ripple=True, peak=envelopePeak, maxVoltage=modulatorMaxVoltage,
+                 currentLimit=modulatorCurrentLimit, switchingFrequency=modulatorSwitchingFrequency):
+        # Amplitude-stream units in and out; 'peak' maps to maxVoltage
+        self.voltsPerUnit = maxVoltage / peak
+        self.maxVoltage = maxVoltage
+        if slewRate is None:
+            # The cycle-by-cycle current limit less the full-scale load current
+            slewRate = (currentLimit - maxVoltage / modulatorLoad) / modulatorCapacitance
+        self.step = slewRate / sampleRate
+        self.ripple = ripple
+        self.ripplePhaseStep = switchingFrequency / sampleRate
+
+        A, B, C, D = closedLoopModel(bandwidth)
+        discrete = signal.cont2discrete((A, B, C, D), 1 / sampleRate, method='zoh')
+        self.b, self.a = signal.ss2tf(*discrete[:4])
+        self.b = self.b[0]
+        self.reset()
+
+    def reset(self):
+        self.state = np.zeros(len(self.a) - 1)
+        self.previous = 0.0
+        self.sampleIndex = 0
+
+    def process(self, amplitude):
+        volts = np.asarray(amplitude, dtype=float) * self.voltsPerUnit
+        tracked, self.state = signal.lfilter(self.b, self.a, volts, zi=self.state)
+        limited = slewLimit(tracked, self.step, self.previous)
+        if len(limited):
+            self.previous = limited[-1]
+        output = np.clip(limited, 0, self.maxVoltage)
+
+        if self.ripple:
+            # Triangle at the switching frequency, phase continuous across blocks
+            phase = ((self.sampleIndex + np.arange(len(output))) * self.ripplePhaseStep) % 1.0
+            triangle = 2 * np.abs(2 * phase - 1) - 1
+            output = output + 0.5 * rippleAmplitude(output) * triangle
+        self.sampleIndex += len(output)
+        return output / self.voltsPerUnit
+
+
+# --- Bandwidth Sweep ---
+# Two-tone IMD3 at each band's centre for a range of modulator bandwidths,
+# with the modulator's group delay removed from the phase path as the time
+# alignment calibration would. The sample rate is raised in multiples of
+# the simulation rate to keep the carrier below 2/5 of it. The envelope
+# path never sees the carrier, so the bandwidth needed should come out the
+# same on every band; the ripple spurs at +/- the switching frequency are
+# what a band's tank and filters then have to remove.
+SWEEP_BANDS = [('160m', 1.9e6), ('80m', 3.75e6), ('60m', 5.3e6), ('40m', 7.15e6), ('30m', 10.12e6),
+               ('20m', 14.2e6), ('17m', 18.1e6), ('15m', 21.2e6), ('12m', 24.9e6), ('10m', 28.5e6)]
+
+
+def bandImd(carrier, bandwidth, blockSize=spectrumBlockSize, **kwargs):
+    rate = sampleRate * int(np.ceil(2.5 * carrier / sampleRate))
+    fftSize = int(2 ** np.ceil(np.log2(rate / 230)))
+    modulator = SupplyModulator(rate, bandwidth, **kwargs)
+    delay = groupDelay(bandwidth)
+    spectrum = WelchAccumulator(rate, fftSize)
+
+    def twoTone(t):
+        return np.exp(1j * 2 * np.pi * tone1Frequency * t) + np.exp(1j * 2 * np.pi * tone2Frequency * t)
+
+    totalSamples = int(simulationDuration * rate)
+    for start in range(0, totalSamples, blockSize):
+        t = np.arange(start, min(start + blockSize, totalSamples)) / rate
+        envelope = modulator.process(np.abs(twoTone(t)))
+        phase = np.angle(twoTone(t - delay)) + 2 * np.pi * carrier * t
+        spectrum.update(envelope * np.cos(phase))
+    metrics = twoToneMetrics(spectrum, carrier, tone1Frequency, tone2Frequency)
+
+    # Strongest ripple sideband, within a few tone spacings of carrier +/- fsw
+    freqs, psd = spectrum.frequencies(), spectrum.psd()
+    reference = max(metrics['tone1Power'], metrics['tone2Power'])
+    window = 4 * abs(tone2Frequency - tone1Frequency)
+    ripplePower = max(np.max(detectTones(freqs, psd, spectrum.enbw, f - window, f + window)[:, 1], initial=0)
+                      for f in (carrier - modulatorSwitchingFrequency, carrier + modulatorSwitchingFrequency))
+    metrics['rippleSpurDbc'] = 10 * np.log10(max(ripplePower, 1e-300) / reference)
+    return metrics
+
+
+def requiredBandwidth(bandwidths, imd, target):
+    # Log-interpolated bandwidth where IMD3 first drops below the target
+    meets = np.flatnonzero(np.asarray(imd) <= target)
+    if len(meets) == 0:
+        return np.inf
+    i = meets[0]
+    if i == 0:
+        return bandwidths[0]
+    fraction = (target - imd[i - 1]) / (imd[i] - imd[i - 1])
+    return 10 ** (np.log10(bandwidths[i - 1]) + fraction * np.log10(bandwidths[i] / bandwidths[i - 1]))
+
+
+if __name__ == '__main__':
+    targets = [-40.0, -50.0, -60.0, -70.0]
+    bandwidths = np.logspace(3, np.log10(300e3), 12)
+
+    start = time.perf_counter()
+    print(f"{'Band':>5} {'Carrier (MHz)':>14}" + ''.join(f" {f'BW@{x:.0f}dBc (kHz)':>17}" for x in targets)
+          + f" {'IMD3@' + format(modulatorBandwidth / 1e3, 'g') + 'kHz':>14} {'Ripple (dBc)':>13}")
+    for name, carrier in SWEEP_BANDS:
+        results = [bandImd(carrier, bw) for bw in bandwidths]
+        imd = [r['imd3Dbc'] for r in results]
+        nominal = bandImd(carrier, modulatorBandwidth)
+        required = [requiredBandwidth(bandwidths, imd, x) / 1e3 for x in targets]
+        print(f"{name:>5} {carrier / 1e6:14.3f}" + ''.join(f" {r:17.1f}" for r in required)
+              + f" {nominal['imd3Dbc']:14.2f} {nominal['rippleSpurDbc']:13.2f}")
+    print(f"\nSweep took {time.perf_counter() - start:.1f} s")
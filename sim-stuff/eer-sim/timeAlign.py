@@ -0,0 +1,233 @@
+import time
+import numpy as np
+from scipy import signal
+from simParams import *
+from spectrum import iterBlocks
+
+
+# --- Envelope Front End ---
+# Square-law detection: the lowpassed square of the RF output is half its
+# squared envelope, whatever the carrier phase, and the 2fc term is removed
+# by the same filter. The reference envelope is squared and filtered the
+# same way, so both paths share one shape and the filter's group delay
+# cancels out of the measured delay.
+class EnvelopeFrontEnd:
+    def __init__(self, sampleRate, rfInput=False, decimation=alignmentDecimation,
+                 bandwidth=alignmentBandwidth, numTaps=127):
+        self.gain = 2.0 if rfInput else 1.0
+        self.decimation = decimation
+        self.taps = signal.firwin(numTaps, bandwidth, fs=sampleRate)
+        self.state = np.zeros(numTaps - 1)
+        self.sampleIndex = 0
+
+    def process(self, block):
+        block = np.asarray(block, dtype=float)
+        filtered, self.state = signal.lfilter(self.taps, 1.0, self.gain * block ** 2, zi=self.state)
+
+        # Keep the decimation phase continuous across block boundaries
+        first = (-self.sampleIndex) % self.decimation
+        self.sampleIndex += len(block)
+        return filtered[first::self.decimation]
+
+
+# --- Coarse Lag Search ---
+# Accumulates the exact linear cross-correlation of the two envelopes over
+# the whole search range, block by block, with overlap-save FFTs. Only the
+# integer lag at the peak is used: the envelope's correlation peak is broad,
+# so its exact position is biased by the capture edges.
+class LagSearch:
+    def __init__(self, sampleRate, rfInput=False, maxDelay=alignmentMaxDelay,
+                 decimation=alignmentDecimation, bandwidth=alignmentBandwidth):
+        self.referencePath = EnvelopeFrontEnd(sampleRate, False, decimation, bandwidth)
+        self.measuredPath = EnvelopeFrontEnd(sampleRate, rfInput, decimation, bandwidth)
+        self.maxLag = int(np.ceil(maxDelay * sampleRate / decimation))
+        self.fftSize = int(2 ** np.ceil(np.log2(max(1024, 8 * self.maxLag))))
+        self.chunk = self.fftSize - 2 * self.maxLag
+        self.correlation = np.zeros(2 * self.maxLag + 1)
+
+        # Measured samples before the first reference sample are taken as zero
+        self.reference = np.zeros(0)
+        self.measured = np.zeros(self.maxLag)
+        self.chunkCount = 0
+
+    def update(self, referenceBlock, measuredBlock):
+        self.reference = np.concatenate((self.reference, self.referencePath.process(referenceBlock)))
+        self.measured = np.concatenate((self.measured, self.measuredPath.process(measuredBlock)))
+
+        while len(self.reference) >= self.chunk and len(self.measured) >= self.fftSize:
+            # Removing the reference mean is enough to cancel the envelope's
+            # DC term, which carries no timing information
+            r = self.reference[:self.chunk] - self.reference[:self.chunk].mean()
+            m = self.measured[:self.fftSize]
+            spectrum = np.conj(np.fft.rfft(r, self.fftSize)) * np.fft.rfft(m)
+            self.correlation += np.fft.irfft(spectrum, self.fftSize)[:2 * self.maxLag + 1]
+
+            self.reference = self.reference[self.chunk:]
+            self.measured = self.measured[self.chunk:]
+            self.chunkCount += 1
+
+    def lag(self):
+        if self.chunkCount == 0:
+            raise ValueError(f'Need at least {self.fftSize} decimated samples per path')
+        return int(np.argmax(self.correlation)) - self.maxLag
+
+
+# --- Fractional Delay Estimator ---
+# Welch cross-spectrum of the two envelopes with the measured stream
+# advanced by the coarse lag, so matching segments hold the same part of
+# the signal and the window only costs coherence, not phase. What is left
+# is a fraction of a sample, recovered from the phase slope of the averaged
+# cross-spectrum or from a parabola through its correlation peak.
+class FractionalDelay:
+    def __init__(self, sampleRate, rfInput=False, coarseLag=0,
+                 decimation=alignmentDecimation, bandwidth=alignmentBandwidth, segmentSize=8192):
+        self.rate = sampleRate / decimation
+        self.bandwidth = bandwidth
+        self.coarseLag = coarseLag
+        self.referencePath = EnvelopeFrontEnd(sampleRate, False, decimation, bandwidth)
+        self.measuredPath = EnvelopeFrontEnd(sampleRate, rfInput, decimation, bandwidth)
+        self.segmentSize = segmentSize
+        self.hop = segmentSize // 2
+        self.window = signal.get_window('hann', segmentSize)
+        self.crossSpectrum = np.zeros(segmentSize // 2 + 1, dtype=complex)
+        self.referenceSkip = max(0, -coarseLag)
+        self.measuredSkip = max(0, coarseLag)
+        self.reference = np.zeros(0)
+        self.measured = np.zeros(0)
+        self.segmentCount = 0
+
+    def update(self, referenceBlock, measuredBlock):
+        reference = self.referencePath.process(referenceBlock)
+        measured = self.measuredPath.process(measuredBlock)
+
+        # Apply the coarse lag by discarding the leading samples of one path
+        referenceDrop = min(self.referenceSkip, len(reference))
+        measuredDrop = min(self.measuredSkip, len(measured))
+        self.referenceSkip -= referenceDrop
+        self.measuredSkip -= measuredDrop
+        self.reference = np.concatenate((self.reference, reference[referenceDrop:]))
+        self.measured = np.concatenate((self.measured, measured[measuredDrop:]))
+
+        usable = min(len(self.reference), len(self.measured))
+        if usable < self.segmentSize:
+            return
+
+        count = (usable - self.segmentSize) // self.hop + 1
+        view = np.lib.stride_tricks.sliding_window_view
+        r = view(self.reference[:usable], self.segmentSize)[::self.hop][:count]
+        m = view(self.measured[:usable], self.segmentSize)[::self.hop][:count]
+        r = (r - r.mean(axis=1, keepdims=True)) * self.window
+        m = (m - m.mean(axis=1, keepdims=True)) * self.window
+        self.crossSpectrum += np.sum(np.conj(np.fft.rfft(r, axis=1)) * np.fft.rfft(m, axis=1), axis=0)
+
+        self.segmentCount += count
+        self.reference = self.reference[count * self.hop:].copy()
+        self.measured = self.measured[count * self.hop:].copy()
+
+    def delaySamples(self, refinement='phaseSlope'):
+        if self.segmentCount == 0:
+            raise ValueError(f'Need at least {self.segmentSize} decimated samples per path')
+
+        if refinement == 'parabolic':
+            correlation = np.fft.irfft(self.crossSpectrum, self.segmentSize)
+            peak = int(np.argmax(np.roll(correlation, 2)[:5])) - 2
+            left, centre, right = correlation[[peak - 1, peak, (peak + 1) % self.segmentSize]]
+            denominator = left - 2 * centre + right
+            offset = 0.5 * (left - right) / denominator if denominator != 0 else 0.0
+            return self.coarseLag + peak + offset
+
+        if refinement != 'phaseSlope':
+            raise ValueError(f'Unknown refinement {refinement!r}')
+
+        slope, _ = self.phaseSlope()
+        return self.coarseLag - slope * self.segmentSize / (2 * np.pi)
+
+    def phaseSlope(self):
+        # Weighted least-squares fit of phase = -2 pi k delta / L through the
+        # origin, and the standard error of its slope from the fit residuals.
+        # Leakage between the envelope's few strong lines bends the phase
+        # away from a straight line, so the residuals also carry the bias
+        # that repeating the measurement would not average out.
+        k = np.arange(len(self.crossSpectrum))
+        inBand = (k > 0) & (k * self.rate / self.segmentSize < self.bandwidth)
+        weight = np.abs(self.crossSpectrum[inBand])
+        phase = np.angle(self.crossSpectrum[inBand])
+        slope = np.sum(weight * k[inBand] * phase) / np.sum(weight * k[inBand] ** 2)
+        residual = phase - slope * k[inBand]
+        effectiveBins = np.sum(weight) ** 2 / np.sum(weight ** 2)
+        error = np.sqrt(np.sum(weight * residual ** 2) / np.sum(weight * k[inBand] ** 2)
+                        / max(effectiveBins - 1, 1))
+        return slope, error
+
+    def result(self, coarseRate=stm32SampleRate, fpgaRate=fpgaDelayClock, refinement='phaseSlope'):
+        # Split the delay over the two stages that apply it in whole steps:
+        # samples of the STM32's N-sample circular buffer and FPGA clock
+        # cycles. What is left (within half a clock) is the VDL's share,
+        # reported with the estimate's uncertainty; the tap setting for it
+        # comes from vdlCal.py's calibrated ps/tap, and is only worth
+        # applying where the uncertainty is below a tap.
+        delaySeconds = self.delaySamples(refinement) / self.rate
+        coarseSamples = int(np.round(delaySeconds * coarseRate))
+        remainder = delaySeconds - coarseSamples / coarseRate
+        fpgaCycles = int(np.round(remainder * fpgaRate))
+        fineResidual = remainder - fpgaCycles / fpgaRate
+        _, slopeError = self.phaseSlope()
+        return {
+            'delaySeconds': delaySeconds,
+            'uncertaintySeconds': slopeError * self.segmentSize / (2 * np.pi) / self.rate,
+            'coarseSamples': coarseSamples,
+            'fpgaCycles': fpgaCycles,
+            'fineResidualPs': fineResidual * 1e12,
+            'lag': self.coarseLag,
+        }
+
+
+def estimateAlignment(reference, measured, sampleRate, rfInput=False, coarseLag=None,
+                      coarseRate=stm32SampleRate, fpgaRate=fpgaDelayClock, refinement='phaseSlope',
+                      blockSize=spectrumBlockSize, maxDelay=alignmentMaxDelay,
+                      decimation=alignmentDecimation, bandwidth=alignmentBandwidth, maxIterations=3):
+    # A lag search pass, then the fractional estimate. A calibration sweep can
+    # pass the previous result's 'lag' as coarseLag and skip the search.
+    if coarseLag is None:
+        search = LagSearch(sampleRate, rfInput, maxDelay, decimation, bandwidth)
+        for r, m in zip(iterBlocks(reference, blockSize), iterBlocks(measured, blockSize)):
+            search.update(r, m)
+        coarseLag = search.lag()
+
+    # The fine estimate is only unbiased once the segments line up to within
+    # a sample, so re-centre on its rounded value until the lag settles
+    for _ in range(maxIterations):
+        estimator = FractionalDelay(sampleRate, rfInput, coarseLag, decimation, bandwidth)
+        for r, m in zip(iterBlocks(reference, blockSize), iterBlocks(measured, blockSize)):
+            estimator.update(r, m)
+        settledLag = int(np.round(estimator.delaySamples(refinement)))
+        if settledLag == coarseLag:
+            break
+        coarseLag = settledLag
+    return estimator.result(coarseRate, fpgaRate, refinement)
+
+
+if __name__ == '__main__':
+    # Calibration-style sweep: apply known envelope delays to the two-tone
+    # signal and check what the estimator recovers
+    t = np.arange(0, simulationDuration, 1 / sampleRate)
+    complexAudio = np.exp(1j * 2 * np.pi * tone1Frequency * t) + np.exp(1j * 2 * np.pi * tone2Frequency * t)
+    idealAmplitude = np.abs(complexAudio)
+    idealPhase = np.angle(complexAudio) + 2 * np.pi * carrierFrequency * t
+    spectrumOfAmplitude = np.fft.rfft(idealAmplitude)
+    bins = np.fft.rfftfreq(len(t), 1 / sampleRate)
+
+    print(f"{'Applied (us)':>14} {'Estimated (us)':>16} {'N':>4} {'FPGA clk':>9} {'Fine (ns)':>10} "
+          f"{'Error (ns)':>11} {'+/- (ns)':>9} {'Time (ms)':>10}")
+    for applied in [0.0, 12.345e-6, buckDelay, 104.1667e-6, 333.3e-6]:
+        delayed = np.fft.irfft(spectrumOfAmplitude * np.exp(-2j * np.pi * bins * applied), len(t))
+        rfOutput = delayed * np.cos(idealPhase)
+
+        start = time.perf_counter()
+        result = estimateAlignment(idealAmplitude, rfOutput, sampleRate, rfInput=True)
+        elapsed = time.perf_counter() - start
+
+        error = (result['delaySeconds'] - applied) * 1e9
+        print(f"{applied * 1e6:14.4f} {result['delaySeconds'] * 1e6:16.6f} {result['coarseSamples']:4d} "
+              f"{result['fpgaCycles']:9d} {result['fineResidualPs'] / 1e3:10.2f} "
+              f"{error:11.2f} {result['uncertaintySeconds'] * 1e9:9.2f} {elapsed * 1e3:10.1f}")
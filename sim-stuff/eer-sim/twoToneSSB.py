@@ -1,5 +1,7 @@
 import numpy as np
 from simParams import *
+from ncoModel import Nco, frequencyControlWord, phaseOffsetWord, gateDrive
+from phaseTracker import PhaseTracker
 
 # Time vector
 t = np.arange(0, simulationDuration, 1 / sampleRate)
@@ -32,14 +34,27 @@ delayedAmplitude = np.roll(idealAmplitude, buckDelaySamples)
 # It simulates the FPGA's NCO and phase-locking loop (PLL) logic
 # to track and correct for the input phase, including the baseline drift.
 def modelFpga(inputPhase, amplitude):
-    # A simple phase correction model to perfectly compensate for the drift
-    # In a real system, this would be a control loop (e.g., a PI controller)
-    # The FPGA would correct for the drift and any phase error
-    compensatedPhase = inputPhase - baselinePhaseDrift
+    # Each simulation sample is one NCO clock: the frequency word and the
+    # one-clock output register below assume the two rates are the same
+    if ncoClockRate != sampleRate:
+        raise ValueError(f'modelFpga clocks the NCO once per sample: ncoClockRate ({ncoClockRate:g} Hz) '
+                         f'must equal sampleRate ({sampleRate:g} Hz)')
+
+    # A PI phase tracking loop follows the drift and the FPGA subtracts its
+    # estimate, so the residual tracking error stays on the output phase.
+    # Loop bandwidth, damping and update rate are set in simParams.py.
+    tracker = PhaseTracker(detectorNoise=phaseDetectorNoise, seed=0)
+    compensatedPhase = inputPhase - tracker.process(baselinePhaseDrift)
+    
+    # The NCO generates the carrier itself; only the modulation reaches it,
+    # as the 16-bit phase offset word. Its output is registered one clock
+    # after the phase it samples, so the offset is taken one sample early.
+    modulation = compensatedPhase - 2 * np.pi * carrierFrequency * (t + 1 / ncoClockRate)
+    rfOut, rfOutN, _ = Nco().process(frequencyControlWord(carrierFrequency), phaseOffsetWord(modulation))
     
-    # Generate a square wave based on the compensated phase
+    # Generate a square wave from the bit-exact NCO model of fpga/rtl/nco.sv.
     # This models the NCO output driving a digital gate.
-    gateDriveSignal = np.sign(np.sin(compensatedPhase))
+    gateDriveSignal = gateDrive(rfOut, rfOutN)
     
     return gateDriveSignal
 
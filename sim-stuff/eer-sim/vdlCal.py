@@ -0,0 +1,114 @@
+import sys
+import time
+import numpy as np
+from simParams import *
+from lutFit import AmPmBinner, evaluatePolynomial, fitAmPm, salehPa
+
+
+# --- SB_CARRY Chain Population ---
+# Each simulated chip gets a process factor on the nominal ps/tap, its own
+# per-tap mismatch and its own temperature coefficient. The tempco scales
+# the whole chain, so a chip's tap delays at temperature T are its delays
+# at the reference temperature times (1 + tempco (T - Tref)).
+class VdlPopulation:
+    def __init__(self, chips, taps=vdlTaps, psPerTap=vdlPsPerTap, processSigma=vdlProcessSigma,
+                 mismatchSigma=vdlMismatchSigma, tempco=vdlTempco, tempcoSigma=vdlTempcoSigma, seed=0):
+        rng = np.random.default_rng(seed)
+        process = 1 + processSigma * rng.standard_normal((chips, 1))
+        mismatch = 1 + mismatchSigma * rng.standard_normal((chips, taps))
+        self.tapDelay = np.maximum(psPerTap * process * mismatch, 0)
+        # Tap k's output is delayed by the first k stages; tap 0 is undelayed
+        self.cumulative = np.concatenate((np.zeros((chips, 1)), np.cumsum(self.tapDelay, axis=1)[:, :-1]), axis=1)
+        self.tempco = tempco * (1 + tempcoSigma * rng.standard_normal(chips))
+
+    def scale(self, temperature):
+        return 1 + self.tempco * (np.asarray(temperature) - vdlReferenceTemperature)
+
+    def calibrate(self, temperature, clockRate=vdlCalClock):
+        # The calibration logic counts the taps a clock edge reaches within
+        # one period of the reference clock and divides the period by it
+        period = 1e12 / clockRate
+        reached = self.cumulative * self.scale(temperature)[:, None] <= period
+        count = np.maximum(np.count_nonzero(reached, axis=1) - 1, 1)
+        return period / count
+
+    def realizedDelay(self, codes, temperature):
+        rows = np.arange(len(codes))[:, None]
+        return self.cumulative[rows, codes] * self.scale(temperature)[:, None]
+
+
+def delayCodes(delayPs, psPerTap, taps=vdlTaps):
+    # lutFit.buildAmPmLut for a whole population at once: one row per chip
+    relative = delayPs - delayPs.min()
+    codes = np.round(relative[None, :] / np.asarray(psPerTap)[:, None])
+    return np.clip(codes, 0, taps - 1).astype(np.int64)
+
+
+# --- Temperature Trajectories ---
+# Ambient start and drift, self-heating towards a per-trajectory rise with
+# its own time constant, and a random walk, all in degrees C.
+def temperatureTrajectories(count, duration=3600.0, step=10.0, seed=1):
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration + step, step)
+    ambient = rng.uniform(0, 40, (count, 1)) + rng.uniform(-5, 5, (count, 1)) * t / 3600
+    rise = rng.uniform(5, 25, (count, 1)) * (1 - np.exp(-t / rng.uniform(60, 300, (count, 1))))
+    walk = np.cumsum(rng.standard_normal((count, len(t))), axis=1) * 0.05 * np.sqrt(step)
+    return t, ambient + rise + walk
+
+
+def residualError(population, temperatures, t, delayPs, interval, carrier=carrierFrequency):
+    # Recalibrate every 'interval' seconds (never if inf) and regenerate the
+    # LUT; return the rms and max AM-PM error over the LUT at each step, in
+    # degrees at the carrier
+    relative = delayPs - delayPs.min()
+    rms = np.zeros(temperatures.shape)
+    worst = np.zeros(temperatures.shape)
+    lastCalibration = -np.inf
+    for k in range(len(t)):
+        if t[k] - lastCalibration >= interval or k == 0:
+            codes = delayCodes(delayPs, population.calibrate(temperatures[:, k]))
+            lastCalibration = t[k]
+        error = population.realizedDelay(codes, temperatures[:, k]) - relative
+        degrees = 360 * carrier * error * 1e-12
+        rms[:, k] = np.sqrt(np.mean(degrees ** 2, axis=1))
+        worst[:, k] = np.max(np.abs(degrees), axis=1)
+    return rms, worst
+
+
+if __name__ == '__main__':
+    chips = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    targetDeg = 1.0
+
+    # AM-PM curve from the same Saleh fit lutFit.py uses by default
+    rng = np.random.default_rng(1)
+    paInput = rng.uniform(0, 1, 200_000) * np.exp(2j * np.pi * rng.uniform(0, 1, 200_000))
+    binner = AmPmBinner()
+    binner.update(paInput, salehPa(paInput))
+    _, _, phaseCoefficients = fitAmPm(binner)
+    phase = evaluatePolynomial(phaseCoefficients, np.linspace(0, 1, amPmLutSize))
+    delayPs = phase / (2 * np.pi * carrierFrequency) * 1e12
+
+    population = VdlPopulation(chips)
+    t, temperatures = temperatureTrajectories(chips)
+    calibrated = population.calibrate(np.full(chips, vdlReferenceTemperature))
+    actual = population.tapDelay.mean(axis=1)
+    print(f"{chips} chips, {len(t)} steps over {t[-1] / 60:.0f} min, AM-PM span {np.ptp(delayPs):.0f} ps "
+          f"at {carrierFrequency / 1e6:g} MHz")
+    print(f"ps/tap at {vdlReferenceTemperature:g} C: {actual.min():.1f} .. {actual.max():.1f}, "
+          f"calibration error {np.sqrt(np.mean((calibrated / actual - 1) ** 2)) * 100:.2f} % rms")
+    print(f"Temperature: {temperatures.min():.1f} .. {temperatures.max():.1f} C")
+
+    print(f"\n{'Recal every':>12} {'Median rms (deg)':>17} {'99% rms (deg)':>14} {'99% max (deg)':>14} "
+          f"{'> ' + format(targetDeg, 'g') + ' deg':>10} {'Time (s)':>9}")
+    longest = None
+    for interval in [np.inf, 1800, 600, 300, 60, 10]:
+        start = time.perf_counter()
+        rms, worst = residualError(population, temperatures, t, delayPs, interval)
+        elapsed = time.perf_counter() - start
+        peak = worst.max(axis=1)
+        label = 'never' if np.isinf(interval) else f'{interval:g} s'
+        print(f"{label:>12} {np.median(rms):17.3f} {np.percentile(rms.max(axis=1), 99):14.3f} "
+              f"{np.percentile(peak, 99):14.3f} {np.mean(peak > targetDeg) * 100:9.1f}% {elapsed:9.2f}")
+        if longest is None and np.percentile(peak, 99) <= targetDeg:
+            longest = label
+    print(f"\nLongest interval keeping 99% of chips within {targetDeg:g} deg: {longest or 'none tested'}")
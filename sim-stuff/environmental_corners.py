@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Environmental Corners of the Band Filters
+=========================================
+
+Centre-frequency and bandwidth drift of every band filter (band_filters.py)
+over temperature and relative humidity.
+
+Each part is given a material, and each material maps (T, RH) to a value
+factor against the 25 C / 50 % RH reference: FR4 permittivity from the
+humidity table in pcb-capacitor-design.py plus its 100 ppm/C tempco, NP0
+and X7R ceramic capacitors, iron-powder and ferrite-43 toroid permeability.
+Part of every tank's capacitance is pad and trace capacitance on FR4, so
+humidity reaches all builds, not only those with PCB capacitors.
+
+The filters of all bands are stacked along a leading axis and the T x RH
+grid along the next two, so every band at every corner is one call to
+band_filters.passband. Drift is reported against each band's own nominal
+response, and plotted as contour maps.
+"""
+
+import time
+
+import numpy as np
+
+import band_filters as filters
+
+# --- Configuration Constants ---
+
+REFERENCE_T_C = 25.0
+REFERENCE_RH = 50.0
+
+# Corner grid: -20..70 C and 10..95 % RH
+CORNER_TEMPERATURES_C = np.linspace(-20.0, 70.0, 46)
+CORNER_HUMIDITIES = np.linspace(10.0, 95.0, 35)
+
+# FR4 relative permittivity against RH (pcb-capacitor-design.py), and the
+# tempco of capacitance on FR4
+FR4_EPSILON_VS_RH = ((0.0, 4.3), (50.0, 4.4), (85.0, 4.6), (95.0, 4.8))
+FR4_TEMPCO_PPM = 100.0
+
+# Class-1 ceramic: the typical figure from the same table
+NP0_TEMPCO_PPM = 30.0
+
+# Class-2 ceramic is not linear: a typical X7R curve, fraction change
+# against 25 C (the table's 1500 ppm/C is its average slope above 25 C)
+X7R_DRIFT_VS_T = ((-55.0, -0.10), (-25.0, -0.035), (0.0, -0.005), (25.0, 0.0),
+                  (50.0, -0.025), (85.0, -0.08), (125.0, -0.15))
+
+# Iron-powder toroids: permeability tempco of the common mixes
+IRON_POWDER_TEMPCO_PPM = {"mix-2": 95.0, "mix-6": 35.0}
+
+# Ferrite 43 initial permeability against temperature, read off the
+# manufacturer's curve (Curie point about 130 C)
+FERRITE_43_MU_VS_T = ((-40.0, 560.0), (0.0, 700.0), (25.0, 800.0), (60.0, 1000.0),
+                      (100.0, 1250.0), (120.0, 1350.0))
+
+# Pad and trace capacitance at each tank node, part of the tank value
+NODE_STRAY_PF = 2.0
+
+# Part materials of each build. Inductor "iron-powder" is mix-2 on bands
+# up to 10 MHz and mix-6 above, as the mixes' frequency ranges suggest.
+FILTER_BUILDS = {
+    "np0": {"tank_c": "np0", "couple_c": "np0", "inductor": "iron-powder"},
+    "pcb-couple": {"tank_c": "np0", "couple_c": "fr4", "inductor": "iron-powder"},
+    "x7r": {"tank_c": "x7r", "couple_c": "x7r", "inductor": "iron-powder"},
+    "ferrite": {"tank_c": "np0", "couple_c": "np0", "inductor": "ferrite-43"},
+}
+DEFAULT_BUILD = "np0"
+
+CORNER_PLOT_FILE = "environmental_corners.png"
+
+
+# --- Materials ---
+
+def fr4_epsilon_r(t_c, rh):
+    """FR4 relative permittivity at temperature t_c and relative humidity rh (%)."""
+    table_rh, table_er = zip(*FR4_EPSILON_VS_RH)
+    er = np.interp(rh, table_rh, table_er)
+    return er * (1 + FR4_TEMPCO_PPM * 1e-6 * (np.asarray(t_c) - REFERENCE_T_C))
+
+
+def capacitor_factor(material, t_c, rh):
+    """Capacitance relative to its value at the reference conditions."""
+    t_c = np.asarray(t_c, dtype=float)
+    rh = np.asarray(rh, dtype=float)
+    if material == "fr4":
+        return fr4_epsilon_r(t_c, rh) / fr4_epsilon_r(REFERENCE_T_C, REFERENCE_RH)
+    if material == "np0":
+        return 1 + NP0_TEMPCO_PPM * 1e-6 * (t_c - REFERENCE_T_C) + 0 * rh
+    if material == "x7r":
+        table_t, table_drift = zip(*X7R_DRIFT_VS_T)
+        return 1 + np.interp(t_c, table_t, table_drift) + 0 * rh
+    raise ValueError(f"unknown capacitor material {material!r}")
+
+
+def inductor_factor(core, t_c):
+    """Inductance of a toroid relative to 25 C: follows the core permeability."""
+    t_c = np.asarray(t_c, dtype=float)
+    if core in IRON_POWDER_TEMPCO_PPM:
+        return 1 + IRON_POWDER_TEMPCO_PPM[core] * 1e-6 * (t_c - REFERENCE_T_C)
+    if core == "ferrite-43":
+        table_t, table_mu = zip(*FERRITE_43_MU_VS_T)
+        return np.interp(t_c, table_t, table_mu) / np.interp(REFERENCE_T_C, table_t, table_mu)
+    raise ValueError(f"unknown inductor core {core!r}")
+
+
+def inductor_core(build, band):
+    """The core material of a band's tank inductors in a build."""
+    core = FILTER_BUILDS[build]["inductor"]
+    if core == "iron-powder":
+        return "mix-2" if band["f_high_hz"] <= 10e6 else "mix-6"
+    return core
+
+
+# --- Corner Solve ---
+
+def corner_components(band, build, t_c, rh):
+    """
+    The filter parts of one band at temperatures t_c and humidities rh
+    (broadcast together), as band_filters.filter_components values.
+    """
+    materials = FILTER_BUILDS[build]
+    nominal = filters.filter_components(band)
+    stray_f = NODE_STRAY_PF * 1e-12
+    board = capacitor_factor("fr4", t_c, rh)
+    tank = capacitor_factor(materials["tank_c"], t_c, rh)
+    couple = capacitor_factor(materials["couple_c"], t_c, rh)
+    inductor = inductor_factor(inductor_core(build, band), t_c)
+
+    values = {}
+    for key, value in nominal.items():
+        if key.startswith("l"):
+            values[key] = value * inductor
+        elif key in ("c12_f", "c23_f"):
+            values[key] = value * couple
+        else:
+            values[key] = (value - stray_f) * tank + stray_f * board
+    return values
+
+
+def corner_grid(build=DEFAULT_BUILD, temperatures=CORNER_TEMPERATURES_C, humidities=CORNER_HUMIDITIES,
+                bands=None):
+    """
+    Passband of every band at every (T, RH) of the grid, in one batched
+    solve: arrays shaped (band, T, RH), with each band's nominal values and
+    the drift from them.
+    """
+    bands = filters.load_band_filters() if bands is None else bands
+    t_c = np.asarray(temperatures, dtype=float)[:, None]
+    rh = np.asarray(humidities, dtype=float)[None, :]
+
+    # Reference conditions as one more grid point, so nominal and corners
+    # come out of the same solve
+    t_all = np.concatenate([np.broadcast_to(t_c, (t_c.size, rh.size)).ravel(), [REFERENCE_T_C]])
+    rh_all = np.concatenate([np.broadcast_to(rh, (t_c.size, rh.size)).ravel(), [REFERENCE_RH]])
+    per_band = [corner_components(band, build, t_all, rh_all) for band in bands]
+    components = {key: np.stack([parts[key] for parts in per_band]) for key in per_band[0]}
+    # Each corner's sweep follows the middle tank's resonance, so large
+    # drifts (ferrite cores) keep their edges inside it
+    nominal = [filters.filter_components(band) for band in bands]
+    scale = np.stack([np.sqrt(nom["l2_h"] * nom["c2_f"] / (parts["l2_h"] * parts["c2_f"]))
+                      for nom, parts in zip(nominal, per_band)])
+    sweeps = np.stack([filters.nominal_sweep(band) for band in bands])[:, None, :] * scale[..., None]
+
+    result = filters.passband(sweeps, components)
+    grid = (len(bands), t_c.size, rh.size)
+    f_center, f_nominal = result["f_center_hz"][:, :-1].reshape(grid), result["f_center_hz"][:, -1]
+    bandwidth, bw_nominal = result["bandwidth_hz"][:, :-1].reshape(grid), result["bandwidth_hz"][:, -1]
+    return {
+        "bands": bands,
+        "build": build,
+        "temperatures_c": t_c.ravel(),
+        "humidities": rh.ravel(),
+        "f_center_hz": f_center,
+        "bandwidth_hz": bandwidth,
+        "nominal_f_center_hz": f_nominal,
+        "nominal_bandwidth_hz": bw_nominal,
+        "f_center_drift_ppm": (f_center / f_nominal[:, None, None] - 1) * 1e6,
+        "bandwidth_drift_pct": (bandwidth / bw_nominal[:, None, None] - 1) * 100,
+        "peak_db": result["peak_db"][:, :-1].reshape(grid),
+    }
+
+
+def corner_summary(grid):
+    """Per band: the worst centre shift (ppm and kHz) and bandwidth change over the grid, and where."""
+    rows = []
+    for i, band in enumerate(grid["bands"]):
+        drift = grid["f_center_drift_ppm"][i]
+        bw_drift = grid["bandwidth_drift_pct"][i]
+        t_index, rh_index = np.unravel_index(np.argmax(np.abs(drift)), drift.shape)
+        bw_t, bw_rh = np.unravel_index(np.argmax(np.abs(bw_drift)), bw_drift.shape)
+        rows.append({
+            "band": band["name"],
+            "f_center_mhz": grid["nominal_f_center_hz"][i] / 1e6,
+            "drift_ppm": float(drift[t_index, rh_index]),
+            "drift_khz": float(drift[t_index, rh_index] * grid["nominal_f_center_hz"][i] / 1e9),
+            "drift_at": (float(grid["temperatures_c"][t_index]), float(grid["humidities"][rh_index])),
+            "bandwidth_pct": float(bw_drift[bw_t, bw_rh]),
+            "bandwidth_at": (float(grid["temperatures_c"][bw_t]), float(grid["humidities"][bw_rh])),
+        })
+    return rows
+
+
+def plot_corners(grid, filename=CORNER_PLOT_FILE):
+    """Contour maps of centre-frequency drift (top row) and bandwidth drift (bottom row) per band."""
+    import matplotlib.pyplot as plt
+
+    bands = grid["bands"]
+    fig, axes = plt.subplots(2, len(bands), figsize=(3.2 * len(bands), 6.5), sharex=True, sharey=True)
+    t_c, rh = np.meshgrid(grid["temperatures_c"], grid["humidities"], indexing="ij")
+    for i, band in enumerate(bands):
+        for row, (key, unit) in enumerate((("f_center_drift_ppm", "ppm"), ("bandwidth_drift_pct", "%"))):
+            ax = axes[row, i]
+            filled = ax.contourf(t_c, rh, grid[key][i], levels=12, cmap="RdBu_r")
+            lines = ax.contour(t_c, rh, grid[key][i], levels=6, colors="k", linewidths=0.5)
+            ax.clabel(lines, fontsize=7, fmt="%.3g")
+            fig.colorbar(filled, ax=ax, label=unit)
+            if row == 0:
+                ax.set_title(f"{band['name']} {grid['nominal_f_center_hz'][i] / 1e6:.2f} MHz")
+            else:
+                ax.set_xlabel("Temperature (°C)")
+    axes[0, 0].set_ylabel("f0 drift\nRH (%)")
+    axes[1, 0].set_ylabel("BW drift\nRH (%)")
+    fig.suptitle(f"Band filter drift against {REFERENCE_T_C:g} °C / {REFERENCE_RH:g} % RH, build '{grid['build']}'")
+    fig.tight_layout()
+    fig.savefig(filename, dpi=120)
+    plt.close(fig)
+    return filename
+
+
+def print_summary(grid):
+    points = grid["f_center_hz"].size
+    print(f"\nBuild '{grid['build']}': {FILTER_BUILDS[grid['build']]}, {points} band corners")
+    print(f"{'Band':<6} {'f0 (MHz)':>9} {'Worst f0 drift':>22} {'at T, RH':>12} {'Worst BW drift':>15} {'at T, RH':>12}")
+    for row in corner_summary(grid):
+        print(f"{row['band']:<6} {row['f_center_mhz']:9.3f} {row['drift_ppm']:+9.0f} ppm {row['drift_khz']:+7.2f} kHz "
+              f"{row['drift_at'][0]:5.0f}, {row['drift_at'][1]:3.0f}% {row['bandwidth_pct']:+13.2f} % "
+              f"{row['bandwidth_at'][0]:5.0f}, {row['bandwidth_at'][1]:3.0f}%")
+
+
+if __name__ == "__main__":
+    for build in FILTER_BUILDS:
+        start = time.perf_counter()
+        grid = corner_grid(build)
+        elapsed = time.perf_counter() - start
+        print_summary(grid)
+        print(f"  solved in {elapsed:.2f} s")
+        if build == DEFAULT_BUILD:
+            default_grid = grid
+    print(f"\nContours of build '{DEFAULT_BUILD}' written to {plot_corners(default_grid)}")
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Ferrite and Iron-Powder Core Database
+=====================================
+
+Toroid and binocular cores used in the rig (the FT37/FT50/FT140/FT240
+toroids, the Fair-Rite 2843000202 binocular and the T-series iron-powder
+toroids of hw/Library.pretty and the design documents), with the data a
+wideband transformer design needs: catalogue AL, size, effective magnetic
+dimensions and complex permeability mu' - j mu'' against frequency for
+each mix.
+
+transformer_search evaluates every core x low-side turns x wire gauge
+for an impedance ratio over every band in one array expression: the
+magnetizing inductance and its core loss from mu' and mu'' at the band
+edges, copper loss with skin effect, peak flux density at the design
+power and whether the winding fits. It reports the smallest core that
+meets every limit on each band, the way transformer-design.py picks
+FT37-43 by hand.
+"""
+
+import math
+
+import numpy as np
+
+import band_filters as filters
+
+# --- Configuration Constants ---
+
+MU_0 = 4e-7 * math.pi
+COPPER_RESISTIVITY = 1.72e-8  # ohm m at 20 C
+
+# Complex permeability of each mix: (MHz, mu', mu''), read off the
+# manufacturers' curves. Ferrites fall off and turn lossy near their
+# resonance; iron powder is flat with a small loss term.
+MATERIALS = {
+    "43": {"mu_i": 800, "kind": "ferrite", "permeability": (
+        (0.1, 800, 8), (0.5, 800, 40), (1, 780, 110), (2, 720, 220), (5, 560, 360),
+        (10, 400, 420), (20, 230, 380), (30, 150, 320), (50, 80, 230), (100, 35, 130))},
+    "61": {"mu_i": 125, "kind": "ferrite", "permeability": (
+        (0.1, 125, 0.3), (1, 125, 0.4), (2.5, 125, 0.6), (10, 125, 3), (20, 128, 8),
+        (30, 130, 15), (50, 120, 40), (100, 70, 70), (200, 30, 60))},
+    "63": {"mu_i": 40, "kind": "ferrite", "permeability": (
+        (0.1, 40, 0.1), (1, 40, 0.1), (10, 40, 0.3), (30, 40, 0.6), (50, 40, 1.5),
+        (100, 38, 5), (200, 30, 12))},
+    "2": {"mu_i": 10, "kind": "iron powder", "permeability": (
+        (0.1, 10, 0.1), (1, 10, 0.05), (10, 10, 0.06), (30, 10, 0.1), (100, 9.8, 0.3))},
+    "6": {"mu_i": 8.5, "kind": "iron powder", "permeability": (
+        (0.1, 8.5, 0.1), (1, 8.5, 0.05), (10, 8.5, 0.04), (30, 8.5, 0.06), (100, 8.4, 0.15))},
+}
+
+# Toroid sizes: outside diameter, inside diameter, height in mm
+TOROID_SIZES_MM = {
+    "37": (9.53, 4.75, 3.18),
+    "50": (12.7, 7.14, 4.78),
+    "68": (17.5, 9.4, 4.83),
+    "80": (20.2, 12.6, 6.35),
+    "82": (20.96, 13.21, 6.35),
+    "114": (29.0, 19.05, 7.49),
+    "140": (35.55, 22.9, 12.7),
+    "240": (61.0, 35.55, 12.7),
+}
+
+# Binocular cores: length along the holes, width, height and hole
+# diameter in mm, with effective path length and area consistent with
+# the catalogue AL and the core volume
+BINOCULAR_SIZES_MM = {
+    "2843000202": {"size": (13.3, 14.0, 7.5), "hole": 3.8, "le": 19.5, "ae": 56.0},
+}
+
+# Catalogue AL in nH/turn^2 (Amidon; iron powder as listed uH/100 turns)
+CORE_AL_NH = {
+    "FT37-43": 420, "FT50-43": 523, "FT82-43": 557, "FT114-43": 603, "FT140-43": 952, "FT240-43": 1240,
+    "FT37-61": 55, "FT50-61": 68, "FT82-61": 73, "FT114-61": 79, "FT140-61": 140, "FT240-61": 173,
+    "FT37-63": 19, "FT50-63": 22, "FT140-63": 45,
+    "BN-43-202": 2890,
+    "T37-2": 4.0, "T50-2": 4.9, "T68-2": 5.7, "T80-2": 5.5,
+    "T37-6": 3.0, "T50-6": 4.0, "T68-6": 4.7, "T80-6": 4.5,
+}
+
+# Fair-Rite part numbers of the cores named that way in the library
+FAIR_RITE_PARTS = {"BN-43-202": "2843000202", "FT50-43": "5943000601", "FT140-43": "5943003801",
+                   "FT240-43": "2643625002"}
+
+# Sinusoidal flux density limits for low core heating against frequency
+# (MHz, gauss), the usual Amidon guideline
+FLUX_LIMIT_GAUSS = ((1.8, 150), (3.5, 150), (7, 100), (14, 58), (21, 57), (28, 50))
+
+# Transformer search: impedance ratios from the 50 ohm port, low-side
+# turns, magnet wire gauges and the power through the transformer
+TRANSFORMER_RATIOS = {"50:100": 2.0, "50:200": 4.0}
+PORT_OHMS = 50.0
+SEARCH_TURNS = np.arange(1, 21)
+SEARCH_AWG = np.arange(18, 33, 2)
+TRANSFORMER_POWER_W = 5.0
+
+# Limits: magnetizing reactance against the port at the lowest frequency
+# (transformer-design.py's XL > 4 Z), turns ratio error, insertion loss,
+# and the fraction of a binocular hole the wire may fill
+MIN_REACTANCE_RATIO = 4.0
+MAX_RATIO_ERROR = 0.05
+MAX_LOSS_DB = 0.2
+BINOCULAR_FILL = 0.4
+
+# Magnet wire insulation build on the diameter
+WIRE_BUILD = 1.08
+
+
+# --- Database ---
+
+def core(name):
+    """
+    One core by name ("FT37-43", "T50-6", "BN-43-202"): catalogue AL,
+    material, size and effective magnetic dimensions in mm.
+    """
+    if name not in CORE_AL_NH:
+        raise ValueError(f"unknown core {name!r}")
+    size, material = name.split("-", 1) if not name.startswith("BN-") else ("BN", name.split("-")[1])
+    entry = {"name": name, "al_nh": CORE_AL_NH[name], "material": material,
+             "part": FAIR_RITE_PARTS.get(name)}
+    if size == "BN":
+        binocular = BINOCULAR_SIZES_MM[FAIR_RITE_PARTS[name]]
+        length, width, height = binocular["size"]
+        entry.update({
+            "shape": "binocular", "size_mm": binocular["size"], "hole_mm": binocular["hole"],
+            "le_mm": binocular["le"], "ae_mm2": binocular["ae"],
+            "volume_mm3": length * width * height,
+        })
+        return entry
+
+    od, inner, height = TOROID_SIZES_MM[size.lstrip("FT").lstrip("T")]
+    entry.update({
+        "shape": "toroid", "size_mm": (od, inner, height), "hole_mm": inner,
+        "le_mm": math.pi * (od - inner) / math.log(od / inner),
+        "ae_mm2": height * (od - inner) / 2,
+        "volume_mm3": math.pi / 4 * (od ** 2 - inner ** 2) * height,
+    })
+    return entry
+
+
+def cores(names=None):
+    """Cores of the database sorted by volume, smallest first."""
+    names = CORE_AL_NH if names is None else names
+    return sorted((core(name) for name in names), key=lambda c: c["volume_mm3"])
+
+
+def complex_permeability(material, f_hz):
+    """mu' and mu'' of a mix at f_hz, interpolated on log frequency; relative to mu_i so AL scales."""
+    table_f, table_real, table_imag = zip(*MATERIALS[material]["permeability"])
+    log_f = np.log(np.asarray(f_hz, dtype=float) / 1e6)
+    mu_real = np.interp(log_f, np.log(table_f), table_real)
+    mu_imag = np.exp(np.interp(log_f, np.log(table_f), np.log(table_imag)))
+    return mu_real, mu_imag
+
+
+def flux_limit_tesla(f_hz):
+    table_f, table_gauss = zip(*FLUX_LIMIT_GAUSS)
+    return np.interp(np.asarray(f_hz) / 1e6, table_f, table_gauss) * 1e-4
+
+
+def wire(awg):
+    """Bare copper diameter (m), insulated diameter (m) and dc resistance (ohm/m) of magnet wire."""
+    awg = np.asarray(awg, dtype=float)
+    diameter = 0.127e-3 * 92 ** ((36 - awg) / 39)
+    resistance = COPPER_RESISTIVITY / (math.pi * diameter ** 2 / 4)
+    return diameter, diameter * WIRE_BUILD, resistance
+
+
+def ac_resistance_factor(diameter_m, f_hz):
+    """Skin-effect ratio R_ac/R_dc of a round wire (proximity effect ignored)."""
+    skin_depth = np.sqrt(COPPER_RESISTIVITY / (math.pi * np.asarray(f_hz) * MU_0))
+    return np.maximum(1.0, diameter_m / (4 * skin_depth) + 0.25)
+
+
+# --- Transformer Search ---
+
+def _core_arrays(core_list, f_hz):
+    """Per-core arrays (core on axis -3 after f_hz's axes) for the vectorized search."""
+    f_hz = np.asarray(f_hz, dtype=float)
+    mu_i = [MATERIALS[c["material"]]["mu_i"] for c in core_list]
+    mu = [complex_permeability(c["material"], f_hz) for c in core_list]
+    mu_real = np.stack([real / scale for (real, _), scale in zip(mu, mu_i)], axis=-1)[..., None, None]
+    mu_imag = np.stack([imag / scale for (_, imag), scale in zip(mu, mu_i)], axis=-1)[..., None, None]
+
+    def column(key):
+        return np.array([c[key] for c in core_list], dtype=float)[:, None, None]
+
+    # Length of one turn: over the core cross-section and round the wire
+    turn_m = np.array([(2 * c["size_mm"][2] + c["size_mm"][0] - c["hole_mm"]) if c["shape"] == "toroid"
+                       else 2 * (c["size_mm"][0] + c["size_mm"][2]) for c in core_list])[:, None, None] * 1e-3
+    return {
+        "f_hz": f_hz[..., None, None, None], "mu_real": mu_real, "mu_imag": mu_imag,
+        "al_h": column("al_nh") * 1e-9, "ae_m2": column("ae_mm2") * 1e-6,
+        "hole_m": column("hole_mm") * 1e-3, "turn_m": turn_m,
+        "toroid": np.array([c["shape"] == "toroid" for c in core_list])[:, None, None],
+    }
+
+
+def transformer_search(ratio, f_hz, core_list=None, turns=SEARCH_TURNS, awg=SEARCH_AWG,
+                       z_port=PORT_OHMS, power_w=TRANSFORMER_POWER_W):
+    """
+    Autotransformers of impedance ratio `ratio` on every core, low-side
+    turns and wire gauge, at frequencies f_hz (any shape; core, turns and
+    wire are appended as the last three axes). Returns the arrays of the
+    design space and each check.
+
+    The magnetizing branch at the low-side tap is L = AL N^2 scaled by
+    (mu' - j mu'')/mu_i. Copper is referred to the low side as a winding
+    of N_low turns plus the remaining turns divided by the ratio.
+    """
+    core_list = cores() if core_list is None else core_list
+    c = _core_arrays(core_list, f_hz)
+    n_low = np.asarray(turns, dtype=float)[:, None]
+    n_high = np.maximum(np.round(n_low * math.sqrt(ratio)), n_low + 1)
+    bare_m, insulated_m, r_per_m = wire(np.asarray(awg)[None, :])
+
+    w = 2 * math.pi * c["f_hz"]
+    l_magnetizing = c["al_h"] * n_low ** 2
+    z_magnetizing = 1j * w * l_magnetizing * (c["mu_real"] - 1j * c["mu_imag"])
+    r_copper = (r_per_m * c["turn_m"] * (n_low + (n_high - n_low) / ratio)
+                * ac_resistance_factor(bare_m, c["f_hz"]))
+
+    # Shunt magnetizing branch then series copper between z_port terminations
+    y_magnetizing = 1 / z_magnetizing
+    s21 = 2 / (2 + r_copper / z_port + z_port * y_magnetizing + r_copper * y_magnetizing)
+    v_port = math.sqrt(power_w * z_port)
+    flux_t = math.sqrt(2) * v_port / (w * n_low * c["ae_m2"])
+
+    # Single layer round a toroid's hole, or a fill fraction of a binocular hole
+    toroid_turns = math.pi * (c["hole_m"] - insulated_m) / insulated_m
+    binocular_turns = BINOCULAR_FILL * (c["hole_m"] / insulated_m) ** 2
+    max_turns = np.where(c["toroid"], toroid_turns, binocular_turns)
+
+    loss_db = -20 * np.log10(np.abs(s21))
+    result = {
+        "n_low": n_low,
+        "n_high": n_high,
+        "ratio_error": (n_high / n_low) ** 2 / ratio - 1,
+        "inductance_h": l_magnetizing * c["mu_real"],
+        "reactance_ratio": np.abs(z_magnetizing) / z_port,
+        "core_loss_w": v_port ** 2 * y_magnetizing.real,
+        "copper_loss_w": power_w / z_port * r_copper,
+        "loss_db": loss_db,
+        "flux_t": flux_t,
+        "flux_limit_t": flux_limit_tesla(c["f_hz"]),
+        "winding_fill": n_high / max_turns,
+    }
+    result = {key: np.broadcast_to(value, loss_db.shape) for key, value in result.items()}
+    result["fits"] = (
+        (np.abs(result["ratio_error"]) <= MAX_RATIO_ERROR)
+        & (result["reactance_ratio"] >= MIN_REACTANCE_RATIO)
+        & (result["loss_db"] <= MAX_LOSS_DB)
+        & (result["flux_t"] <= result["flux_limit_t"])
+        & (result["winding_fill"] <= 1.0)
+    )
+    return result
+
+
+def band_designs(ratios=TRANSFORMER_RATIOS, bands=filters.BAND_FILTER_BANDS, core_list=None, **kwargs):
+    """
+    For each ratio and band: the smallest core (then the fewest turns and
+    thickest wire) that meets every limit at both band edges, with its
+    figures at the worse edge. The whole core x turns x wire space of all
+    bands is solved in one call per ratio.
+    """
+    core_list = cores() if core_list is None else core_list
+    edges_hz = np.array([(low * 1e6, high * 1e6) for _, _, low, high in bands])
+    designs = []
+    for ratio_name, ratio in ratios.items():
+        space = transformer_search(ratio, edges_hz, core_list, **kwargs)
+        fits = space["fits"].all(axis=1)                         # (band, core, turns, wire)
+        worse = np.argmax(space["loss_db"], axis=1)[:, None]     # edge with the higher loss
+        turns, awg = kwargs.get("turns", SEARCH_TURNS), kwargs.get("awg", SEARCH_AWG)
+        for b, (_, name, low, high) in enumerate(bands):
+            row = {"ratio": ratio_name, "band": name, "f_low_mhz": low, "f_high_mhz": high,
+                   "candidates": int(fits[b].sum())}
+            if row["candidates"]:
+                # Cores are sorted by volume; for each, fewest turns, then
+                # the thickest wire that still fits
+                k, t, g = min(zip(*np.nonzero(fits[b])), key=lambda i: (i[0], i[1], i[2]))
+                edge = worse[b, 0, k, t, g]
+                row.update({"core": core_list[k]["name"], "turns": f"{int(turns[t])}:"
+                            f"{int(space['n_high'][b, edge, k, t, g])}", "awg": int(awg[g])})
+                for key in ("inductance_h", "reactance_ratio", "core_loss_w", "copper_loss_w",
+                            "loss_db", "flux_t", "flux_limit_t", "winding_fill", "ratio_error"):
+                    row[key] = float(space[key][b, edge, k, t, g])
+            designs.append(row)
+    return designs
+
+
+def print_designs(designs):
+    print(f"{'Ratio':<7} {'Band':<5} {'MHz':>11} {'Core':<10} {'Turns':>6} {'AWG':>4} {'L (uH)':>7} "
+          f"{'X/Z':>5} {'Loss':>8} {'Core W':>7} {'Cu W':>6} {'B (G)':>6} {'limit':>5} {'fill':>5} {'count':>5}")
+    for row in designs:
+        band = f"{row['f_low_mhz']:g}-{row['f_high_mhz']:g}"
+        if not row["candidates"]:
+            print(f"{row['ratio']:<7} {row['band']:<5} {band:>11}   no core in the database meets every limit")
+            continue
+        print(f"{row['ratio']:<7} {row['band']:<5} {band:>11} {row['core']:<10} {row['turns']:>6} {row['awg']:>4} "
+              f"{row['inductance_h'] * 1e6:7.2f} {row['reactance_ratio']:5.1f} {row['loss_db']:5.3f} dB "
+              f"{row['core_loss_w']:7.4f} {row['copper_loss_w']:6.4f} {row['flux_t'] * 1e4:6.1f} "
+              f"{row['flux_limit_t'] * 1e4:5.0f} {row['winding_fill']:5.2f} {row['candidates']:5d}")
+
+
+if __name__ == "__main__":
+    print("CORE DATABASE")
+    print("=" * 80)
+    print(f"{'Core':<10} {'Shape':<10} {'AL (nH/T^2)':>11} {'mu_i':>5} {'le (mm)':>8} {'Ae (mm^2)':>9} "
+          f"{'mu_eff':>7}  mu'/mu'' at 2 / 10 / 30 MHz")
+    for entry in cores():
+        material = MATERIALS[entry["material"]]
+        mu_eff = entry["al_nh"] * 1e-9 * entry["le_mm"] / (MU_0 * entry["ae_mm2"] * 1e-3)
+        mu = " / ".join(f"{r:.0f}/{i:.2g}" for r, i in zip(*complex_permeability(entry["material"], [2e6, 10e6, 30e6])))
+        print(f"{entry['name']:<10} {entry['shape']:<10} {entry['al_nh']:11g} {material['mu_i']:5g} "
+              f"{entry['le_mm']:8.1f} {entry['ae_mm2']:9.1f} {mu_eff:7.0f}  {mu}")
+
+    print(f"\nAUTOTRANSFORMERS PER BAND: {TRANSFORMER_POWER_W:g} W, XL > {MIN_REACTANCE_RATIO:g} Z, "
+          f"loss < {MAX_LOSS_DB:g} dB, flux within the guideline")
+    print("=" * 80)
+    print_designs(band_designs())
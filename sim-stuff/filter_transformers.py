@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Transformer-Loaded Band Filters
+===============================
+
+The band filters run at FILTER_Z_OHMS between 50 ohm ports, matched by a
+tapped toroid at each end. transformer-loading-analysis.py shows what that
+does: the winding's inductance sits across the end tank and pulls it off
+tune. This module puts the transformer into the filter model and removes
+the error from the design, for every band at once.
+
+Each band's transformer is the core and turns ferrite_cores.band_designs
+picks for the impedance ratio. Its magnetizing inductance comes from the
+catalogue AL and mu' at the band centre, the core loss from mu'' as a
+resistor across the primary, and the leakage, and so the finite
+coupling k, from the air-core inductance of the winding.
+The end-tank capacitors are then re-solved so the node sees the same
+susceptance at the filter's centre frequency as it did with the ideal
+termination: one array expression over the band axis. Leakage also
+scales the port resistance the tank sees, which capacitors cannot undo;
+it is reported so a turns change can be made where it matters. The netlists written
+here carry the transformers as coupled inductors and the compensated
+capacitors, so every simulated band is already corrected.
+"""
+
+import math
+
+import numpy as np
+
+import band_filters as filters
+import ferrite_cores as core_db
+
+# --- Configuration Constants ---
+
+PORT_OHMS = 50.0
+TRANSFORMER_RATIO = filters.FILTER_Z_OHMS / PORT_OHMS
+
+# Leakage of a single-layer tapped winding, as a multiple of the same
+# winding's inductance without the core (mu0 Ae / le per turn^2). The
+# coupling k follows from it; pass coupling= to fix k instead.
+LEAKAGE_AIR_CORE_FACTOR = 1.0
+
+# ngspice sweep of the generated netlists: decades either side of the band
+NETLIST_POINTS_PER_DECADE = 500
+NETLIST_SPAN = 4.0
+
+
+# --- Transformer Model ---
+
+def transformer_model(core_name, n_low, n_high, f_hz, coupling=None, port_ohms=PORT_OHMS):
+    """
+    Coupled-inductor values of a transformer wound on core_name, for
+    band_filters.transformer_port. Arguments broadcast; permeability is
+    taken at f_hz and held over the band. Without a coupling, k is set by
+    a leakage inductance of LEAKAGE_AIR_CORE_FACTOR times the air-core
+    inductance of the full winding.
+    """
+    core = core_db.core(core_name)
+    mu_i = core_db.MATERIALS[core["material"]]["mu_i"]
+    mu_real, mu_imag = core_db.complex_permeability(core["material"], f_hz)
+    n_low = np.asarray(n_low, dtype=float)
+    n_high = np.asarray(n_high, dtype=float)
+
+    # Winding impedance j w L0 (mu' - j mu'') / mu_i as a parallel L and R
+    al_h = core["al_nh"] * 1e-9 / mu_i
+    magnitude = mu_real ** 2 + mu_imag ** 2
+    l_parallel = al_h * magnitude / mu_real
+    lp_h = l_parallel * n_low ** 2
+    ls_h = l_parallel * n_high ** 2
+    if coupling is None:
+        leakage_h = LEAKAGE_AIR_CORE_FACTOR * core_db.MU_0 * core["ae_mm2"] / core["le_mm"] * 1e-3 * n_high ** 2
+        coupling = np.sqrt(1 - leakage_h / ls_h)
+    return {
+        "lp_h": lp_h,
+        "ls_h": ls_h,
+        "k": np.broadcast_to(coupling, np.shape(lp_h)) * 1.0,
+        "r_core_ohms": 2 * math.pi * np.asarray(f_hz) * al_h * magnitude / mu_imag * n_low ** 2,
+        "port_ohms": np.broadcast_to(float(port_ohms), np.shape(lp_h)),
+    }
+
+
+def band_transformers(bands=None, ratio=TRANSFORMER_RATIO, coupling=None):
+    """
+    The transformer of every band from ferrite_cores.band_designs: core
+    names and turns per band, and the transformer_model arrays over the
+    band axis.
+    """
+    bands = filters.load_band_filters() if bands is None else bands
+    edges = [(band["band"], band["name"], band["f_low_hz"] / 1e6, band["f_high_hz"] / 1e6) for band in bands]
+    designs = core_db.band_designs({f"{PORT_OHMS:g}:{PORT_OHMS * ratio:g}": ratio}, edges)
+    missing = [row["band"] for row in designs if not row["candidates"]]
+    if missing:
+        raise ValueError(f"no core in the database meets the limits on {', '.join(missing)}")
+
+    turns = np.array([[int(n) for n in row["turns"].split(":")] for row in designs])
+    f_centre = np.sqrt([band["f_low_hz"] * band["f_high_hz"] for band in bands])
+    models = [transformer_model(row["core"], n_low, n_high, f, coupling)
+              for row, (n_low, n_high), f in zip(designs, turns, f_centre)]
+    return {
+        "cores": [row["core"] for row in designs],
+        "n_low": turns[:, 0],
+        "n_high": turns[:, 1],
+        "model": {key: np.array([model[key] for model in models]) for key in models[0]},
+    }
+
+
+# --- Compensation ---
+
+def stacked_components(bands):
+    """band_filters.filter_components of every band, stacked on a band axis."""
+    per_band = [filters.filter_components(band) for band in bands]
+    return {key: np.array([parts[key] for parts in per_band]) for key in per_band[0]}
+
+
+def compensate_end_tanks(components, transformer, f_hz):
+    """
+    End-tank capacitors that cancel the transformer's susceptance at f_hz:
+    the tank node then sees only the port conductance there, as with the
+    ideal termination the filter was designed for. All arguments broadcast
+    (band axis); returns a new components dict.
+    """
+    w = 2 * math.pi * np.asarray(f_hz, dtype=float)
+    y_port = filters.transformer_port(w, transformer)[0]
+    compensated = dict(components)
+    for key in ("c1_f", "c3_f"):
+        compensated[key] = components[key] - y_port.imag / w
+    if np.any(compensated["c1_f"] <= 0):
+        raise ValueError("transformer susceptance exceeds the end-tank capacitance; use more turns")
+    return compensated
+
+
+def compensated_band_filters(bands=None, ratio=TRANSFORMER_RATIO, coupling=None):
+    """
+    Every band with its transformer and re-solved end-tank capacitors,
+    and the passband of the ideal, uncompensated and compensated filters
+    from one batched solve each.
+    """
+    bands = filters.load_band_filters() if bands is None else bands
+    transformers = band_transformers(bands, ratio, coupling)
+    model = transformers["model"]
+    components = stacked_components(bands)
+    sweeps = np.stack([filters.nominal_sweep(band) for band in bands])
+
+    ideal = filters.passband(sweeps, components)
+    compensated = compensate_end_tanks(components, model, ideal["f_center_hz"])
+    loaded = filters.passband(sweeps, components, transformer=model)
+    corrected = filters.passband(sweeps, compensated, transformer=model)
+
+    # Port resistance the end tanks see at the centre, against FILTER_Z_OHMS
+    y_port = filters.transformer_port(2 * math.pi * ideal["f_center_hz"], model)[0]
+
+    designs = []
+    for i, band in enumerate(bands):
+        designs.append(dict(band, **{
+            "core": transformers["cores"][i],
+            "turns": (int(transformers["n_low"][i]), int(transformers["n_high"][i])),
+            "transformer": {key: float(value[i]) for key, value in model.items()},
+            "components": {key: float(value[i]) for key, value in compensated.items()},
+            "c_end_compensated_f": float(compensated["c1_f"][i]),
+            "port_resistance_ohms": float(1 / y_port.real[i]),
+            "ideal": {key: float(value[i]) for key, value in ideal.items()},
+            "uncompensated": {key: float(value[i]) for key, value in loaded.items()},
+            "compensated": {key: float(value[i]) for key, value in corrected.items()},
+        }))
+    return designs
+
+
+# --- Netlists ---
+
+def band_netlist(design, title=None, output_png=None, output_csv=None, q_l=filters.TANK_INDUCTOR_Q):
+    """
+    ngspice netlist of one compensated band (a compensated_band_filters
+    entry): 50 ohm source, transformer as coupled inductors with its core
+    loss, the three tanks with inductor loss, and the mirror transformer
+    into 50 ohm. Prints the -3 dB edges, centre and bandwidth; writes the
+    response to output_csv and output_png when given.
+
+    filter_s21 gives each inductor a series loss of w L / q_l at every
+    frequency, which no fixed resistor reproduces. The netlist splits it
+    between a series w0 L / 2q_l and a parallel 2 q_l w0 L at the centre
+    frequency w0, whose sum rises with frequency and matches the slope
+    at w0; the two responses agree to within 0.04 dB down to -40 dB.
+    """
+    parts = design["components"]
+    t = design["transformer"]
+    f_centre = design["ideal"]["f_center_hz"]
+    w = 2 * math.pi * f_centre
+    title = title or f"Band {design['band']} ({design['name']}) with compensated transformer loading"
+    f_start = f_centre / NETLIST_SPAN
+    f_stop = f_centre * NETLIST_SPAN
+
+    def tank(n, l_key, c_key, comment):
+        return (f"* Tank {n}{comment}\n"
+                f"L{n} {n} l{n} {parts[l_key] * 1e9:.2f}n\n"
+                f"RL{n} l{n} 0 {w * parts[l_key] / (2 * q_l):.4f}\n"
+                f"RP{n} {n} l{n} {2 * q_l * w * parts[l_key]:.1f}\n"
+                f"C{n} {n} 0 {parts[c_key] * 1e12:.2f}p\n")
+
+    end_comment = f" (C compensated from {design['c_end_f'] * 1e12:.2f}p for the transformer)"
+    lines = [
+        f".title {title}",
+        f"* Filter impedance {filters.FILTER_Z_OHMS:g} ohm, ports {t['port_ohms']:g} ohm",
+        f"* Transformers: {design['core']}, {design['turns'][0]}:{design['turns'][1]} turns, k = {t['k']:.5f}",
+        "",
+        "Vin in 0 AC 1",
+        f"Rin in p1 {t['port_ohms']:g}",
+        f"Rcore1 p1 0 {t['r_core_ohms']:.1f}",
+        f"Lp1 p1 0 {t['lp_h'] * 1e6:.4f}u",
+        f"Ls1 1 0 {t['ls_h'] * 1e6:.4f}u",
+        f"K1 Lp1 Ls1 {t['k']:.5f}",
+        "",
+        tank(1, "l1_h", "c1_f", end_comment),
+        f"C12 1 2 {parts['c12_f'] * 1e12:.2f}p",
+        "",
+        tank(2, "l2_h", "c2_f", ""),
+        f"C23 2 3 {parts['c23_f'] * 1e12:.2f}p",
+        "",
+        tank(3, "l3_h", "c3_f", end_comment),
+        f"Ls2 3 0 {t['ls_h'] * 1e6:.4f}u",
+        f"Lp2 out 0 {t['lp_h'] * 1e6:.4f}u",
+        f"K2 Lp2 Ls2 {t['k']:.5f}",
+        f"Rcore2 out 0 {t['r_core_ohms']:.1f}",
+        f"Rload out 0 {t['port_ohms']:g}",
+        "",
+        ".control",
+        f"ac dec {NETLIST_POINTS_PER_DECADE} {f_start:.0f} {f_stop:.0f}",
+        "let gain = vdb(out) + 6.0206",
+        "meas ac peak MAX gain",
+        "let level = peak - 3",
+        "meas ac flo WHEN gain=$&level RISE=1",
+        "meas ac fhi WHEN gain=$&level FALL=LAST",
+        "let fc = sqrt(flo * fhi)",
+        "let bw = fhi - flo",
+        "echo Filter Response",
+        "print fc bw flo fhi",
+    ]
+    if output_csv:
+        lines.append(f"wrdata {output_csv} gain")
+    if output_png:
+        lines += ["set gnuplot_terminal=png/quit", f"gnuplot {output_png[:-4]} gain"]
+    lines += [".endc", "", ".end", ""]
+    return "\n".join(lines)
+
+
+def print_compensation(designs):
+    print(f"{'Band':<5} {'Core':<9} {'Turns':>6} {'k':>7} {'Lm (uH)':>8} {'R (ohm)':>8} {'CtankEnd':>9} "
+          f"{'-> comp.':>9} {'Ideal f0':>9} {'Loaded':>8} {'Comp.':>8} {'Ideal BW':>9} {'Loaded':>8} {'Comp.':>8}")
+    for d in designs:
+        turns = f"{d['turns'][0]}:{d['turns'][1]}"
+        print(f"{d['name']:<5} {d['core']:<9} {turns:>6} {d['transformer']['k']:7.4f} "
+              f"{d['transformer']['ls_h'] * 1e6:8.2f} {d['port_resistance_ohms']:8.1f} "
+              f"{d['c_end_f'] * 1e12:8.1f}p {d['c_end_compensated_f'] * 1e12:8.1f}p "
+              f"{d['ideal']['f_center_hz'] / 1e6:9.3f} {d['uncompensated']['f_center_hz'] / 1e6:8.3f} "
+              f"{d['compensated']['f_center_hz'] / 1e6:8.3f} {d['ideal']['bandwidth_hz'] / 1e6:9.3f} "
+              f"{d['uncompensated']['bandwidth_hz'] / 1e6:8.3f} {d['compensated']['bandwidth_hz'] / 1e6:8.3f}")
+
+
+if __name__ == "__main__":
+    print(f"Band filters at {filters.FILTER_Z_OHMS:g} ohm between {PORT_OHMS:g} ohm transformers; "
+          f"R is the port resistance each end tank sees (frequencies in MHz)\n")
+    print_compensation(compensated_band_filters())
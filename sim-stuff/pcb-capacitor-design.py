@@ -17,18 +17,18 @@ Author: Claude
 import math
 import numpy as np
 
+import environmental_corners as corners
+import pcb_capacitor_footprints as footprints
+import pcb_capacitor_surface as capacitor_surface
+import pcb_field_solver as field_solver
+
 # PCB Material Constants
 EPSILON_0 = 8.854e-12  # F/m, permittivity of free space
 EPSILON_FR4 = 4.4      # Typical FR4 relative permittivity at 10-20 MHz
 EPSILON_ROGERS = 3.0   # Rogers 4003C for better RF performance
 
 # Standard PCB Parameters
-STANDARD_THICKNESSES_MM = {
-    "2-layer": 1.6,
-    "4-layer_outer": 0.36,  # Typical 4-layer stackup outer prepreg
-    "4-layer_inner": 0.71,  # Typical 4-layer stackup inner core
-    "thin": 0.2,            # Thin PCB or close spacing
-}
+STANDARD_THICKNESSES_MM = field_solver.STANDARD_THICKNESSES_MM
 
 def calculate_parallel_plate_capacitance(area_mm2, thickness_mm, epsilon_r=EPSILON_FR4):
     """
@@ -50,7 +50,8 @@ def calculate_parallel_plate_capacitance(area_mm2, thickness_mm, epsilon_r=EPSIL
     
     return C_pF
 
-def calculate_interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm, epsilon_r=EPSILON_FR4):
+def calculate_interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm, epsilon_r=EPSILON_FR4,
+                                       thickness_mm=STANDARD_THICKNESSES_MM["2-layer"], ground_plane=False):
     """
     Calculate capacitance of interdigital capacitor on PCB surface.
     
@@ -60,26 +61,18 @@ def calculate_interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm, e
         width_mm: Width of each finger  
         gap_mm: Gap between fingers
         epsilon_r: Relative permittivity
+        thickness_mm: Dielectric thickness below the fingers
+        ground_plane: True if a plane lies under the dielectric
     
     Returns:
-        Capacitance in pF (approximate)
+        Capacitance in pF (finger ends and bus bars not included)
     """
-    # Approximate formula for interdigital capacitors
-    # Based on empirical data and conformal mapping
-    
-    # Number of gaps
-    n_gaps = n_fingers - 1
-    
-    # Capacitance per unit length (pF/mm)
-    # Simplified model - more accurate models exist but are complex
-    C_per_mm = epsilon_r * 0.1 * (width_mm / gap_mm) ** 0.5
-    
-    # Total capacitance
-    C_pF = C_per_mm * length_mm * n_gaps
-    
-    return C_pF
+    # 2-D field solution of the finger cross-section (pcb_field_solver.py)
+    return float(field_solver.interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm, thickness_mm,
+                                                       epsilon_r, ground_plane=ground_plane))
 
-def calculate_edge_capacitance(length_mm, gap_mm, trace_width_mm, epsilon_r=EPSILON_FR4):
+def calculate_edge_capacitance(length_mm, gap_mm, trace_width_mm, epsilon_r=EPSILON_FR4,
+                               thickness_mm=STANDARD_THICKNESSES_MM["2-layer"], ground_plane=False):
     """
     Calculate edge-to-edge capacitance between parallel traces.
     
@@ -88,23 +81,31 @@ def calculate_edge_capacitance(length_mm, gap_mm, trace_width_mm, epsilon_r=EPSI
         gap_mm: Gap between traces
         trace_width_mm: Width of traces
         epsilon_r: Relative permittivity
+        thickness_mm: Dielectric thickness below the traces
+        ground_plane: True if a plane lies under the dielectric
     
     Returns:
         Capacitance in pF
     """
-    # Approximate edge capacitance
-    # Based on microstrip coupled line theory
+    # 2-D field solution of the coupled-trace cross-section
+    C_per_mm = field_solver.coupled_traces_pf_per_mm(trace_width_mm, gap_mm, thickness_mm, epsilon_r,
+                                                     ground_plane=ground_plane)
     
-    # Effective epsilon (accounting for air above PCB)
-    epsilon_eff = (epsilon_r + 1) / 2
-    
-    # Capacitance per unit length (rough approximation)
-    C_per_mm = epsilon_eff * EPSILON_0 * 1e12 * (trace_width_mm / gap_mm) * 0.7
+    return float(C_per_mm * length_mm)
+
+def calculate_plate_side(target_pF, thickness_mm, epsilon_r=EPSILON_FR4):
+    """
+    Side of the square parallel-plate capacitor giving target_pF, with fringing.
     
-    # Total capacitance
-    C_pF = C_per_mm * length_mm
+    Args:
+        target_pF: Target capacitance in pF
+        thickness_mm: Dielectric thickness in mm
+        epsilon_r: Relative permittivity
     
-    return C_pF
+    Returns:
+        Side length in mm
+    """
+    return field_solver.plate_side_for(target_pF, thickness_mm, epsilon_r)
 
 def design_pcb_capacitor(target_pF, method="parallel_plate", constraints=None):
     """
@@ -127,11 +128,9 @@ def design_pcb_capacitor(target_pF, method="parallel_plate", constraints=None):
     if method == "parallel_plate" or method == "all":
         # Parallel plate design (overlapping pads on opposite layers)
         for thickness_name, thickness_mm in STANDARD_THICKNESSES_MM.items():
-            # Calculate required area
-            area_mm2 = target_pF * thickness_mm / (EPSILON_0 * EPSILON_FR4 * 1e12 * 1e-3)
-            
-            # Convert to square pad
-            side_mm = math.sqrt(area_mm2)
+            # Square pad sized with its edge fringing included
+            side_mm = calculate_plate_side(target_pF, thickness_mm)
+            area_mm2 = side_mm ** 2
             
             if side_mm < 50:  # Reasonable size limit
                 designs.append({
@@ -147,35 +146,41 @@ def design_pcb_capacitor(target_pF, method="parallel_plate", constraints=None):
                 })
     
     if method == "interdigital" or method == "all":
-        # Interdigital design (fingers on same layer)
+        # Interdigital design (fingers on same layer): smallest comb per
+        # stack-up from the precomputed response surface
+        surface = capacitor_surface.load_surface()
         gap_mm = constraints.get("min_gap", 0.15)  # Typical PCB min gap
-        width_mm = constraints.get("trace_width", 0.3)
+        width_mm = constraints.get("min_width", 0.15)
         
-        for n_fingers in [3, 5, 7, 10]:
-            for length_mm in [5, 10, 15, 20]:
-                C_calc = calculate_interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm)
-                
-                if abs(C_calc - target_pF) / target_pF < 0.2:  # Within 20%
-                    designs.append({
-                        "method": "interdigital",
-                        "n_fingers": n_fingers,
-                        "finger_length_mm": length_mm,
-                        "finger_width_mm": width_mm,
-                        "gap_mm": gap_mm,
-                        "dimensions": f"{n_fingers} fingers, {length_mm}mm long",
-                        "capacitance_pF": C_calc,
-                        "tolerance": "±15% (can be laser trimmed)",
-                        "temp_coef": "~100 ppm/°C",
-                        "advantages": "Single layer, tunable, good for 0.5-10pF",
-                    })
+        for thickness_name in surface.stackups:
+            design = surface.design(target_pF, thickness_name, min_gap_mm=gap_mm, min_width_mm=width_mm)
+            n_fingers = int(design["n_fingers"])
+            
+            if n_fingers:
+                length_mm = float(design["finger_length_mm"])
+                designs.append({
+                    "method": "interdigital",
+                    "stackup": thickness_name,
+                    "n_fingers": n_fingers,
+                    "finger_length_mm": length_mm,
+                    "finger_width_mm": float(design["finger_width_mm"]),
+                    "gap_mm": float(design["gap_mm"]),
+                    "area_mm2": float(design["area_mm2"]),
+                    "dimensions": f"{n_fingers} fingers, {length_mm:.1f}mm long",
+                    "capacitance_pF": target_pF,
+                    "tolerance": f"±{100 * float(design['etch_change']):.0f}% per ±25µm etch (can be laser trimmed)",
+                    "temp_coef": "~100 ppm/°C",
+                    "advantages": "Single layer, tunable, good for 0.5-10pF",
+                })
     
     if method == "edge" or method == "all":
         # Edge coupling (parallel traces)
         gap_mm = constraints.get("min_gap", 0.15)
         width_mm = constraints.get("trace_width", 0.5)
+        thickness_mm = STANDARD_THICKNESSES_MM[constraints.get("stackup", "2-layer")]
         
         # Calculate required length
-        length_mm = target_pF / (EPSILON_FR4 * EPSILON_0 * 1e12 * (width_mm / gap_mm) * 0.7 / 2)
+        length_mm = target_pF / calculate_edge_capacitance(1.0, gap_mm, width_mm, thickness_mm=thickness_mm)
         
         if length_mm < 100:  # Reasonable length
             designs.append({
@@ -254,9 +259,9 @@ def analyze_environmental_stability():
     print("\n1. TEMPERATURE COEFFICIENT COMPARISON:")
     print("-" * 60)
     temp_data = [
-        ("PCB FR4", 100, "±50", "Predictable linear"),
+        ("PCB FR4", corners.FR4_TEMPCO_PPM, "±50", "Predictable linear"),
         ("PCB Rogers 4003", 50, "±25", "Better RF material"),
-        ("NP0/C0G ceramic", 30, "±15", "Excellent but expensive"),
+        ("NP0/C0G ceramic", corners.NP0_TEMPCO_PPM, "±15", "Excellent but expensive"),
         ("X7R ceramic", 1500, "±750", "Poor for filters"),
         ("X5R ceramic", 2500, "±1250", "Avoid for RF"),
     ]
@@ -264,15 +269,15 @@ def analyze_environmental_stability():
     print(f"{'Type':<18} {'Typ (ppm/°C)':<15} {'Tol (ppm/°C)':<15} {'Notes'}")
     print("-" * 70)
     for typ, tempco, tol, notes in temp_data:
-        print(f"{typ:<18} {tempco:<15} {tol:<15} {notes}")
+        print(f"{typ:<18} {tempco:<15g} {tol:<15} {notes}")
     
     print("\n2. HUMIDITY EFFECTS ON FR4:")
     print("-" * 60)
+    humidity_notes = ["Dry", "Normal", "High", "Saturated"]
     humidity_data = [
-        ("Dry (0% RH)", 4.3, "Baseline"),
-        ("Normal (50% RH)", 4.4, "Typical spec"),
-        ("High (85% RH)", 4.6, "Worst case"),
-        ("Saturated (95% RH)", 4.8, "Extreme humidity"),
+        (f"{name} ({rh:.0f}% RH)", er, note)
+        for name, (rh, er), note in zip(humidity_notes, corners.FR4_EPSILON_VS_RH,
+                                        ["Baseline", "Typical spec", "Worst case", "Extreme humidity"])
     ]
     
     print(f"{'Condition':<20} {'εr':<8} {'Notes'}")
@@ -586,36 +591,44 @@ def design_guard_ring(cap_pF, guard_spacing_mm=0.5):
     print(f"\nEstimated parasitic to guard: {parasitic_pF:.2f} pF")
     print(f"This adds to tank capacitance - account for it!")
 
-def generate_design_files(design_params, filename_base="pcb_cap"):
+def generate_design_files(design_params, guard_spacing_mm=None, library=footprints.LIBRARY_DIR):
     """
     Generate KiCad footprint for PCB capacitor.
+    
+    Args:
+        design_params: Design dict from design_pcb_capacitor (parallel_plate or interdigital)
+        guard_spacing_mm: Add a guard ring this far from the capacitor (see design_guard_ring)
+        library: Footprint library directory
+    
+    Returns:
+        Footprint text, or None for methods without a footprint
     """
+    if design_params["method"] not in ("parallel_plate", "interdigital"):
+        return None
+    if design_params["method"] == "parallel_plate" and design_params["stackup"] not in footprints.PLATE_STACKUPS:
+        print(f"\n{design_params['stackup']}: the inner-layer plate has to be drawn as a zone")
+        return None
+    
+    spec = footprints.spec_from_design(design_params, guard_spacing_mm)
+    path = footprints.write_footprints([spec], library)[0]
+    problems = footprints.validate_footprint(path, footprints.library_conventions(), spec["clearance_mm"])
+    
+    print(f"\nKiCad footprint generated: {path}")
+    for problem in problems:
+        print(f"  WARNING: {problem}")
+    print("Remember to:")
     if design_params["method"] == "parallel_plate":
-        kicad_footprint = f"""
-(module PCB_CAP_{design_params['capacitance_pF']:.1f}pF (layer F.Cu)
-  (descr "PCB Parallel Plate Capacitor {design_params['capacitance_pF']:.1f}pF")
-  (fp_text reference C? (at 0 -5) (layer F.SilkS) (effects (font (size 1 1) (thickness 0.15))))
-  (fp_text value {design_params['capacitance_pF']:.1f}pF (at 0 5) (layer F.Fab) (effects (font (size 1 1) (thickness 0.15))))
-  
-  # Top plate
-  (pad 1 smd rect (at 0 0) (size {design_params['area_mm2']**0.5:.1f} {design_params['area_mm2']**0.5:.1f}) (layers F.Cu F.Paste F.Mask))
-  
-  # Bottom plate (connected through via)
-  (pad 2 thru_hole circle (at {design_params['area_mm2']**0.5/2 + 1:.1f} 0) (size 0.8 0.8) (drill 0.4) (layers *.Cu *.Mask))
-  
-  # Note: Bottom plate on B.Cu layer must be added manually
-  # Size: {design_params['area_mm2']**0.5:.1f} × {design_params['area_mm2']**0.5:.1f} mm
-)
-"""
-        print(f"\nKiCad footprint generated: {filename_base}.kicad_mod")
-        print("Remember to:")
-        print("1. Add matching pad on bottom layer")
+        print("1. Connect pad 2 (B.Cu plate) with a via outside the plate")
         print("2. Align precisely for correct capacitance")
         print("3. Keep dielectric uniform (no vias in capacitor area)")
-        
-        return kicad_footprint
+    else:
+        print("1. Keep other copper at least one gap away from the fingers")
+        print("2. Trim by cutting finger tips if needed")
+    if guard_spacing_mm is not None:
+        print("Guard ring (pad 3) goes to GND")
     
-    return None
+    with open(path) as f:
+        return f.read()
 
 # Main calculation example
 if __name__ == "__main__":
@@ -0,0 +1,497 @@
+#!/usr/bin/env python3
+"""
+PCB Capacitor Footprint Generator
+=================================
+
+Writes KiCad footprints for the capacitors designed in
+pcb-capacitor-design.py and pcb_capacitor_surface.py into the project
+library, hw/Library.pretty:
+
+- interdigital combs: one custom copper pad per comb, each finger and bus
+  bar a rectangle primitive
+- parallel plates: matching square pads on F.Cu and B.Cu
+- either of them inside a guard ring (design_guard_ring): a ring on both
+  outer layers around the capacitor, stitched with vias, as pad 3
+
+Footprints follow the library's files as saved by KiCad 9: tab-indented
+S-expressions in pcbnew's field order, and a uuid on every item. The
+uuids are derived from the footprint name, so regenerating a footprint
+rewrites it identically. The capacitors are copper only (no paste, mask
+left on) and are excluded from the BOM and position files.
+
+validate_footprint() parses a file back and checks it against the
+conventions of the library's existing footprints and, for generated
+ones, the copper clearance between nets.
+"""
+
+import glob
+import math
+import os
+import sys
+import uuid
+from collections import Counter
+
+import numpy as np
+
+import pcb_capacitor_surface as capacitor_surface
+import pcb_field_solver as field_solver
+
+# --- Configuration Constants ---
+
+LIBRARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "hw", "Library.pretty")
+
+FORMAT_VERSION = "20241229"
+GENERATOR_VERSION = "9.0"
+
+# Guard ring: copper width and stitching via pitch (lambda/20 at 15 MHz
+# is far larger; the pitch keeps the two ring layers tied together)
+GUARD_RING_WIDTH_MM = 0.5
+GUARD_VIA_PITCH_MM = 5.0
+GUARD_VIA_MM = 0.6
+GUARD_VIA_DRILL_MM = 0.3
+
+# Courtyard margin around the copper, and the smallest copper gap between nets
+COURTYARD_MM = 0.25
+MIN_CLEARANCE_MM = 0.15
+
+# Stack-ups whose plates are on the outer layers; the 4-layer ones put a
+# plate on an inner layer, which takes a zone rather than a pad
+PLATE_STACKUPS = ("2-layer", "thin")
+
+_NAMESPACE = uuid.UUID("5b7d1f0c-4f0e-4c3a-9a43-1e6e2f6c0a11")
+
+# --- S-Expression Templates ---
+
+HEADER_TEMPLATE = """(footprint "{name}"
+\t(version {version})
+\t(generator "pcbnew")
+\t(generator_version "{generator_version}")
+\t(layer "F.Cu")
+\t(descr "{descr}")
+\t(tags "{tags}")
+"""
+
+PROPERTY_TEMPLATE = """\t(property "{key}" "{value}"
+\t\t(at {x} {y} 0)
+\t\t(layer "{layer}")
+{hide}\t\t(uuid "{uuid}")
+\t\t(effects
+\t\t\t(font
+\t\t\t\t(size {size} {size})
+\t\t\t\t(thickness 0.15)
+\t\t\t)
+\t\t)
+\t)
+"""
+
+RECT_TEMPLATE = """\t(fp_rect
+\t\t(start {x0} {y0})
+\t\t(end {x1} {y1})
+\t\t(stroke
+\t\t\t(width {width})
+\t\t\t(type {type})
+\t\t)
+\t\t(fill no)
+\t\t(layer "{layer}")
+\t\t(uuid "{uuid}")
+\t)
+"""
+
+TEXT_TEMPLATE = """\t(fp_text user "${{REFERENCE}}"
+\t\t(at 0 0 0)
+\t\t(layer "F.Fab")
+\t\t(uuid "{uuid}")
+\t\t(effects
+\t\t\t(font
+\t\t\t\t(size 0.5 0.5)
+\t\t\t\t(thickness 0.075)
+\t\t\t)
+\t\t)
+\t)
+"""
+
+RECT_PAD_TEMPLATE = """\t(pad "{number}" smd rect
+\t\t(at {x} {y})
+\t\t(size {w} {h})
+\t\t(layers "{layer}")
+\t\t(uuid "{uuid}")
+\t)
+"""
+
+CUSTOM_PAD_TEMPLATE = """\t(pad "{number}" smd custom
+\t\t(at {x} {y})
+\t\t(size {anchor} {anchor})
+\t\t(layers "{layer}")
+\t\t(options
+\t\t\t(clearance outline)
+\t\t\t(anchor rect)
+\t\t)
+\t\t(primitives
+{primitives}\t\t)
+\t\t(uuid "{uuid}")
+\t)
+"""
+
+POLY_TEMPLATE = """\t\t\t(gr_poly
+\t\t\t\t(pts
+\t\t\t\t\t{points}
+\t\t\t\t)
+\t\t\t\t(width 0)
+\t\t\t\t(fill yes)
+\t\t\t)
+"""
+
+VIA_PAD_TEMPLATE = """\t(pad "{number}" thru_hole circle
+\t\t(at {x} {y})
+\t\t(size {size} {size})
+\t\t(drill {drill})
+\t\t(layers "*.Cu" "*.Mask")
+\t\t(remove_unused_layers no)
+\t\t(uuid "{uuid}")
+\t)
+"""
+
+FOOTER = """\t(embedded_fonts no)
+)
+"""
+
+
+def _number(value):
+    """A coordinate the way pcbnew writes it: up to 6 decimals, no trailing zeros."""
+    text = f"{value:.6f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _value_text(pf):
+    return f"{pf:.3g}pF"
+
+# --- Geometry ---
+# A footprint is built as a spec: name, description, rectangles of copper
+# per (pad number, layer) and via positions, all in mm about the origin.
+
+def interdigital_spec(capacitance_pf, stackup, n_fingers, length_mm, width_mm, gap_mm):
+    """Two interleaved combs, fingers along y, pad 1's bus at the top."""
+    pitch = width_mm + gap_mm
+    span = n_fingers * width_mm + (n_fingers - 1) * gap_mm
+    half = length_mm / 2 + gap_mm + width_mm
+    rects = {("1", "F.Cu"): [(-span / 2, -half, span / 2, -half + width_mm)],
+             ("2", "F.Cu"): [(-span / 2, half - width_mm, span / 2, half)]}
+    for k in range(n_fingers):
+        x0 = -span / 2 + k * pitch
+        if k % 2 == 0:
+            rects[("1", "F.Cu")].append((x0, -half + width_mm, x0 + width_mm, length_mm / 2))
+        else:
+            rects[("2", "F.Cu")].append((x0, -length_mm / 2, x0 + width_mm, half - width_mm))
+    name = f"C_PCB_Interdigital_{_value_text(capacitance_pf)}_{stackup}"
+    descr = (f"PCB interdigital capacitor, {_value_text(capacitance_pf)} on {stackup} "
+             f"({field_solver.STANDARD_THICKNESSES_MM[stackup]:g}mm dielectric), {n_fingers} fingers "
+             f"{length_mm:.2f}mm long, {width_mm:g}mm wide, {gap_mm:g}mm gap")
+    return {"name": name, "descr": descr, "tags": "capacitor PCB interdigital", "rects": rects, "vias": [],
+            "clearance_mm": gap_mm}
+
+
+def parallel_plate_spec(capacitance_pf, stackup, side_mm):
+    """Square plates on F.Cu (pad 1) and B.Cu (pad 2)."""
+    if stackup not in PLATE_STACKUPS:
+        raise ValueError(f"{stackup} plates are not both on outer layers")
+    s = side_mm / 2
+    rects = {("1", "F.Cu"): [(-s, -s, s, s)], ("2", "B.Cu"): [(-s, -s, s, s)]}
+    name = f"C_PCB_Plate_{_value_text(capacitance_pf)}_{stackup}"
+    descr = (f"PCB parallel-plate capacitor, {_value_text(capacitance_pf)} on {stackup} "
+             f"({field_solver.STANDARD_THICKNESSES_MM[stackup]:g}mm dielectric), "
+             f"{side_mm:.2f}x{side_mm:.2f}mm plates on F.Cu and B.Cu")
+    return {"name": name, "descr": descr, "tags": "capacitor PCB parallel plate", "rects": rects, "vias": [],
+            "clearance_mm": MIN_CLEARANCE_MM}
+
+
+def with_guard_ring(spec, guard_spacing_mm=0.5):
+    """Adds a guard ring (pad 3) on both outer layers, guard_spacing_mm clear of the capacitor."""
+    x0, y0, x1, y1 = _bounds(spec["rects"])
+    x0, y0, x1, y1 = x0 - guard_spacing_mm, y0 - guard_spacing_mm, x1 + guard_spacing_mm, y1 + guard_spacing_mm
+    w = GUARD_RING_WIDTH_MM
+    ring = [(x0 - w, y0 - w, x1 + w, y0), (x0 - w, y1, x1 + w, y1 + w), (x0 - w, y0, x0, y1), (x1, y0, x1 + w, y1)]
+
+    # Vias on the ring's centre line, corners included, at most the pitch apart
+    cx0, cy0, cx1, cy1 = x0 - w / 2, y0 - w / 2, x1 + w / 2, y1 + w / 2
+    nx = max(1, math.ceil((cx1 - cx0) / GUARD_VIA_PITCH_MM))
+    ny = max(1, math.ceil((cy1 - cy0) / GUARD_VIA_PITCH_MM))
+    xs, ys = np.linspace(cx0, cx1, nx + 1), np.linspace(cy0, cy1, ny + 1)
+    vias = [(x, y) for x in xs for y in (cy0, cy1)] + [(x, y) for y in ys[1:-1] for x in (cx0, cx1)]
+
+    guarded = dict(spec)
+    guarded["rects"] = dict(spec["rects"])
+    guarded["rects"][("3", "F.Cu")] = ring
+    guarded["rects"][("3", "B.Cu")] = ring
+    guarded["vias"] = spec["vias"] + [("3", x, y) for x, y in vias]
+    guarded["name"] = f"{spec['name']}_Guard{guard_spacing_mm:g}mm"
+    guarded["descr"] = f"{spec['descr']}, guard ring {guard_spacing_mm:g}mm clear (pad 3)"
+    guarded["tags"] = f"{spec['tags']} guard ring"
+    guarded["clearance_mm"] = min(spec["clearance_mm"], guard_spacing_mm)
+    return guarded
+
+
+def spec_from_design(design, guard_spacing_mm=None):
+    """Spec for a design dict from pcb-capacitor-design.design_pcb_capacitor."""
+    if design["method"] == "interdigital":
+        spec = interdigital_spec(design["capacitance_pF"], design["stackup"], design["n_fingers"],
+                                 design["finger_length_mm"], design["finger_width_mm"], design["gap_mm"])
+    elif design["method"] == "parallel_plate":
+        spec = parallel_plate_spec(design["capacitance_pF"], design["stackup"], math.sqrt(design["area_mm2"]))
+    else:
+        raise ValueError(f"no footprint for {design['method']} capacitors")
+    return spec if guard_spacing_mm is None else with_guard_ring(spec, guard_spacing_mm)
+
+
+def _bounds(rects):
+    boxes = np.array([r for pad in rects.values() for r in pad])
+    return boxes[:, 0].min(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].max()
+
+# --- Rendering ---
+
+def render_footprint(spec):
+    """The .kicad_mod text of a spec."""
+    name = spec["name"]
+    counter = iter(range(1 << 30))
+    next_uuid = lambda: str(uuid.uuid5(_NAMESPACE, f"{name}/{next(counter)}"))
+    x0, y0, x1, y1 = _bounds(spec["rects"])
+    if spec["vias"]:
+        r = GUARD_VIA_MM / 2
+        vx = [v[1] for v in spec["vias"]]
+        vy = [v[2] for v in spec["vias"]]
+        x0, y0, x1, y1 = min(x0, min(vx) - r), min(y0, min(vy) - r), max(x1, max(vx) + r), max(y1, max(vy) + r)
+    n = _number
+
+    parts = [HEADER_TEMPLATE.format(name=name, version=FORMAT_VERSION, generator_version=GENERATOR_VERSION,
+                                    descr=spec["descr"], tags=spec["tags"])]
+    for key, value, y, layer, hide, size in (("Reference", "REF**", y0 - 1.5, "F.SilkS", False, 1),
+                                              ("Value", name, y1 + 1.5, "F.Fab", False, 1),
+                                              ("Datasheet", "", 0, "F.Fab", True, 1.27),
+                                              ("Description", "", 0, "F.Fab", True, 1.27)):
+        parts.append(PROPERTY_TEMPLATE.format(key=key, value=value, x=0, y=n(y), layer=layer,
+                                              hide="\t\t(hide yes)\n" if hide else "", uuid=next_uuid(), size=size))
+    parts.append(f"\t(attr {'through_hole' if spec['vias'] else 'smd'} exclude_from_pos_files exclude_from_bom)\n")
+
+    c = COURTYARD_MM
+    parts.append(RECT_TEMPLATE.format(x0=n(x0 - c), y0=n(y0 - c), x1=n(x1 + c), y1=n(y1 + c), width=0.05,
+                                      type="solid", layer="F.CrtYd", uuid=next_uuid()))
+    parts.append(RECT_TEMPLATE.format(x0=n(x0), y0=n(y0), x1=n(x1), y1=n(y1), width=0.1, type="dash",
+                                      layer="F.Fab", uuid=next_uuid()))
+    parts.append(TEXT_TEMPLATE.format(uuid=next_uuid()))
+
+    for (number, layer), rects in spec["rects"].items():
+        if len(rects) == 1 and number != "3":
+            rx0, ry0, rx1, ry1 = rects[0]
+            parts.append(RECT_PAD_TEMPLATE.format(number=number, x=n((rx0 + rx1) / 2), y=n((ry0 + ry1) / 2),
+                                                  w=n(rx1 - rx0), h=n(ry1 - ry0), layer=layer, uuid=next_uuid()))
+            continue
+        # Custom pad anchored in the middle of its first rectangle, which
+        # the anchor square must not overhang
+        rx0, ry0, rx1, ry1 = rects[0]
+        ax, ay = (rx0 + rx1) / 2, (ry0 + ry1) / 2
+        anchor = min(rx1 - rx0, ry1 - ry0)
+        primitives = "".join(
+            POLY_TEMPLATE.format(points=" ".join(f"(xy {n(px - ax)} {n(py - ay)})"
+                                                 for px, py in ((a, b), (c_, b), (c_, d), (a, d))))
+            for a, b, c_, d in rects)
+        parts.append(CUSTOM_PAD_TEMPLATE.format(number=number, x=n(ax), y=n(ay), anchor=n(anchor), layer=layer,
+                                                primitives=primitives, uuid=next_uuid()))
+    for number, x, y in spec["vias"]:
+        parts.append(VIA_PAD_TEMPLATE.format(number=number, x=n(x), y=n(y), size=n(GUARD_VIA_MM),
+                                             drill=n(GUARD_VIA_DRILL_MM), uuid=next_uuid()))
+    parts.append(FOOTER)
+    return "".join(parts)
+
+
+def write_footprints(specs, library=LIBRARY_DIR):
+    """Renders and writes every spec into the library; returns the file paths."""
+    os.makedirs(library, exist_ok=True)
+    paths = []
+    for spec in specs:
+        path = os.path.join(library, f"{spec['name']}.kicad_mod")
+        with open(path, "w") as f:
+            f.write(render_footprint(spec))
+        paths.append(path)
+    return paths
+
+# --- Validation ---
+
+def parse_sexpr(text):
+    """Nested lists of atoms; quoted strings keep their quotes stripped."""
+    stack = [[]]
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch == "(":
+            stack.append([])
+        elif ch == ")":
+            if len(stack) == 1:
+                raise ValueError(f"unbalanced ')' at offset {i}")
+            item = stack.pop()
+            stack[-1].append(item)
+        elif ch == '"':
+            end = i + 1
+            while text[end] != '"':
+                end += 2 if text[end] == "\\" else 1
+            stack[-1].append(text[i + 1:end])
+            i = end
+        elif not ch.isspace():
+            end = i
+            while end < len(text) and not text[end].isspace() and text[end] not in '()"':
+                end += 1
+            stack[-1].append(text[i:end])
+            i = end - 1
+        i += 1
+    if len(stack) != 1 or len(stack[0]) != 1:
+        raise ValueError("unbalanced parentheses")
+    return stack[0][0]
+
+
+def _children(node, key):
+    return [c for c in node[1:] if isinstance(c, list) and c and c[0] == key]
+
+
+def _walk(node):
+    yield node
+    for c in node[1:]:
+        if isinstance(c, list):
+            yield from _walk(c)
+
+
+def library_conventions(library=LIBRARY_DIR):
+    """Most common format version and generator version among the library's footprints."""
+    versions, generators = Counter(), Counter()
+    for path in glob.glob(os.path.join(library, "*.kicad_mod")):
+        root = parse_sexpr(open(path).read())
+        versions.update(c[1] for c in _children(root, "version"))
+        generators.update(c[1] for c in _children(root, "generator_version"))
+    if not versions or not generators:
+        raise ValueError(f"no versioned .kicad_mod footprints in {os.path.normpath(library)}")
+    return {"version": versions.most_common(1)[0][0], "generator_version": generators.most_common(1)[0][0]}
+
+
+def copper_rectangles(root):
+    """(pad number, layer, x0, y0, x1, y1) of every pad's copper, primitives included."""
+    rects = []
+    for pad in _children(root, "pad"):
+        number, kind = pad[1], pad[2]
+        px, py = (float(v) for v in _children(pad, "at")[0][1:3])
+        w, h = (float(v) for v in _children(pad, "size")[0][1:3])
+        layers = _children(pad, "layers")[0][1:]
+        if kind == "thru_hole":
+            layers = ["F.Cu", "B.Cu"]
+        boxes = [(px - w / 2, py - h / 2, px + w / 2, py + h / 2)]
+        for primitives in _children(pad, "primitives"):
+            for poly in _children(primitives, "gr_poly"):
+                pts = np.array([[float(p[1]), float(p[2])] for p in _children(_children(poly, "pts")[0], "xy")])
+                boxes.append((px + pts[:, 0].min(), py + pts[:, 1].min(), px + pts[:, 0].max(), py + pts[:, 1].max()))
+        rects += [(number, layer) + box for layer in layers if layer.endswith(".Cu") for box in boxes]
+    return rects
+
+
+def validate_footprint(path, conventions=None, clearance_mm=None):
+    """
+    Problems found in a .kicad_mod file, an empty list if none: structure
+    and field order of the library's footprints, unique uuids, tab
+    indentation and, given clearance_mm, the copper gap between pads of
+    different numbers (rectangular copper only).
+    """
+    text = open(path).read()
+    problems = []
+    try:
+        root = parse_sexpr(text)
+    except (ValueError, IndexError) as error:
+        return [f"does not parse: {error}"]
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    if root[0] != "footprint" or root[1] != name:
+        problems.append(f"footprint name {root[1]!r} does not match the file name")
+    heads = [c[0] for c in root[2:] if isinstance(c, list)]
+    expected = ["version", "generator", "generator_version", "layer"]
+    if heads[:4] != expected:
+        problems.append(f"header fields {heads[:4]} instead of {expected}")
+    if conventions:
+        for key, value in conventions.items():
+            found = [c[1] for c in _children(root, key)]
+            if found != [value]:
+                problems.append(f"{key} {found} differs from the library's {value}")
+    properties = [p[1] for p in _children(root, "property")]
+    for key in ("Reference", "Value", "Datasheet", "Description"):
+        if key not in properties:
+            problems.append(f"missing {key} property")
+    if heads and heads[-1] != "embedded_fonts" and "model" not in heads:
+        problems.append("embedded_fonts is not the last field")
+    if not any(layer in ("F.CrtYd", "B.CrtYd") for node in _walk(root) if node[0] == "layer" for layer in node[1:]):
+        problems.append("no courtyard")
+    uuids = [node[1] for node in _walk(root) if node[0] == "uuid"]
+    if len(uuids) != len(set(uuids)):
+        problems.append("duplicate uuids")
+    lines = text.split("\n")
+    if not text.endswith("\n") or any(line.startswith(" ") for line in lines):
+        problems.append("not tab-indented with a trailing newline")
+
+    if clearance_mm is not None:
+        # Closest approach per pair of pads and layer; coordinates are
+        # written to 1 nm, so allow for the rounding
+        closest = {}
+        rects = copper_rectangles(root)
+        for i, a in enumerate(rects):
+            for b in rects[i + 1:]:
+                if a[0] != b[0] and a[1] == b[1]:
+                    gap = math.hypot(max(a[2] - b[4], b[2] - a[4], 0), max(a[3] - b[5], b[3] - a[5], 0))
+                    key = (min(a[0], b[0]), max(a[0], b[0]), a[1])
+                    closest[key] = min(gap, closest.get(key, math.inf))
+        for (first, second, layer), gap in sorted(closest.items()):
+            if gap < clearance_mm - 1e-5:
+                problems.append(f"pads {first} and {second} on {layer} only {gap:.3f}mm apart")
+    return problems
+
+# --- Catalogue ---
+
+E12 = (1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2)
+
+
+def e12_values(low, high):
+    return [round(m * 10 ** d, 3) for d in range(-2, 3) for m in E12 if low <= m * 10 ** d <= high + 1e-9]
+
+
+def catalogue_specs(guard_spacing_mm=0.5):
+    """
+    Interdigital capacitors for E12 values 0.47-22 pF on every stack-up and
+    parallel plates for 2.2-100 pF on the outer-layer stack-ups, each plain
+    and guard-ringed.
+    """
+    surface = capacitor_surface.load_surface()
+    specs = []
+    values = np.array(e12_values(0.47, 22))
+    for stackup in surface.stackups:
+        designs = surface.design(values, stackup, min_gap_mm=MIN_CLEARANCE_MM)
+        for k, pf in enumerate(values):
+            if designs["n_fingers"][k]:
+                specs.append(interdigital_spec(pf, stackup, int(designs["n_fingers"][k]),
+                                               float(designs["finger_length_mm"][k]),
+                                               float(designs["finger_width_mm"][k]), float(designs["gap_mm"][k])))
+    for stackup in PLATE_STACKUPS:
+        h = field_solver.STANDARD_THICKNESSES_MM[stackup]
+        for pf in e12_values(2.2, 100):
+            side = field_solver.plate_side_for(pf, h)
+            if side < 50:
+                specs.append(parallel_plate_spec(pf, stackup, side))
+    return specs + [with_guard_ring(spec, guard_spacing_mm) for spec in specs]
+
+
+if __name__ == "__main__":
+    library = sys.argv[1] if len(sys.argv) > 1 else LIBRARY_DIR
+    conventions = library_conventions(library)
+    existing = sorted(glob.glob(os.path.join(library, "*.kicad_mod")))
+    failing = {os.path.basename(p): validate_footprint(p, conventions) for p in existing}
+    failing = {k: v for k, v in failing.items() if v}
+    print(f"Library conventions from {len(existing)} footprints: format {conventions['version']}, "
+          f"KiCad {conventions['generator_version']}; {len(existing) - len(failing)} pass the structural checks")
+
+    specs = catalogue_specs()
+    paths = write_footprints(specs, library)
+    problems = {p: validate_footprint(p, conventions, spec["clearance_mm"]) for p, spec in zip(paths, specs)}
+    bad = {p: v for p, v in problems.items() if v}
+    print(f"Wrote {len(paths)} footprints to {os.path.normpath(library)}; {len(paths) - len(bad)} valid")
+    for path, found in bad.items():
+        print(f"  {os.path.basename(path)}: {'; '.join(found)}")
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Interdigital Capacitor Response Surface
+=======================================
+
+Inverse design of interdigital PCB capacitors from a precomputed response
+surface, so filter optimizers can place a PCB capacitor for any value
+without running the field solver.
+
+An N-finger comb of length L has C = L * ((N - 1) * c_gap + c_edge), where
+c_gap is the coupling per gap and c_edge the outer fingers' extra
+fringing, both per unit length and functions of finger width, gap and
+stack-up alone. pcb_field_solver.py solves them once on a width x gap
+grid per stack-up. Bicubic splines in log(width), log(gap) interpolate
+them, and their derivatives give the sensitivity to over-etch (fingers
+narrow and gaps widen by the same amount).
+
+Every candidate on a manufacturing grid of (fingers, width, gap,
+stack-up) is tabulated with its capacitance per unit length, footprint
+and etch sensitivity. For a target the finger length follows directly,
+and the design is the smallest footprint whose sensitivity is within
+limits. design() scans all candidates for any targets and constraints.
+query() looks up answers solved in advance on a dense log grid of
+targets, recomputing the finger length for the exact value, in a few
+microseconds per target.
+"""
+
+import functools
+import os
+import time
+
+import numpy as np
+from scipy.interpolate import RectBivariateSpline
+
+import pcb_field_solver as field_solver
+
+# --- Configuration Constants ---
+
+# Field-solver grid the splines are fitted to
+SURFACE_WIDTHS_MM = np.geomspace(0.1, 1.5, 7)
+SURFACE_GAPS_MM = np.geomspace(0.1, 0.8, 6)
+
+# Manufacturing grid of candidate designs
+CANDIDATE_FINGERS = np.arange(2, 21)
+CANDIDATE_WIDTHS_MM = np.round(np.arange(0.15, 1.001, 0.05), 3)
+CANDIDATE_GAPS_MM = np.round(np.arange(0.15, 0.601, 0.025), 3)
+
+# Finger length limits
+MIN_FINGER_LENGTH_MM = 1.0
+MAX_FINGER_LENGTH_MM = 25.0
+
+# Finger width tolerance the sensitivity is quoted for (over-etch narrows
+# each finger and widens each gap by this much), and the most a design may drift
+ETCH_MM = 0.025
+MAX_ETCH_CHANGE = 0.05
+
+# Targets solved in advance for query()
+QUERY_TARGETS_PF = np.geomspace(0.1, 50.0, 2001)
+
+# Solved targets either side of a query whose designs it chooses between
+QUERY_NEIGHBOURS = 2
+
+# Targets per block in design(), bounding its working arrays
+DESIGN_CHUNK = 64
+
+# Saved surface, next to this file. It is rebuilt when the grids, the
+# stack-ups or the solver settings it was built with change; bump
+# SURFACE_VERSION when the solver itself changes.
+SURFACE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pcb_capacitor_surface.npz")
+SURFACE_VERSION = 1
+
+
+def surface_parameters(stackups=field_solver.STANDARD_THICKNESSES_MM, widths_mm=SURFACE_WIDTHS_MM,
+                       gaps_mm=SURFACE_GAPS_MM):
+    """Everything a built surface depends on, as one array to compare against a saved file."""
+    solver = [SURFACE_VERSION, field_solver.EPSILON_FR4, field_solver.COPPER_THICKNESS_MM,
+              field_solver.MESH_FINE_FRACTION, field_solver.MESH_GROWTH, field_solver.OPEN_BOUNDARY_SCALE]
+    return np.concatenate((solver, list(stackups.values()), widths_mm, gaps_mm)).astype(float)
+
+
+class CapacitorSurface:
+    """Per-unit-length interdigital capacitance over width, gap and stack-up."""
+
+    def __init__(self, stackups, widths_mm, gaps_mm, c_gap, c_edge, parameters=None):
+        self.stackups = list(stackups)
+        self.parameters = parameters
+        self.widths_mm = np.asarray(widths_mm, dtype=float)
+        self.gaps_mm = np.asarray(gaps_mm, dtype=float)
+        self.c_gap = np.asarray(c_gap, dtype=float)
+        self.c_edge = np.asarray(c_edge, dtype=float)
+        x, y = np.log(self.widths_mm), np.log(self.gaps_mm)
+        self._splines = [(RectBivariateSpline(x, y, np.log(g)), RectBivariateSpline(x, y, e))
+                         for g, e in zip(self.c_gap, self.c_edge)]
+        self._candidates = self._tabulate()
+        self._answers = self.design(QUERY_TARGETS_PF)
+
+    @classmethod
+    def build(cls, stackups=field_solver.STANDARD_THICKNESSES_MM, widths_mm=SURFACE_WIDTHS_MM,
+              gaps_mm=SURFACE_GAPS_MM):
+        """Solves the width x gap grid of every stack-up with the field solver."""
+        w, g = np.meshgrid(widths_mm, gaps_mm, indexing='ij')
+        c_gap, c_edge = [], []
+        for h in stackups.values():
+            edge = field_solver.interdigital_pf_per_mm(1, w, g, h)
+            c_gap.append(field_solver.interdigital_pf_per_mm(2, w, g, h) - edge)
+            c_edge.append(edge)
+        return cls(stackups, widths_mm, gaps_mm, c_gap, c_edge, surface_parameters(stackups, widths_mm, gaps_mm))
+
+    def save(self, filename=SURFACE_FILE):
+        np.savez(filename, stackups=np.array(self.stackups), widths_mm=self.widths_mm,
+                 gaps_mm=self.gaps_mm, c_gap=self.c_gap, c_edge=self.c_edge, parameters=self.parameters)
+
+    @classmethod
+    def load(cls, filename=SURFACE_FILE):
+        data = np.load(filename)
+        parameters = data["parameters"] if "parameters" in data.files else None
+        return cls([str(s) for s in data["stackups"]], data["widths_mm"], data["gaps_mm"],
+                   data["c_gap"], data["c_edge"], parameters)
+
+    # --- Interpolation ---
+
+    def per_mm(self, n_fingers, width_mm, gap_mm, stackup):
+        """Interpolated capacitance per unit finger length (pF/mm) and its width and gap derivatives."""
+        log_gap, edge = self._splines[self.stackups.index(stackup)]
+        n, w, g = np.broadcast_arrays(np.asarray(n_fingers, dtype=float), np.asarray(width_mm, dtype=float),
+                                      np.asarray(gap_mm, dtype=float))
+        x, y = np.log(w), np.log(g)
+        c_gap = np.exp(log_gap.ev(x, y))
+        value = (n - 1) * c_gap + edge.ev(x, y)
+        d_width = ((n - 1) * c_gap * log_gap.ev(x, y, dx=1) + edge.ev(x, y, dx=1)) / w
+        d_gap = ((n - 1) * c_gap * log_gap.ev(x, y, dy=1) + edge.ev(x, y, dy=1)) / g
+        return value, d_width, d_gap
+
+    def capacitance(self, n_fingers, length_mm, width_mm, gap_mm, stackup):
+        """Interdigital capacitance in pF from the surface."""
+        return self.per_mm(n_fingers, width_mm, gap_mm, stackup)[0] * length_mm
+
+    def _tabulate(self):
+        n, w, g = [a.ravel() for a in np.meshgrid(CANDIDATE_FINGERS, CANDIDATE_WIDTHS_MM, CANDIDATE_GAPS_MM,
+                                                   indexing='ij')]
+        columns = {"stackup": [], "n_fingers": [], "width_mm": [], "gap_mm": [], "per_mm": [], "etch_change": []}
+        for s, stackup in enumerate(self.stackups):
+            value, d_width, d_gap = self.per_mm(n, w, g, stackup)
+            etch_change = ETCH_MM * np.abs(d_gap - d_width) / value
+            for key, column in zip(columns, (np.full(len(n), s), n, w, g, value, etch_change)):
+                columns[key].append(column)
+        table = {key: np.concatenate(column) for key, column in columns.items()}
+        # Footprint across the fingers, and along them the bus bars (one
+        # finger width each) plus the gap between each finger tip and the
+        # opposite bus
+        table["span_mm"] = table["n_fingers"] * table["width_mm"] + (table["n_fingers"] - 1) * table["gap_mm"]
+        table["ends_mm"] = 2 * (table["gap_mm"] + table["width_mm"])
+        return table
+
+    # --- Inverse Design ---
+
+    def design(self, target_pf, stackup=None, min_gap_mm=0.0, min_width_mm=0.0,
+               max_etch_change=MAX_ETCH_CHANGE):
+        """
+        Smallest-footprint candidate for each target (scalar or array),
+        among those within max_etch_change of their value under ETCH_MM of
+        over-etch; if none is, the least sensitive. stackup=None searches
+        every stack-up. Returns a dict of arrays shaped like target_pf;
+        infeasible targets have n_fingers 0.
+        """
+        t = self._candidates
+        keep = (t["gap_mm"] >= min_gap_mm - 1e-9) & (t["width_mm"] >= min_width_mm - 1e-9)
+        if stackup is not None:
+            keep &= t["stackup"] == self.stackups.index(stackup)
+        index = np.flatnonzero(keep)
+        target = np.asarray(target_pf, dtype=float)
+        chosen, length, feasible = [], [], []
+        for chunk in np.array_split(target.ravel(), max(1, target.size // DESIGN_CHUNK)):
+            lengths = chunk[:, None] / t["per_mm"][index]
+            fits = (lengths >= MIN_FINGER_LENGTH_MM) & (lengths <= MAX_FINGER_LENGTH_MM)
+            area = t["span_mm"][index] * (lengths + t["ends_mm"][index])
+            score = np.where(fits & (t["etch_change"][index] <= max_etch_change), area, np.inf)
+            # Fall back to the least sensitive fitting candidate where nothing is calm enough
+            fallback = np.where(fits, t["etch_change"][index], np.inf)
+            best = np.where(np.isfinite(score.min(axis=1)), score.argmin(axis=1), fallback.argmin(axis=1))
+            rows = np.arange(len(best))
+            chosen.append(index[best])
+            length.append(lengths[rows, best])
+            feasible.append(fits[rows, best])
+        return self._result(np.concatenate(chosen), np.concatenate(length), np.concatenate(feasible), target.shape)
+
+    def _result(self, chosen, length, feasible, shape):
+        t = self._candidates
+        stackup = np.array(self.stackups)[t["stackup"][chosen]]
+        result = {
+            "stackup": np.where(feasible, stackup, ""),
+            "n_fingers": np.where(feasible, t["n_fingers"][chosen], 0).astype(int),
+            "finger_length_mm": np.where(feasible, length, np.nan),
+            "finger_width_mm": np.where(feasible, t["width_mm"][chosen], np.nan),
+            "gap_mm": np.where(feasible, t["gap_mm"][chosen], np.nan),
+            "area_mm2": np.where(feasible, t["span_mm"][chosen] * (length + t["ends_mm"][chosen]), np.nan),
+            "etch_change": np.where(feasible, t["etch_change"][chosen], np.nan),
+            "_candidate": chosen,
+        }
+        return {key: value.reshape(shape) for key, value in result.items()}
+
+    def query(self, target_pf, neighbours=QUERY_NEIGHBOURS, max_etch_change=MAX_ETCH_CHANGE):
+        """
+        Fast design lookup from the targets solved in advance: the
+        candidates of the solved targets either side of each target are
+        scored as design() scores them, with the finger length recomputed
+        for the exact value, and the best is kept.
+        """
+        target = np.asarray(target_pf, dtype=float).ravel()
+        above = np.searchsorted(QUERY_TARGETS_PF, target)
+        k = np.clip(above[:, None] + np.arange(-neighbours, neighbours), 0, len(QUERY_TARGETS_PF) - 1)
+        chosen = self._answers["_candidate"][k]
+        t = self._candidates
+        lengths = target[:, None] / t["per_mm"][chosen]
+        fits = ((self._answers["n_fingers"][k] > 0) & (lengths >= MIN_FINGER_LENGTH_MM)
+                & (lengths <= MAX_FINGER_LENGTH_MM))
+        area = t["span_mm"][chosen] * (lengths + t["ends_mm"][chosen])
+        score = np.where(fits & (t["etch_change"][chosen] <= max_etch_change), area, np.inf)
+        fallback = np.where(fits, t["etch_change"][chosen], np.inf)
+        best = np.where(np.isfinite(score.min(axis=1)), score.argmin(axis=1), fallback.argmin(axis=1))
+        rows = np.arange(len(target))
+        return self._result(chosen[rows, best], lengths[rows, best], fits[rows, best], np.shape(target_pf))
+
+
+@functools.lru_cache(maxsize=None)
+def load_surface(filename=SURFACE_FILE):
+    """
+    The saved surface, built and saved first if the file does not exist or
+    was built with other grids or solver settings than surface_parameters().
+    """
+    if os.path.exists(filename):
+        surface = CapacitorSurface.load(filename)
+        if surface.parameters is not None and np.array_equal(surface.parameters, surface_parameters()):
+            return surface
+        print(f"{filename} is out of date; rebuilding")
+    print("Solving the interdigital capacitor surface (about a minute, once)...")
+    surface = CapacitorSurface.build()
+    surface.save(filename)
+    return surface
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    surface = CapacitorSurface.build()
+    surface.save()
+    print(f"Surface: {len(surface.stackups)} stack-ups x {len(SURFACE_WIDTHS_MM)} widths x "
+          f"{len(SURFACE_GAPS_MM)} gaps solved in {time.perf_counter() - start:.0f} s, "
+          f"{len(surface._candidates['per_mm'])} candidates")
+
+    # Interpolation error at geometries off the solver grid
+    rng = np.random.default_rng(4)
+    errors = []
+    for _ in range(12):
+        stackup = surface.stackups[rng.integers(len(surface.stackups))]
+        n, w, g = rng.integers(2, 15), rng.uniform(0.15, 1.0), rng.uniform(0.15, 0.6)
+        solved = float(field_solver.interdigital_capacitance(n, 10, w, g,
+                                                             field_solver.STANDARD_THICKNESSES_MM[stackup]))
+        errors.append(float(surface.capacitance(n, 10, w, g, stackup)) / solved - 1)
+    print(f"Surface against direct solves off-grid: worst {100 * max(np.abs(errors)):.2f}%")
+
+    print(f"\n{'Target':>7} {'Stack-up':<14} {'Fingers':>7} {'Length':>7} {'Width':>6} {'Gap':>6} "
+          f"{'Area':>8} {'Etch':>7} {'Check':>7}")
+    for target in (0.5, 1.0, 2.0, 5.0, 10.0, 20.0):
+        d = surface.query(target)
+        check = float(field_solver.interdigital_capacitance(d["n_fingers"], d["finger_length_mm"],
+                                                            d["finger_width_mm"], d["gap_mm"],
+                                                            field_solver.STANDARD_THICKNESSES_MM[str(d["stackup"])]))
+        print(f"{target:6.1f}p {str(d['stackup']):<14} {int(d['n_fingers']):7d} {float(d['finger_length_mm']):6.2f}m "
+              f"{float(d['finger_width_mm']):6.2f} {float(d['gap_mm']):6.3f} {float(d['area_mm2']):6.1f}m2 "
+              f"{100 * float(d['etch_change']):6.2f}% {check:6.3f}p")
+
+    # Ten queries between each pair of solved targets, over the whole range
+    targets = np.geomspace(QUERY_TARGETS_PF[0], QUERY_TARGETS_PF[-1], 10 * len(QUERY_TARGETS_PF))
+    start = time.perf_counter()
+    fast = surface.query(targets)
+    per_query = (time.perf_counter() - start) / len(targets)
+    exact = surface.design(targets)
+    both = (fast["n_fingers"] > 0) & (exact["n_fingers"] > 0)
+    excess = np.max(fast["area_mm2"][both] / exact["area_mm2"][both] - 1)
+    mismatched = np.count_nonzero((fast["n_fingers"] > 0) != (exact["n_fingers"] > 0))
+    print(f"\nquery(): {per_query * 1e6:.2f} us per target; on {len(targets)} targets the footprint is within "
+          f"{100 * excess:.2f}% of a full design() scan, feasibility differs on {mismatched}")
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+2-D Quasi-Static Field Solver for PCB Capacitors
+================================================
+
+Replaces the closed-form estimates in pcb-capacitor-design.py with a
+finite-difference solution of Laplace's equation over the board cross
+section. Conductors have their real copper thickness, the FR4 slab sits
+between air (or a ground plane, for inner-layer stack-ups) and the
+solution gives the Maxwell capacitance matrix per unit length.
+
+The cross section is meshed on a rectilinear grid graded towards every
+conductor edge and dielectric interface. Each grid edge gets a
+finite-volume conductance from the permittivity of the cells beside it;
+the resulting sparse system is factorized once and solved for every
+conductor, and the capacitance matrix is Phi^T A Phi, the field energy.
+
+Structures:
+- coupled traces: two strips side by side (edge coupling)
+- interdigital fingers: a periodic cell with symmetry walls at the finger
+  centres gives the coupling per gap, and a two-finger solve adds the
+  extra fringing of the outer fingers
+- parallel plates: strips on opposite sides of the dielectric; the edge
+  fringing per unit length is applied around the whole plate perimeter
+
+2-D capacitance per unit length depends only on the ratios of the cross
+section's dimensions, so results are cached by the normalized section.
+Sweeps collect the sections they have not seen and solve them together as
+one block-diagonal system.
+"""
+
+import math
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+EPSILON_0 = 8.854e-12  # F/m
+EPSILON_FR4 = 4.4
+
+# Dielectric thickness under the copper of each stack-up
+STANDARD_THICKNESSES_MM = {
+    "2-layer": 1.6,
+    "4-layer_outer": 0.36,  # Typical 4-layer stackup outer prepreg
+    "4-layer_inner": 0.71,  # Typical 4-layer stackup inner core
+    "thin": 0.2,            # Thin PCB or close spacing
+}
+
+# 1 oz copper
+COPPER_THICKNESS_MM = 0.035
+
+# Mesh: finest cell as a fraction of the smallest feature, growth ratio
+# between neighbouring cells, and how far the open boundary is placed
+# relative to the structure's size
+MESH_FINE_FRACTION = 0.02
+MESH_GROWTH = 1.3
+OPEN_BOUNDARY_SCALE = 40.0
+
+# Cross sections solved per block-diagonal batch
+SOLVE_BATCH = 16
+
+_cache = {}
+
+# --- Mesh and Assembly ---
+
+def graded_axis(keys, lo, hi, fine, growth=MESH_GROWTH):
+    """Grid coordinates from lo to hi, fine at every key and growing geometrically between them."""
+    keys = np.unique(np.clip(np.concatenate((keys, [lo, hi])), lo, hi))
+    points = [keys]
+    for a, b in zip(keys[:-1], keys[1:]):
+        half = (b - a) / 2
+        steps = fine * np.cumsum(growth ** np.arange(int(math.log(1 + half / fine * (growth - 1)) / math.log(growth)) + 1))
+        steps = steps[steps < half * 0.95]
+        points += [a + steps, b - steps]
+    axis = np.unique(np.concatenate(points))
+    return axis[np.concatenate(([True], np.diff(axis) > fine * 1e-3))]
+
+
+def _inside(x, y, rect):
+    x0, x1, y0, y1 = rect
+    tol = 1e-9 * max(1.0, abs(x1 - x0), abs(y1 - y0))
+    return (x[:, None] >= x0 - tol) & (x[:, None] <= x1 + tol) & (y[None, :] >= y0 - tol) & (y[None, :] <= y1 + tol)
+
+
+def assemble(section):
+    """
+    Builds the finite-volume operator of a cross section. Returns the
+    sparse matrix over all nodes, the conductor index of every node (-1
+    free, -2 held at zero) and the number of conductors.
+    """
+    conductors, slabs, bounds, fine, walls = section
+    x0, x1, y0, y1 = bounds
+    keys_x = [v for rects in conductors for r in rects for v in r[:2]]
+    keys_y = [v for rects in conductors for r in rects for v in r[2:]] + [v for s in slabs for v in s[:2]]
+    x = graded_axis(np.array(keys_x), x0, x1, fine)
+    y = graded_axis(np.array(keys_y), y0, y1, fine)
+    nx, ny = len(x), len(y)
+
+    # Relative permittivity of each cell, from the slab containing its centre
+    yc = (y[:-1] + y[1:]) / 2
+    eps = np.ones(ny - 1)
+    for s0, s1, er in slabs:
+        eps[(yc > s0) & (yc < s1)] = er
+    dx, dy = np.diff(x), np.diff(y)
+    index = np.arange(nx * ny).reshape(nx, ny)
+
+    # Edges along x: conductance from the half cells above and below
+    above = np.concatenate((eps * dy / 2, [0]))
+    below = np.concatenate(([0], eps * dy / 2))
+    gx = (above + below)[None, :] / dx[:, None]
+    # Edges along y: conductance from the half columns left and right
+    half_width = (np.concatenate((dx / 2, [0])) + np.concatenate(([0], dx / 2)))
+    gy = half_width[:, None] * eps[None, :] / dy[None, :]
+
+    p = np.concatenate((index[:-1, :].ravel(), index[:, :-1].ravel()))
+    q = np.concatenate((index[1:, :].ravel(), index[:, 1:].ravel()))
+    g = np.concatenate((gx.ravel(), gy.ravel()))
+    a = sparse.coo_matrix((np.concatenate((g, g, -g, -g)),
+                           (np.concatenate((p, q, p, q)), np.concatenate((p, q, q, p)))),
+                          shape=(nx * ny, nx * ny)).tocsc()
+
+    # Outer boundary at zero except symmetry walls, which are left free
+    # (the finite-volume default is zero normal flux)
+    label = np.full((nx, ny), -1)
+    label[:, 0] = label[:, -1] = -2
+    if not walls:
+        label[0, :] = label[-1, :] = -2
+    for k, rects in enumerate(conductors):
+        for rect in rects:
+            label[_inside(x, y, rect)] = k
+    return a, label.ravel(), len(conductors)
+
+
+def solve_sections(sections):
+    """Maxwell capacitance matrices (pF/mm) of several cross sections in one sparse solve."""
+    blocks = [assemble(section) for section in sections]
+    a = sparse.block_diag([b[0] for b in blocks], format='csc')
+    label = np.concatenate([b[1] for b in blocks])
+    offsets = np.cumsum([0] + [len(b[1]) for b in blocks])
+    columns = np.cumsum([0] + [b[2] for b in blocks])
+
+    # One right-hand side per conductor of every section
+    phi = np.zeros((len(label), columns[-1]))
+    for s, (_, section_label, count) in enumerate(blocks):
+        for k in range(count):
+            phi[offsets[s]:offsets[s + 1], columns[s] + k] = section_label == k
+    free = np.flatnonzero(label == -1)
+    fixed = np.flatnonzero(label >= 0)
+    a_free = a[free][:, free]
+    phi[free] = splu(a_free).solve(-(a[free][:, fixed] @ phi[fixed]))
+
+    energy = phi.T @ (a @ phi)
+    scale = EPSILON_0 * 1e9
+    return [energy[columns[s]:columns[s + 1], columns[s]:columns[s + 1]] * scale for s in range(len(sections))]
+
+# --- Cross Sections ---
+# All dimensions in mm. y = 0 is the top of the dielectric, which fills
+# -h < y < 0; a ground plane, when present, is the bottom boundary at y = -h.
+
+def _open_bounds(width, h, copper, ground_plane):
+    extent = OPEN_BOUNDARY_SCALE * max(width, h)
+    bottom = -h if ground_plane else -h - extent
+    return (-extent, extent, bottom, copper + extent)
+
+
+def coupled_traces_section(width, gap, h, epsilon_r, copper=COPPER_THICKNESS_MM, ground_plane=False):
+    x = gap / 2
+    conductors = (((-x - width, -x, 0.0, copper),), ((x, x + width, 0.0, copper),))
+    fine = MESH_FINE_FRACTION * min(width, gap, h)
+    return (conductors, ((-h, 0.0, epsilon_r),), _open_bounds(2 * width + gap, h, copper, ground_plane), fine, False)
+
+
+def interdigital_cell_section(width, gap, h, epsilon_r, copper=COPPER_THICKNESS_MM, ground_plane=False):
+    # From the centre of one finger to the centre of the next; the walls
+    # are symmetry planes of the alternating comb
+    period = width + gap
+    conductors = (((0.0, width / 2, 0.0, copper),), ((width / 2 + gap, period, 0.0, copper),))
+    extent = 10 * max(period, copper)
+    bottom = -h if ground_plane else -h - extent
+    fine = MESH_FINE_FRACTION * min(width, gap, h)
+    return (conductors, ((-h, 0.0, epsilon_r),), (0.0, period, bottom, copper + extent), fine, True)
+
+
+def parallel_plate_section(width, h, epsilon_r, copper=COPPER_THICKNESS_MM):
+    conductors = (((-width / 2, width / 2, 0.0, copper),), ((-width / 2, width / 2, -h - copper, -h),))
+    fine = MESH_FINE_FRACTION * min(width, h)
+    extent = OPEN_BOUNDARY_SCALE * max(width, h)
+    return (conductors, ((-h, 0.0, epsilon_r),), (-extent, extent, -h - copper - extent, copper + extent), fine, False)
+
+
+def _normalized(section):
+    # Cache key: the section scaled to unit dielectric thickness
+    conductors, slabs, bounds, fine, walls = section
+    h = slabs[0][1] - slabs[0][0]
+    scale = lambda values: tuple(round(v / h, 9) for v in values)
+    return (tuple(tuple(scale(r) for r in rects) for rects in conductors),
+            tuple(scale(s[:2]) + (round(s[2], 9),) for s in slabs), scale(bounds), round(fine / h, 9), walls), h
+
+
+def capacitance_matrices(sections):
+    """Maxwell matrices (pF/mm) for a list of cross sections, solving only those not cached."""
+    keys = [_normalized(section)[0] for section in sections]
+    pending = list(dict.fromkeys(k for k in keys if k not in _cache))
+    for start in range(0, len(pending), SOLVE_BATCH):
+        batch = pending[start:start + SOLVE_BATCH]
+        for key, matrix in zip(batch, solve_sections(batch)):
+            _cache[key] = matrix
+    return [_cache[k] for k in keys]
+
+# --- Capacitor Structures ---
+# Each accepts scalars or arrays, which broadcast; the result has the
+# broadcast shape.
+
+def two_terminal(matrix):
+    """
+    Capacitance between two floating conductors carrying equal and
+    opposite charge. Without a ground plane this is the capacitor's value:
+    it adds to the mutual term the series path through the far boundary.
+    """
+    sense = np.array([1.0, -1.0])
+    return 1 / (sense @ np.linalg.solve(matrix, sense))
+
+
+def mutual(matrix):
+    """The coupling term alone, for conductors over a ground plane."""
+    return -matrix[0, 1]
+
+def _sweep(build, reduce, *args):
+    arrays = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+    flat = [a.ravel() for a in arrays]
+    matrices = capacitance_matrices([build(*values) for values in zip(*flat)])
+    return np.array([reduce(m, *values) for m, values in zip(matrices, zip(*flat))]).reshape(arrays[0].shape)
+
+
+def coupled_traces_pf_per_mm(width_mm, gap_mm, h_mm, epsilon_r=EPSILON_FR4, copper_mm=COPPER_THICKNESS_MM,
+                             ground_plane=False):
+    """
+    Capacitance per unit length between two side-by-side traces, pF/mm:
+    the floating pair without a ground plane, the mutual term with one.
+    """
+    build = lambda w, g, h, er, t: coupled_traces_section(w, g, h, er, t, ground_plane)
+    reduce = mutual if ground_plane else two_terminal
+    return _sweep(build, lambda m, *_: reduce(m), width_mm, gap_mm, h_mm, epsilon_r, copper_mm)
+
+
+def interdigital_pf_per_mm(n_fingers, width_mm, gap_mm, h_mm, epsilon_r=EPSILON_FR4,
+                           copper_mm=COPPER_THICKNESS_MM, ground_plane=False):
+    """Comb-to-comb capacitance per unit finger length of an interdigital capacitor, pF/mm."""
+    build = lambda w, g, h, er, t: interdigital_cell_section(w, g, h, er, t, ground_plane)
+    per_gap = _sweep(build, lambda m, *_: mutual(m), width_mm, gap_mm, h_mm, epsilon_r, copper_mm)
+    pair = coupled_traces_pf_per_mm(width_mm, gap_mm, h_mm, epsilon_r, copper_mm, ground_plane)
+    return (np.asarray(n_fingers) - 1) * per_gap + (pair - per_gap)
+
+
+def interdigital_capacitance(n_fingers, length_mm, width_mm, gap_mm, h_mm, epsilon_r=EPSILON_FR4,
+                             copper_mm=COPPER_THICKNESS_MM, ground_plane=False):
+    """Interdigital capacitance in pF; finger ends and bus bars are not included."""
+    return interdigital_pf_per_mm(n_fingers, width_mm, gap_mm, h_mm, epsilon_r, copper_mm, ground_plane) * length_mm
+
+
+def parallel_plate_capacitance(width_mm, length_mm, h_mm, epsilon_r=EPSILON_FR4, copper_mm=COPPER_THICKNESS_MM):
+    """
+    Capacitance of overlapping plates on opposite sides of the dielectric,
+    pF. The fringing per unit edge length comes from a cross section of
+    the plate's width and is applied to all four edges.
+    """
+    build = lambda w, h, er, t: parallel_plate_section(w, h, er, t)
+    per_mm = _sweep(build, lambda m, *_: two_terminal(m), width_mm, h_mm, epsilon_r, copper_mm)
+    ideal_per_mm = EPSILON_0 * 1e9 * np.asarray(epsilon_r) * np.asarray(width_mm) / np.asarray(h_mm)
+    fringe_per_edge = (per_mm - ideal_per_mm) / 2
+    return ideal_per_mm * length_mm + fringe_per_edge * 2 * (np.asarray(width_mm) + np.asarray(length_mm))
+
+
+def plate_side_for(target_pf, h_mm, epsilon_r=EPSILON_FR4, copper_mm=COPPER_THICKNESS_MM):
+    """
+    Side in mm of the square parallel-plate capacitor giving target_pf,
+    fringing included. Fringing per unit edge length barely changes once
+    the plate is wider than the dielectric is thick, so one field solution
+    at the ideal side fixes it: C = (eps/h) s^2 + 4 f s.
+    """
+    per_area = EPSILON_0 * epsilon_r * 1e9 / h_mm
+    ideal_side = math.sqrt(target_pf / per_area)
+    fringe = (float(parallel_plate_capacitance(ideal_side, ideal_side, h_mm, epsilon_r, copper_mm))
+              - per_area * ideal_side ** 2) / (4 * ideal_side)
+    return (-2 * fringe + math.sqrt(4 * fringe ** 2 + per_area * target_pf)) / per_area
+
+
+def cache_size():
+    return len(_cache)
+
+# --- Reference Solutions ---
+
+def coplanar_strips_pf_per_mm(width_mm, gap_mm, epsilon_r):
+    """Conformal-mapping result for zero-thickness strips on an infinitely thick substrate."""
+    from scipy.special import ellipk
+    k = gap_mm / (gap_mm + 2 * width_mm)
+    return EPSILON_0 * 1e9 * (epsilon_r + 1) / 2 * ellipk(1 - k ** 2) / ellipk(k ** 2)
+
+
+def interdigital_closed_form_pf_per_mm(width_mm, gap_mm, epsilon_r):
+    """The periodic-comb conformal map (zero thickness, thick substrate), per gap."""
+    from scipy.special import ellipk
+    k = math.sin(math.pi / 2 * width_mm / (width_mm + gap_mm))
+    return EPSILON_0 * 1e9 * (epsilon_r + 1) / 2 * ellipk(k ** 2) / ellipk(1 - k ** 2)
+
+
+if __name__ == "__main__":
+    # Thin copper on a thick substrate against the conformal-mapping solutions
+    print(f"{'Check':<34} {'Solver':>10} {'Reference':>10} {'Error':>8}")
+    for width, gap in [(0.3, 0.15), (0.5, 0.2), (1.0, 0.15)]:
+        solved = float(coupled_traces_pf_per_mm(width, gap, 20.0, 4.4, copper_mm=0.001))
+        reference = coplanar_strips_pf_per_mm(width, gap, 4.4)
+        print(f"{f'Coplanar strips w={width} g={gap}':<34} {solved:10.5f} {reference:10.5f} "
+              f"{100 * (solved / reference - 1):+7.2f}%")
+    for width, gap in [(0.3, 0.15), (0.2, 0.2)]:
+        build = lambda w, g: interdigital_cell_section(w, g, 20.0, 4.4, 0.001)
+        solved = mutual(capacitance_matrices([build(width, gap)])[0])
+        reference = interdigital_closed_form_pf_per_mm(width, gap, 4.4)
+        print(f"{f'Interdigital cell w={width} g={gap}':<34} {solved:10.5f} {reference:10.5f} "
+              f"{100 * (solved / reference - 1):+7.2f}%")
+
+    # Solver against the closed forms it replaces, for each stack-up
+    print(f"\n{'Stack-up':<15} {'Structure':<30} {'Solver (pF)':>12} {'Old formula':>12}")
+    for name, h in STANDARD_THICKNESSES_MM.items():
+        solved = float(interdigital_capacitance(7, 10, 0.3, 0.15, h))
+        crude = 4.4 * 0.1 * (0.3 / 0.15) ** 0.5 * 10 * 6
+        print(f"{name:<15} {'Interdigital 7 x 10 mm':<30} {solved:12.3f} {crude:12.3f}")
+        solved = float(coupled_traces_pf_per_mm(0.5, 0.15, h)) * 20
+        crude = (4.4 + 1) / 2 * EPSILON_0 * 1e12 * (0.5 / 0.15) * 0.7 * 20
+        print(f"{name:<15} {'Edge coupling 20 mm':<30} {solved:12.3f} {crude:12.3f}")
+        solved = float(parallel_plate_capacitance(5, 5, h))
+        ideal = EPSILON_0 * 4.4 * 25e-6 / (h * 1e-3) * 1e12
+        print(f"{name:<15} {'Parallel plate 5 x 5 mm':<30} {solved:12.3f} {ideal:12.3f}")
+
+    # A geometry sweep: every new cross section solved in batches, then
+    # the same sweep again from the cache
+    widths, gaps = np.meshgrid(np.linspace(0.15, 0.6, 6), np.linspace(0.1, 0.3, 5))
+    for label in ("Sweep", "Cached sweep"):
+        start = time.perf_counter()
+        interdigital_capacitance(5, 10, widths, gaps, 1.6)
+        print(f"\n{label}: {widths.size} geometries in {(time.perf_counter() - start) * 1e3:.0f} ms, "
+              f"{cache_size()} cross sections cached", end="")
+    print()
@@ -5,12 +5,18 @@ Simulate All 7 BPF Bands with ngspice
 
 Generates individual netlists for each band and runs ngspice simulations.
 Produces PNG frequency response plots for each band.
+
+Netlists come from filter_transformers.py: the band<n>.mod values with
+the 50 ohm matching transformers as coupled inductors and the end-tank
+capacitors already compensated for their loading.
 """
 
 import subprocess
 import os
 import sys
 
+import filter_transformers
+
 # Band definitions
 bands = [
     {'num': 1, 'name': 'Band 1 (160m)', 'low': 1.8,  'high': 2.0},
@@ -22,31 +28,24 @@ bands = [
     {'num': 7, 'name': 'Band 7 (10m)',  'low': 28.0, 'high': 32.0},
 ]
 
-def generate_netlist(band):
-    """Generate a netlist for a specific band."""
+def generate_netlist(band, design):
+    """Generate a netlist for a specific band, transformers included and end tanks compensated."""
     
     band_num = band['num']
     band_name = band['name']
-    band_file = f'band{band_num}.mod'
     netlist_file = f'band{band_num}.cir'
     output_png = f'band{band_num}_response.png'
     output_csv = f'band{band_num}_data.csv'
     
-    # Read the template
-    with open('bpf-simulation-template.cir', 'r') as f:
-        template = f.read()
-    
-    # Replace placeholders
-    netlist = template.replace('BAND_NAME', band_name)
-    netlist = netlist.replace('BAND_FILE', band_file)
-    netlist = netlist.replace('OUTPUT_FILE', output_png)
-    netlist = netlist.replace('CSV_FILE', output_csv)
+    netlist = filter_transformers.band_netlist(design, title=band_name, output_png=output_png,
+                                               output_csv=output_csv)
     
     # Write the netlist
     with open(netlist_file, 'w') as f:
         f.write(netlist)
     
-    print(f"Generated {netlist_file} for {band_name}")
+    print(f"Generated {netlist_file} for {band_name} ({design['core']} {design['turns'][0]}:{design['turns'][1]}, "
+          f"end tanks {design['c_end_f'] * 1e12:.2f}p -> {design['c_end_compensated_f'] * 1e12:.2f}p)")
     return netlist_file, output_png
 
 def run_simulation(netlist_file):
@@ -91,11 +90,6 @@ def main():
     print("BPF MULTI-BAND SIMULATION")
     print("=" * 60)
     
-    # Check if template exists
-    if not os.path.exists('bpf-simulation-template.cir'):
-        print("ERROR: bpf-simulation-template.cir not found!")
-        sys.exit(1)
-    
     # Check if band files exist
     missing_bands = []
     for band in bands:
@@ -108,12 +102,15 @@ def main():
         print("Run transformer-coupled-three-tank-bpf-minimal-fix.py first!")
         sys.exit(1)
     
+    # Transformer model and end-tank compensation for all bands at once
+    designs = filter_transformers.compensated_band_filters()
+    
     # Simulate each band
     successful = []
     failed = []
     
-    for band in bands:
-        netlist_file, output_png = generate_netlist(band)
+    for band, design in zip(bands, designs):
+        netlist_file, output_png = generate_netlist(band, design)
         
         if run_simulation(netlist_file):
             if os.path.exists(output_png):
@@ -12,6 +12,11 @@ Author: Claude
 import math
 import numpy as np
 
+import ferrite_cores as core_db
+
+# Core the hand calculations below are worked for
+DESIGN_CORE = "FT37-43"
+
 def analyze_autotransformer():
     """
     Analyze autotransformer (tapped inductor) for 1:1.41 ratio.
@@ -67,7 +72,7 @@ def analyze_autotransformer():
     print(f"  Total inductance: {L_total_uH:.2f} µH")
     
     # Core selection for FT37-43 (common ferrite toroid)
-    AL_nH = 420  # nH per turn² for FT37-43
+    AL_nH = core_db.CORE_AL_NH[DESIGN_CORE]  # nH per turn²
     
     # Calculate turns
     N_primary = math.sqrt(L_primary_uH * 1000 / AL_nH)
@@ -137,7 +142,7 @@ def analyze_conventional_transformer():
     print(f"  Same as autotransformer: {Z_low}Ω → {Z_high}Ω")
     
     # For bifilar winding on FT37-43
-    AL_nH = 420
+    AL_nH = core_db.CORE_AL_NH[DESIGN_CORE]
     L_primary_uH = 2.36  # Same as auto
     
     N_primary = round(math.sqrt(L_primary_uH * 1000 / AL_nH))
@@ -281,6 +286,18 @@ def calculate_pcb_planar_transformer():
     print()
     print("NOT RECOMMENDED for 15 MHz - use wound toroid instead")
 
+def search_core_database():
+    """
+    Every core, turns and wire combination of ferrite_cores.py for each
+    ratio and filter band, instead of one core at a time.
+    """
+    print("\n" + "=" * 80)
+    print("CORE DATABASE SEARCH (all cores x turns x wire, every band)")
+    print("=" * 80)
+    print(f"Smallest core meeting XL > {core_db.MIN_REACTANCE_RATIO:g} Z, loss < {core_db.MAX_LOSS_DB:g} dB "
+          f"and the flux guideline at {core_db.TRANSFORMER_POWER_W:g} W\n")
+    core_db.print_designs(core_db.band_designs())
+
 if __name__ == "__main__":
     print("TRANSFORMER DESIGN FOR 50Ω → 100Ω MATCHING")
     print("For 13.5-18.5 MHz Bandpass Filter")
@@ -301,7 +318,7 @@ if __name__ == "__main__":
     print("=" * 80)
     
     # Inductance verification
-    AL = 420  # nH/turn² for FT37-43
+    AL = core_db.CORE_AL_NH[DESIGN_CORE]  # nH/turn²
     L_10turns = AL * 10**2 / 1000  # µH
     L_14turns = AL * 14**2 / 1000  # µH
     
@@ -311,6 +328,12 @@ if __name__ == "__main__":
     print(f"  Impedance ratio: {L_14turns/L_10turns:.3f} = {math.sqrt(L_14turns/L_10turns):.3f}:1")
     
     # Impedance at band edges
+    material = core_db.core(DESIGN_CORE)["material"]
+    mu_i = core_db.MATERIALS[material]["mu_i"]
     for f in [13.5, 15.8, 18.5]:
         XL = 2 * math.pi * f * 1e6 * L_10turns * 1e-6
-        print(f"  XL at {f} MHz: {XL:.1f} Ω (primary)")
\ No newline at end of file
+        mu_real, mu_imag = core_db.complex_permeability(material, f * 1e6)
+        print(f"  XL at {f} MHz: {XL:.1f} Ω (primary), {XL * mu_real / mu_i:.1f} Ω with µ' = {mu_real:.0f}, "
+              f"core Q = µ'/µ'' = {mu_real / mu_imag:.1f}")
+
+    search_core_database()
@@ -12,6 +12,9 @@ Author: Claude
 import math
 import numpy as np
 
+import ferrite_cores as core_db
+import filter_transformers
+
 def analyze_transformer_loading():
     """
     Calculate how transformer inductance affects tank resonance.
@@ -44,7 +47,7 @@ def analyze_transformer_loading():
     # Autotransformer inductance (from 100Ω side)
     # From previous calculation: 10 turns = 42µH from 50Ω side
     # From 100Ω side (14 turns): 82.32µH
-    L_transformer_uH = 82.32
+    L_transformer_uH = core_db.CORE_AL_NH["FT37-43"] * 14**2 / 1000
     L_transformer = L_transformer_uH * 1e-6
     
     print(f"\nAUTOTRANSFORMER LOADING:")
@@ -102,7 +105,7 @@ def analyze_solutions():
     print(f"  Target: L_transformer > {L_transformer_min_uH:.1f} µH")
     
     # For FT37-43 with AL = 420 nH/turn²
-    AL = 420
+    AL = core_db.CORE_AL_NH["FT37-43"]
     N_required = math.sqrt(L_transformer_min_uH * 1000 / AL)
     
     print(f"  Turns needed on FT37-43: {N_required:.0f} turns (from 100Ω port)")
@@ -128,7 +131,7 @@ def analyze_solutions():
     print("  Design tank accounting for parallel transformer L")
     
     # Given transformer with reasonable turns (e.g., 10+4 turns)
-    L_trans_100 = 82.32e-6  # 14 turns on FT37-43
+    L_trans_100 = core_db.CORE_AL_NH["FT37-43"] * 14**2 * 1e-9  # 14 turns on FT37-43
     
     # Design tank inductor to give correct parallel value
     L_parallel_target_nH = 350  # Want this effective inductance
@@ -148,8 +151,8 @@ def analyze_solutions():
     print("-" * 50)
     print("  Use different core with lower AL value")
     
-    # Try FT37-61 with AL = 75 nH/turn²
-    AL_61 = 75
+    # Try FT37-61, the lower-permeability mix
+    AL_61 = core_db.CORE_AL_NH["FT37-61"]
     N_design = 10  # 100Ω side turns
     L_trans_61 = AL_61 * N_design**2 / 1000  # µH
     
@@ -256,6 +259,20 @@ def calculate_blocking_cap_value():
     print(f"  • Standard value, readily available")
     print(f"  • 100V rating more than adequate")
 
+def automatic_compensation():
+    """
+    The compensation done for every band at once: the end-tank capacitors
+    re-solved against the transformer model (magnetizing L, leakage, core
+    loss) that simulate-all-bands.py now writes into each netlist.
+    """
+
+    print("\n" + "=" * 80)
+    print("AUTOMATIC END-TANK COMPENSATION (ALL BANDS)")
+    print("=" * 80)
+    print()
+
+    filter_transformers.print_compensation(filter_transformers.compensated_band_filters())
+
 if __name__ == "__main__":
     print("CRITICAL ANALYSIS: TRANSFORMER LOADING EFFECTS")
     print("=" * 80)
@@ -264,6 +281,7 @@ if __name__ == "__main__":
     analyze_solutions()
     recommended_architecture()
     calculate_blocking_cap_value()
+    automatic_compensation()
     
     print("\n" + "=" * 80)
     print("CONCLUSION")
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Antenna Tuner Lookup Index
+==========================
+
+Precomputes the best relay code of antenna_tuner.py over a grid of
+frequency and load reflection coefficient, so a retune is a table lookup
+instead of a search.
+
+Frequencies are log-spaced across each band in TUNER_BANDS. The load
+plane is a square grid of gamma = (Z - Z0) / (Z + Z0) cells out to
+GAMMA_MAX; cells outside that circle hold no code. Codes are stored
+palette-compressed: each cell is a 16-bit index into one list of the
+distinct relay codes.
+
+query() takes the nearest cell and then refines it: the codes of the
+surrounding cells and a code interpolated from their L and C values are
+evaluated with the tuner model at the exact frequency and load. The
+tables are written as a binary file and as a C++ header for the STM32,
+which uses the nearest-cell lookup.
+"""
+
+import math
+import time
+
+import numpy as np
+
+import antenna_tuner as tuner
+from bank_index import BankIndex
+
+# --- Configuration Constants ---
+
+# Frequency points are spaced by this fraction across each band
+FREQUENCY_STEP = 0.01
+
+# Reflection coefficient grid: spacing and the largest |gamma| covered
+# (0.65 is SWR 4.7, beyond the 4:1 the tuner is specified for)
+GAMMA_STEP = 0.05
+GAMMA_MAX = 0.65
+
+# Cell value for loads outside GAMMA_MAX
+NO_CODE = 0xFFFF
+
+INDEX_MAGIC = b'TUNR'
+INDEX_VERSION = 1
+INDEX_HEADER = np.dtype([('magic', 'S4'), ('version', '<u2'), ('grid_size', '<u2'),
+                         ('frequency_count', '<u4'), ('palette_size', '<u4'),
+                         ('gamma_step', '<f4'), ('gamma_max', '<f4')])
+
+
+def frequency_grid(bands=tuner.TUNER_BANDS, step=FREQUENCY_STEP):
+    """Log-spaced frequencies (Hz) covering each band edge to edge, and their band indexes."""
+    frequencies, band_of = [], []
+    for band_index, (_, f_low, f_high) in enumerate(bands):
+        count = int(math.ceil(math.log(f_high / f_low) / math.log1p(step))) + 1
+        frequencies.append(np.round(np.geomspace(f_low * 1e6, f_high * 1e6, count)))
+        band_of.append(np.full(count, band_index))
+    return np.concatenate(frequencies).astype(np.uint32), np.concatenate(band_of).astype(np.uint8)
+
+
+def gamma_grid(step=GAMMA_STEP, gamma_max=GAMMA_MAX):
+    """Cell centres of the square gamma grid, indexed [row (imaginary), column (real)]."""
+    half = int(round(gamma_max / step))
+    axis = np.arange(-half, half + 1) * step
+    return axis[None, :] + 1j * axis[:, None]
+
+
+class TunerIndex:
+    """Relay codes on a (frequency, gamma) grid, palette-compressed."""
+
+    def __init__(self, frequencies_hz, bands, palette, cells, gamma_step=GAMMA_STEP, gamma_max=GAMMA_MAX):
+        self.frequencies_hz = np.asarray(frequencies_hz, dtype=np.uint32)
+        self.bands = np.asarray(bands, dtype=np.uint8)
+        self.palette = np.asarray(palette, dtype=np.uint32)
+        self.cells = np.asarray(cells, dtype=np.uint16)
+        self.gamma_step = float(gamma_step)
+        self.gamma_max = float(gamma_max)
+        self.half = (self.cells.shape[1] - 1) // 2
+        self._l_index = BankIndex(tuner.L_BANK_UH)
+        self._c_index = BankIndex(tuner.C_BANK_PF)
+
+    @classmethod
+    def build(cls, bands=tuner.TUNER_BANDS, frequency_step=FREQUENCY_STEP,
+              gamma_step=GAMMA_STEP, gamma_max=GAMMA_MAX):
+        """Solves every cell inside gamma_max with antenna_tuner.tune_loads."""
+        frequencies_hz, band_of = frequency_grid(bands, frequency_step)
+        gamma = gamma_grid(gamma_step, gamma_max)
+        inside = np.abs(gamma) <= gamma_max + 1e-9
+        loads = tuner.load_from_gamma(gamma[inside])
+
+        codes = np.zeros((len(frequencies_hz),) + gamma.shape, dtype=np.int64)
+        for k, f_hz in enumerate(frequencies_hz):
+            codes[k][inside] = tuner.tune_loads(float(f_hz), loads)["code"]
+
+        palette, cells = np.unique(codes[:, inside], return_inverse=True)
+        if len(palette) >= NO_CODE:
+            raise ValueError(f"{len(palette)} distinct codes do not fit 16-bit cells")
+        packed = np.full(codes.shape, NO_CODE, dtype=np.uint16)
+        packed[:, inside] = cells.reshape(len(frequencies_hz), -1)
+        return cls(frequencies_hz, band_of, palette, packed, gamma_step, gamma_max)
+
+    # --- Lookup ---
+
+    def _frequency_points(self, f_hz):
+        # The grid points at or below and above f_hz within its band, with
+        # the interpolation weight of the upper one
+        upper = int(np.searchsorted(self.frequencies_hz, f_hz))
+        lower = upper - 1
+        if upper < len(self.frequencies_hz) and self.frequencies_hz[upper] == f_hz:
+            return upper, upper, 0.0
+        if lower < 0 or upper >= len(self.frequencies_hz) or self.bands[lower] != self.bands[upper]:
+            return None
+        f_low, f_high = float(self.frequencies_hz[lower]), float(self.frequencies_hz[upper])
+        return lower, upper, math.log(f_hz / f_low) / math.log(f_high / f_low)
+
+    def _cell(self, gamma):
+        # Halves round away from zero, as std::lround does in the firmware
+        column = int(math.copysign(math.floor(abs(gamma.real / self.gamma_step) + 0.5), gamma.real)) + self.half
+        row = int(math.copysign(math.floor(abs(gamma.imag / self.gamma_step) + 0.5), gamma.imag)) + self.half
+        if not (0 <= row < self.cells.shape[1] and 0 <= column < self.cells.shape[2]):
+            return None
+        return row, column
+
+    def nearest_code(self, f_hz, gamma):
+        """The firmware's lookup: code of the nearest cell, or None outside the table."""
+        points = self._frequency_points(f_hz)
+        cell = self._cell(complex(gamma))
+        if points is None or cell is None:
+            return None
+        lower, upper, weight = points
+        value = self.cells[upper if weight >= 0.5 else lower][cell]
+        return None if value == NO_CODE else int(self.palette[value])
+
+    def query(self, f_hz, gamma, refine=True):
+        """
+        Relay code for a load at f_hz. With refine, the codes of the eight
+        cells around the point and a code interpolated from their bank
+        values are evaluated by the model and the best is returned.
+        Returns a dict like antenna_tuner.tune, or None outside the table.
+        """
+        gamma = complex(gamma)
+        nearest = self.nearest_code(f_hz, gamma)
+        if not refine or nearest is None:
+            return None if nearest is None else self._evaluate(f_hz, gamma, [nearest])
+
+        lower, upper, f_weight = self._frequency_points(f_hz)
+        x = gamma.real / self.gamma_step + self.half
+        y = gamma.imag / self.gamma_step + self.half
+        column, row = int(math.floor(x)), int(math.floor(y))
+        corners, weights = [], []
+        for k, wk in ((lower, 1 - f_weight), (upper, f_weight)):
+            for r, wr in ((row, 1 - (y - row)), (row + 1, y - row)):
+                for c, wc in ((column, 1 - (x - column)), (column + 1, x - column)):
+                    if 0 <= r < self.cells.shape[1] and 0 <= c < self.cells.shape[2] and self.cells[k, r, c] != NO_CODE:
+                        corners.append(int(self.palette[self.cells[k, r, c]]))
+                        weights.append(wk * wr * wc)
+
+        # Blend the bank values of the corners that share the nearest
+        # cell's orientation and snap the result to the nearest codes
+        candidates = [nearest] + corners
+        l_codes, c_codes, orientations = tuner.unpack_code(np.array(corners))
+        same = orientations == tuner.unpack_code(nearest)[2]
+        if np.sum(np.asarray(weights)[same]) > 0:
+            inductance, capacitance = tuner.nominal_values(l_codes[same], c_codes[same])
+            w = np.asarray(weights)[same] / np.sum(np.asarray(weights)[same])
+            _, l_code = self._l_index.nearest(np.dot(w, inductance))
+            _, c_code = self._c_index.nearest(np.dot(w, capacitance))
+            candidates.append(int(tuner.pack_code(l_code, c_code, tuner.unpack_code(nearest)[2])))
+        return self._evaluate(f_hz, gamma, list(dict.fromkeys(candidates)))
+
+    def _evaluate(self, f_hz, gamma, codes):
+        # Same selection rule as antenna_tuner.tune over a short candidate list
+        l_code, c_code, orientation = tuner.unpack_code(np.array(codes))
+        z_load = tuner.load_from_gamma(gamma)
+        z_series = tuner.series_bank_impedance(f_hz, l_code)
+        y_shunt = tuner.shunt_bank_admittance(f_hz, c_code)
+        z_in = tuner.input_impedance(z_series, y_shunt, z_load, orientation)
+        match_gamma = np.abs(tuner.reflection_coefficient(z_in))
+        match_efficiency = tuner.efficiency(z_series, y_shunt, z_load, orientation)
+        usable = match_efficiency >= tuner.MIN_EFFICIENCY
+        best = int(np.argmin(np.where(usable, match_gamma, np.inf)) if usable.any() else np.argmin(match_gamma))
+        return {
+            "code": codes[best],
+            "swr": float(tuner.swr_from_gamma(match_gamma[best])),
+            "efficiency": float(match_efficiency[best]),
+            "z_in": complex(z_in[best]),
+        }
+
+    # --- Output Files ---
+
+    def write_binary(self, filename="tuner_index.bin"):
+        """Header, then frequencies (u32 Hz), band per frequency (u8), palette (u32) and cells (u16)."""
+        header = np.array([(INDEX_MAGIC, INDEX_VERSION, self.cells.shape[1], len(self.frequencies_hz),
+                            len(self.palette), self.gamma_step, self.gamma_max)], dtype=INDEX_HEADER)
+        with open(filename, 'wb') as f:
+            for array in (header, self.frequencies_hz.astype('<u4'), self.bands,
+                          self.palette.astype('<u4'), self.cells.astype('<u2')):
+                f.write(array.tobytes())
+        print(f"Successfully generated '{filename}'")
+
+    @classmethod
+    def read_binary(cls, filename="tuner_index.bin"):
+        data = np.fromfile(filename, dtype=np.uint8)
+        header = data[:INDEX_HEADER.itemsize].view(INDEX_HEADER)[0]
+        if header['magic'] != INDEX_MAGIC or header['version'] != INDEX_VERSION:
+            raise ValueError(f"{filename} is not a version {INDEX_VERSION} tuner index")
+        n, count, size = int(header['grid_size']), int(header['frequency_count']), int(header['palette_size'])
+        offset = INDEX_HEADER.itemsize
+        arrays = []
+        for dtype, length in (('<u4', count), ('u1', count), ('<u4', size), ('<u2', count * n * n)):
+            nbytes = np.dtype(dtype).itemsize * length
+            arrays.append(data[offset:offset + nbytes].view(dtype))
+            offset += nbytes
+        frequencies_hz, bands, palette, cells = arrays
+        return cls(frequencies_hz, bands, palette, cells.reshape(count, n, n),
+                   header['gamma_step'], header['gamma_max'])
+
+    def write_c_header(self, filename="TunerIndex.h"):
+        """Writes the tables and the nearest-cell lookup as a C++ header."""
+        def rows(values, width, per_line):
+            text = [', '.join(f'{v:{width}d}' for v in values[i:i + per_line]) for i in range(0, len(values), per_line)]
+            return ',\n    '.join(text)
+
+        n = self.cells.shape[1]
+        band_names = ", ".join(f"{i} = {band[0]}" for i, band in enumerate(tuner.TUNER_BANDS))
+        with open(filename, 'w') as f:
+            f.write(f"""/**
+ * @file {filename}
+ * @brief Antenna tuner relay codes by frequency and load reflection coefficient
+ *
+ * Generated by sim-stuff/tuner_index.py. Relay code bits 0-{tuner.L_BITS - 1} are the
+ * inductor bank, bits {tuner.L_BITS}-{tuner.ORIENTATION_BIT - 1} the capacitor bank and bit
+ * {tuner.ORIENTATION_BIT} selects the capacitor at the input side. Cells are indexed
+ * [frequency][row][column] with gamma = (column - {self.half} + j (row - {self.half})) *
+ * {self.gamma_step:g}; {NO_CODE:#06x} marks cells beyond |gamma| = {self.gamma_max:g}.
+ * Bands: {band_names}.
+ */
+
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <optional>
+
+namespace NexRig::HW {{
+
+inline constexpr int TunerGridSize = {n};
+inline constexpr int TunerGridHalf = {self.half};
+inline constexpr float TunerGammaStep = {self.gamma_step:g}f;
+inline constexpr uint16_t TunerNoCode = {NO_CODE:#06x};
+
+inline constexpr std::array<uint32_t, {len(self.frequencies_hz)}> TunerFrequencyHz{{{{
+    {rows(self.frequencies_hz, 8, 8)}
+}}}};
+
+inline constexpr std::array<uint8_t, {len(self.bands)}> TunerFrequencyBand{{{{
+    {rows(self.bands, 2, 24)}
+}}}};
+
+inline constexpr std::array<uint32_t, {len(self.palette)}> TunerCodePalette{{{{
+    {rows(self.palette, 6, 12)}
+}}}};
+
+inline constexpr std::array<uint16_t, {self.cells.size}> TunerCells{{{{
+    {rows(self.cells.ravel(), 5, n)}
+}}}};
+
+/**
+ * @brief Relay code of the nearest cell for a frequency and load gamma
+ * @return The code, or std::nullopt outside every band or the gamma grid
+ */
+inline std::optional<uint32_t> findTunerCode(uint32_t hz, float gammaReal, float gammaImag) {{
+  auto upper = std::lower_bound(TunerFrequencyHz.begin(), TunerFrequencyHz.end(), hz);
+  size_t k = upper - TunerFrequencyHz.begin();
+  if (upper == TunerFrequencyHz.end() || (*upper != hz && (k == 0 || TunerFrequencyBand[k - 1] != TunerFrequencyBand[k]))) {{
+    return std::nullopt;
+  }}
+  // Nearest point on the log-spaced grid
+  if (*upper != hz && hz * static_cast<uint64_t>(hz) < TunerFrequencyHz[k - 1] * static_cast<uint64_t>(*upper)) {{
+    --k;
+  }}
+  int column = static_cast<int>(std::lround(gammaReal / TunerGammaStep)) + TunerGridHalf;
+  int row = static_cast<int>(std::lround(gammaImag / TunerGammaStep)) + TunerGridHalf;
+  if (row < 0 || row >= TunerGridSize || column < 0 || column >= TunerGridSize) {{
+    return std::nullopt;
+  }}
+  uint16_t cell = TunerCells[(k * TunerGridSize + row) * TunerGridSize + column];
+  if (cell == TunerNoCode) {{
+    return std::nullopt;
+  }}
+  return TunerCodePalette[cell];
+}}
+
+}} // namespace NexRig::HW
+""")
+        print(f"Successfully generated '{filename}'")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    index = TunerIndex.build()
+    elapsed = time.perf_counter() - start
+    cells = int(np.count_nonzero(index.cells != NO_CODE))
+    print(f"{len(index.frequencies_hz)} frequencies x {cells // len(index.frequencies_hz)} loads solved in "
+          f"{elapsed:.1f} s; {len(index.palette)} distinct codes, "
+          f"{index.cells.nbytes + index.palette.nbytes + index.frequencies_hz.nbytes + index.bands.nbytes} bytes")
+
+    index.write_binary()
+    index.write_c_header()
+    if not np.array_equal(TunerIndex.read_binary().cells, index.cells):
+        raise RuntimeError("Binary index does not read back")
+
+    # Random in-band loads up to 4:1 SWR: SWR reached by the table against
+    # a full solve at the exact frequency and load
+    rng = np.random.default_rng(0)
+    print(f"\n{'Band':<6} {'Optimum SWR':>12} {'Nearest SWR':>12} {'Refined SWR':>12} {'Query (ms)':>11}")
+    for band_index, (name, f_low, f_high) in enumerate(tuner.TUNER_BANDS):
+        f_hz = rng.uniform(f_low, f_high, 40) * 1e6
+        gamma = 0.6 * np.sqrt(rng.uniform(0, 1, 40)) * np.exp(2j * np.pi * rng.uniform(0, 1, 40))
+        optimum = np.array([tuner.tune_loads(f, tuner.load_from_gamma(g))["swr"] for f, g in zip(f_hz, gamma)])
+        nearest = np.array([index.query(f, g, refine=False)["swr"] for f, g in zip(f_hz, gamma)])
+        start = time.perf_counter()
+        refined = np.array([index.query(f, g)["swr"] for f, g in zip(f_hz, gamma)])
+        query_ms = (time.perf_counter() - start) / len(f_hz) * 1e3
+        print(f"{name:<6} {np.median(optimum):12.3f} {np.median(nearest):12.3f} {np.median(refined):12.3f} {query_ms:11.2f}")
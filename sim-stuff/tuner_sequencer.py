@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Antenna Tuner Relay Sequencer
+=============================
+
+Plans how the tuner of antenna_tuner.py moves from one relay code to
+another. Relays switch one at a time, so every intermediate code is
+briefly connected; if RF is present, each one reflects power back to the
+PA and each toggle costs relay life and operate time.
+
+A transition that flips every differing relay exactly once uses the
+fewest toggles, so the planner searches orderings of those flips: a path
+across the sub-hypercube spanned by the differing relays. The SWR of
+every state on it is evaluated in one array operation, then a dynamic
+program over subsets finds the order with the lowest peak reflected
+power, breaking ties on total reflected power. choose_target() can also
+accept a slightly worse match that needs fewer toggles.
+"""
+
+import time
+
+import numpy as np
+
+import antenna_tuner as tuner
+
+# --- Configuration Constants ---
+
+# Forward power during a hot retune
+FORWARD_POWER_W = 50.0
+
+# Panasonic TQ2-5V operate/release time, maximum
+RELAY_OPERATE_MS = 4.0
+
+# Relays in a code: inductor bits, capacitor bits and orientation
+RELAY_COUNT = tuner.ORIENTATION_BIT + 1
+
+# Largest number of differing relays searched exhaustively
+MAX_SEARCH_RELAYS = 18
+
+
+def toggle_count(a, b):
+    """Number of relays that differ between codes; arrays broadcast."""
+    diff = np.asarray(a) ^ np.asarray(b)
+    return sum((diff >> k) & 1 for k in range(RELAY_COUNT))
+
+
+def code_match(f_hz, z_load, codes, z0=tuner.SYSTEM_OHMS):
+    """|gamma| and efficiency of any array of relay codes for one load."""
+    l_code, c_code, orientation = tuner.unpack_code(codes)
+    z_series = tuner.series_bank_impedance(f_hz, l_code)
+    y_shunt = tuner.shunt_bank_admittance(f_hz, c_code)
+    z_in = tuner.input_impedance(z_series, y_shunt, z_load, orientation)
+    return np.abs(tuner.reflection_coefficient(z_in, z0)), tuner.efficiency(z_series, y_shunt, z_load, orientation)
+
+
+def reflected_power(f_hz, z_load, codes, forward_power=FORWARD_POWER_W):
+    gamma, _ = code_match(f_hz, z_load, codes)
+    return forward_power * gamma ** 2
+
+
+def choose_target(f_hz, z_load, current_code, swr_margin=0.05, min_efficiency=tuner.MIN_EFFICIENCY):
+    """
+    Among every code whose SWR is within swr_margin of the best match,
+    returns the one fewest toggles away from current_code (lowest SWR on
+    a tie). swr_margin=0 gives antenna_tuner.tune's code.
+    """
+    # Every code at once from the bank sums, laid out so the flat index is the code
+    z_series = tuner.series_bank_impedance(f_hz)[None, None, :]
+    y_shunt = tuner.shunt_bank_admittance(f_hz)[None, :, None]
+    orientations = np.array([tuner.C_AT_LOAD, tuner.C_AT_INPUT])[:, None, None]
+    z_in = tuner.input_impedance(z_series, y_shunt, z_load, orientations)
+    gamma = np.abs(tuner.reflection_coefficient(z_in)).ravel()
+    match_efficiency = tuner.efficiency(z_series, y_shunt, z_load, orientations).ravel()
+    usable = match_efficiency >= min_efficiency
+    if usable.any():
+        gamma = np.where(usable, gamma, np.inf)
+    swr = tuner.swr_from_gamma(gamma)
+    eligible = np.flatnonzero(swr <= swr.min() * (1 + swr_margin) + 1e-12)
+
+    toggles = toggle_count(eligible, int(current_code))
+    best = eligible[np.lexsort((swr[eligible], toggles))[0]]
+    return int(best)
+
+
+def plan_transition(f_hz, z_load, start_code, target_code, forward_power=FORWARD_POWER_W):
+    """
+    Orders the relay flips from start_code to target_code so the worst
+    intermediate state reflects as little power as possible at f_hz into
+    z_load. Returns a dict with the code sequence (start and target
+    included), the relay flipped at each step, reflected power per state,
+    toggles and latency.
+    """
+    diff = int(start_code) ^ int(target_code)
+    relays = np.array([k for k in range(RELAY_COUNT) if diff >> k & 1], dtype=np.int64)
+    count = len(relays)
+    if count > MAX_SEARCH_RELAYS:
+        raise ValueError(f"{count} differing relays is more than MAX_SEARCH_RELAYS")
+
+    # State s has flipped relays[j] for each set bit j of s
+    states = np.arange(2 ** count, dtype=np.int64)
+    flipped = (states[:, None] >> np.arange(count)) & 1
+    codes = int(start_code) ^ (flipped << relays).sum(axis=1)
+    power = reflected_power(f_hz, z_load, codes, forward_power)
+
+    # Bottleneck path over subsets, one popcount layer at a time; a state's
+    # predecessors have one flip fewer so are always already solved
+    peak = np.full(len(states), np.inf)
+    total = np.full(len(states), np.inf)
+    last_flip = np.full(len(states), -1)
+    peak[0] = total[0] = power[0]
+    layers = flipped.sum(axis=1)
+    for layer in range(1, count + 1):
+        s = states[layers == layer]
+        has = (s[None, :] >> np.arange(count)[:, None]) & 1 == 1
+        previous = s[None, :] ^ (1 << np.arange(count))[:, None]
+        candidate_peak = np.where(has, np.maximum(peak[previous], power[s]), np.inf)
+        candidate_total = np.where(has, total[previous] + power[s], np.inf)
+        lowest = candidate_peak.min(axis=0)
+        tied = candidate_peak <= lowest * (1 + 1e-12)
+        j = np.argmin(np.where(tied, candidate_total, np.inf), axis=0)
+        columns = np.arange(len(s))
+        peak[s], total[s], last_flip[s] = lowest, candidate_total[j, columns], j
+
+    order = []
+    state = len(states) - 1
+    while state:
+        order.append(int(last_flip[state]))
+        state ^= 1 << order[-1]
+    order.reverse()
+    path = np.cumsum([0] + [1 << j for j in order])
+    return {
+        "codes": [int(c) for c in codes[path]],
+        "relays": [int(relays[j]) for j in order],
+        "reflected_w": power[path],
+        "peak_reflected_w": float(peak[-1]),
+        "toggles": count,
+        "latency_ms": count * RELAY_OPERATE_MS,
+    }
+
+
+def direct_transition(f_hz, z_load, start_code, target_code, forward_power=FORWARD_POWER_W):
+    """The unplanned sequence: differing relays flipped from bit 0 upwards."""
+    diff = int(start_code) ^ int(target_code)
+    relays = [k for k in range(RELAY_COUNT) if diff >> k & 1]
+    codes = np.array([int(start_code) ^ sum(1 << k for k in relays[:n]) for n in range(len(relays) + 1)])
+    power = reflected_power(f_hz, z_load, codes, forward_power)
+    return {
+        "codes": [int(c) for c in codes],
+        "relays": relays,
+        "reflected_w": power,
+        "peak_reflected_w": float(power.max()),
+        "toggles": len(relays),
+        "latency_ms": len(relays) * RELAY_OPERATE_MS,
+    }
+
+
+def plan_sweep(steps, start_code=0, swr_margin=0.05, forward_power=FORWARD_POWER_W):
+    """
+    Plans a sequence of retunes, e.g. a band sweep. steps is a list of
+    (f_hz, z_load); each transition is evaluated at the new frequency and
+    load, where the RF is when the relays move.
+    """
+    plans = []
+    code = start_code
+    for f_hz, z_load in steps:
+        target = choose_target(f_hz, z_load, code, swr_margin)
+        plans.append(plan_transition(f_hz, z_load, code, target, forward_power))
+        code = target
+    return plans
+
+
+if __name__ == "__main__":
+    # Sweep up through every band with an antenna whose impedance wanders
+    # up to 4:1 SWR, stepping 50 kHz at a time
+    rng = np.random.default_rng(2)
+    steps = []
+    for _, f_low, f_high in tuner.TUNER_BANDS:
+        gamma = 0.5 * np.exp(2j * np.pi * rng.uniform())
+        for f_mhz in np.arange(f_low, f_high, 0.05):
+            gamma = np.clip(np.abs(gamma) + rng.normal(0, 0.02), 0, 0.6) * np.exp(1j * (np.angle(gamma) + rng.normal(0, 0.2)))
+            steps.append((f_mhz * 1e6, tuner.load_from_gamma(gamma)))
+
+    start = time.perf_counter()
+    planned = plan_sweep(steps)
+    elapsed = time.perf_counter() - start
+
+    # Unplanned: always retune to the best code, flipping relays in bit order
+    direct, code = [], 0
+    for f_hz, z_load in steps:
+        target = tuner.tune(f_hz, z_load)["code"]
+        direct.append(direct_transition(f_hz, z_load, code, target))
+        code = target
+
+    print(f"{len(steps)} retunes planned in {elapsed:.1f} s ({elapsed / len(steps) * 1e3:.1f} ms each)")
+    print(f"\n{'':<10} {'Toggles':>8} {'Latency (s)':>12} {'Peak refl (W)':>14} {'Mean peak (W)':>14}")
+    for name, plans in (("Direct", direct), ("Planned", planned)):
+        toggles = sum(p["toggles"] for p in plans)
+        peaks = np.array([p["peak_reflected_w"] for p in plans])
+        print(f"{name:<10} {toggles:8d} {sum(p['latency_ms'] for p in plans) / 1e3:12.2f} "
+              f"{peaks.max():14.1f} {peaks.mean():14.2f}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Antenna Tuner Component Stress
+==============================
+
+Worst-case voltage, current and dissipation of every part of the tuner in
+antenna_tuner.py, over every band and a dense grid of loads out to a
+chosen SWR, at full power.
+
+Section 2 of doc/NexRig/Hardware/Digital Antenna Tuner Design.md works
+these out by hand for 12.5 and 200 ohm loads. Here each load is matched
+with antenna_tuner.tune_loads, then the node voltages and branch
+currents of the tuned network are solved for all points of a band in one
+batched complex evaluation: the series current sets the voltage across
+each inductor bit, and the shunt node voltage drives each capacitor
+branch. For each component the maximum is reported together with the
+band, frequency and load region that caused it.
+"""
+
+import math
+import time
+
+import numpy as np
+
+import antenna_tuner as tuner
+
+# --- Configuration Constants ---
+
+# Power absorbed at the tuner input
+STRESS_POWER_W = 50.0
+
+# Loads are matched out to this SWR on a square gamma grid of this spacing
+STRESS_MAX_SWR = 4.0
+STRESS_GAMMA_STEP = 0.02
+
+# Log-spaced frequencies per band, edges included
+STRESS_FREQUENCIES_PER_BAND = 5
+
+# Limits derived in the design document
+CAP_LIMIT_V_PEAK = 141.0
+PART_LIMIT_A_RMS = 2.0
+RELAY_OPEN_LIMIT_V_RMS = 100.0
+
+
+def stress_loads(max_swr=STRESS_MAX_SWR, step=STRESS_GAMMA_STEP, z0=tuner.SYSTEM_OHMS):
+    """Loads on a square gamma grid, every point up to max_swr."""
+    gamma_max = (max_swr - 1) / (max_swr + 1)
+    half = int(math.floor(gamma_max / step))
+    axis = np.arange(-half, half + 1) * step
+    gamma = (axis[None, :] + 1j * axis[:, None]).ravel()
+    gamma = gamma[np.abs(gamma) <= gamma_max + 1e-12]
+    return tuner.load_from_gamma(gamma, z0)
+
+
+def network_stress(f_hz, z_load, codes, power_w=STRESS_POWER_W):
+    """
+    Solves the tuned network for arrays of frequency, load and relay code
+    (all shaped (N,)) with power_w absorbed at the input. Voltages and
+    currents are rms phasors; per-bit results are shaped (N, bits).
+    """
+    f_hz = np.asarray(f_hz, dtype=float)
+    z_load = np.asarray(z_load, dtype=complex)
+    l_code, c_code, orientation = tuner.unpack_code(np.asarray(codes))
+    l_on = ((l_code[:, None] >> np.arange(tuner.L_BITS)) & 1) == 1
+    c_on = ((c_code[:, None] >> np.arange(tuner.C_BITS)) & 1) == 1
+    omega = 2 * math.pi * f_hz
+
+    # Inductor bank: a bit in circuit is its winding with self-capacitance
+    # and the open relay across it; a bypassed bit is shorted by the relay
+    z_winding, y_self, z_relay_closed, y_relay_open = tuner.inductor_bits(f_hz)
+    y_coil = 1 / z_winding + y_self
+    z_l_bits = np.where(l_on, 1 / (y_coil + y_relay_open), 1 / (y_coil + 1 / z_relay_closed))
+    z_series = z_l_bits.sum(axis=1)
+
+    # Capacitor bank: each branch is the capacitor in series with its relay
+    z_cap, z_c_relay_closed, z_c_relay_open = tuner.capacitor_bits(f_hz)
+    z_c_branch = z_cap + np.where(c_on, z_c_relay_closed, z_c_relay_open)
+    y_shunt = (1 / z_c_branch).sum(axis=1) + 1j * omega * tuner.SHUNT_STRAY_PF * 1e-12
+
+    z_in = tuner.input_impedance(z_series, y_shunt, z_load, orientation)
+    i_in = np.sqrt(power_w / z_in.real)
+    v_in = i_in * z_in
+
+    at_load = orientation == tuner.C_AT_LOAD
+    i_series = np.where(at_load, i_in, v_in / (z_series + z_load))
+    v_shunt = np.where(at_load, v_in - i_in * z_series, v_in)
+    v_load = np.where(at_load, v_shunt, i_series * z_load)
+
+    v_l_bits = i_series[:, None] * z_l_bits
+    i_winding = v_l_bits / z_winding
+    i_c_branch = v_shunt[:, None] / z_c_branch
+    c_esr = np.array(tuner.C_BANK_ESR_OHMS[::-1])
+    v_cap = i_c_branch * (z_cap - c_esr)
+    l_relay_i = np.where(l_on, 0, v_l_bits / z_relay_closed)
+    c_relay_i = np.where(c_on, i_c_branch, 0)
+
+    stress = {
+        "z_in": z_in,
+        "v_in": v_in,
+        "v_load": v_load,
+        "i_load": v_load / z_load,
+        "power_load_w": np.real(v_load * np.conj(v_load / z_load)),
+        "inductor_v": v_l_bits,
+        "inductor_i": i_winding,
+        "inductor_loss_w": np.abs(i_winding) ** 2 * z_winding.real,
+        "l_relay_i": l_relay_i,
+        "l_relay_loss_w": np.abs(l_relay_i) ** 2 * z_relay_closed.real,
+        "l_relay_open_v": np.where(l_on, v_l_bits, 0),
+        "capacitor_v": v_cap,
+        "capacitor_i": i_c_branch,
+        "capacitor_loss_w": np.abs(i_c_branch) ** 2 * c_esr,
+        "c_relay_i": c_relay_i,
+        "c_relay_loss_w": np.abs(c_relay_i) ** 2 * z_c_relay_closed.real,
+        "c_relay_open_v": np.where(c_on, 0, i_c_branch * z_c_relay_open),
+    }
+
+    # Every watt into the tuner reaches the load or one of the loss terms
+    dissipated = stress["power_load_w"] + sum(
+        stress[key].sum(axis=1)
+        for key in ("inductor_loss_w", "l_relay_loss_w", "capacitor_loss_w", "c_relay_loss_w"))
+    if not np.allclose(dissipated, power_w, rtol=1e-9, atol=0):
+        raise ValueError(f"Power does not balance: worst {np.max(np.abs(dissipated - power_w)):.3g} W "
+                         f"of {power_w:g} W unaccounted for")
+    return stress
+
+
+def load_region(z_load, z0=tuner.SYSTEM_OHMS):
+    """Short description of where a load lies: high/low R, inductive/capacitive, SWR."""
+    gamma = tuner.reflection_coefficient(z_load, z0)
+    swr = tuner.swr_from_gamma(gamma)
+    if swr < 1.1:
+        return f"matched (SWR {swr:.1f})"
+    resistance = "high-Z" if z_load.real > z0 else "low-Z"
+    reactance = "inductive" if z_load.imag > 0 else "capacitive"
+    return f"{resistance} {reactance} (SWR {swr:.1f})"
+
+
+def band_stress(band, max_swr=STRESS_MAX_SWR, step=STRESS_GAMMA_STEP,
+                frequencies=STRESS_FREQUENCIES_PER_BAND, power_w=STRESS_POWER_W):
+    """Tunes every load at each frequency of one band and solves the stress of all points together."""
+    _, f_low, f_high = band
+    loads = stress_loads(max_swr, step)
+    f_points = np.geomspace(f_low * 1e6, f_high * 1e6, frequencies)
+    codes = np.concatenate([tuner.tune_loads(f_hz, loads)["code"] for f_hz in f_points])
+    f_hz = np.repeat(f_points, len(loads))
+    z_load = np.tile(loads, len(f_points))
+    return f_hz, z_load, codes, network_stress(f_hz, z_load, codes, power_w)
+
+
+def stress_report(bands=tuner.TUNER_BANDS, **kwargs):
+    """
+    Worst case of each component over all bands: a list of dicts with the
+    quantity, component, value and the band, frequency and load behind it.
+    A quantity only counts at points where its bit is in the relay state it
+    describes; "used" is False (and value None) if that never happens.
+    """
+    # Per quantity: result key, component names, scale, unit, the design
+    # document's limit (None where it gives none) and whether it applies
+    # with the bit in circuit (True) or switched out (False)
+    l_names = [f"L {uh:g} uH" for uh in tuner.L_BANK_UH[::-1]]
+    c_names = [f"C {pf:g} pF" for pf in tuner.C_BANK_PF[::-1]]
+    quantities = [
+        ("inductor_i", l_names, 1, "A rms", PART_LIMIT_A_RMS, True),
+        ("inductor_v", l_names, math.sqrt(2), "V pk", None, True),
+        ("inductor_loss_w", l_names, 1, "W", None, True),
+        ("l_relay_i", [f"{n} relay" for n in l_names], 1, "A rms", PART_LIMIT_A_RMS, False),
+        ("l_relay_loss_w", [f"{n} relay" for n in l_names], 1, "W", None, False),
+        ("l_relay_open_v", [f"{n} relay" for n in l_names], 1, "V rms", RELAY_OPEN_LIMIT_V_RMS, True),
+        ("capacitor_v", c_names, math.sqrt(2), "V pk", CAP_LIMIT_V_PEAK, True),
+        ("capacitor_i", c_names, 1, "A rms", PART_LIMIT_A_RMS, True),
+        ("capacitor_loss_w", c_names, 1, "W", None, True),
+        ("c_relay_i", [f"{n} relay" for n in c_names], 1, "A rms", PART_LIMIT_A_RMS, True),
+        ("c_relay_loss_w", [f"{n} relay" for n in c_names], 1, "W", None, True),
+        ("c_relay_open_v", [f"{n} relay" for n in c_names], 1, "V rms", RELAY_OPEN_LIMIT_V_RMS, False),
+    ]
+
+    worst = {(key, bit): {"quantity": key, "component": name, "value": None, "unit": unit, "limit": limit,
+                          "in_circuit": in_circuit, "used": False}
+             for key, names, _, unit, limit, in_circuit in quantities for bit, name in enumerate(names)}
+    for band in bands:
+        f_hz, z_load, codes, stress = band_stress(band, **kwargs)
+        l_code, c_code, _ = tuner.unpack_code(codes)
+        bit_on = {
+            "l": ((l_code[:, None] >> np.arange(tuner.L_BITS)) & 1) == 1,
+            "c": ((c_code[:, None] >> np.arange(tuner.C_BITS)) & 1) == 1,
+        }
+        for key, names, scale, unit, limit, in_circuit in quantities:
+            applies = bit_on["l" if key.startswith(("inductor", "l_")) else "c"] == in_circuit
+            values = np.where(applies, np.abs(stress[key]) * scale, -np.inf)
+            index = np.argmax(values, axis=0)
+            for bit in range(len(names)):
+                value = values[index[bit], bit]
+                row = worst[(key, bit)]
+                if np.isfinite(value) and (row["value"] is None or value > row["value"]):
+                    row.update({
+                        "value": float(value),
+                        "used": True,
+                        "band": band[0],
+                        "f_hz": float(f_hz[index[bit]]),
+                        "z_load": complex(z_load[index[bit]]),
+                    })
+    return [worst[(key, bit)] for key, names, *_ in quantities for bit in range(len(names))]
+
+
+def print_report(report):
+    print(f"{'Component':<20} {'Quantity':<17} {'Maximum':>13} {'Band':>5} {'f (MHz)':>8} "
+          f"{'Load (ohm)':>16}  Region")
+    for row in report:
+        if not row["used"]:
+            state = "bypassed" if row["in_circuit"] else "in circuit"
+            print(f"{row['component']:<20} {row['quantity']:<17} {state:>13} at every match")
+            continue
+        flag = " !" if row["limit"] is not None and row["value"] > row["limit"] else ""
+        where = (f"{row['band']:>5} {row['f_hz'] / 1e6:8.3f} {row['z_load']:>16.1f}  "
+                 f"{load_region(row['z_load'])}{flag}")
+        print(f"{row['component']:<20} {row['quantity']:<17} {row['value']:7.2f} {row['unit']:<5} {where}")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    report = stress_report()
+    elapsed = time.perf_counter() - start
+    points = len(stress_loads()) * STRESS_FREQUENCIES_PER_BAND * len(tuner.TUNER_BANDS)
+    print(f"{points} tuned points up to SWR {STRESS_MAX_SWR:g} at {STRESS_POWER_W:g} W in {elapsed:.1f} s; "
+          f"'!' marks values above the design document's limits\n")
+    print_report(report)